@@ -0,0 +1,207 @@
+"""
+End-to-end benchmark of the event hot path: websocket frame -> Transport._handle_message
+-> models -> EdClient._dispatch_event -> listener.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_events --events 20000
+    python -m benchmarks.bench_events --events 5000 --rate 2000 --lazy
+
+It reports events/sec, p50/p99 frame-to-handler latency measured against a local
+FakeEdServer, allocations per event measured by feeding the same frames
+straight into ``_handle_message`` under tracemalloc, and decode time per frame:
+stdlib ``json``, the transport's codec, and the transport's routing path, which
+skips unlistened frame types (``--listen`` narrows the listeners to show it).
+"""
+
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tracemalloc
+import typing as t
+
+from edpy import EdClient, listener
+from edpy.codec import JsonCodec
+from edpy.events import (ThreadNewEvent, ThreadUpdateEvent, CommentNewEvent, CommentUpdateEvent,
+                         CourseCountEvent)
+
+from .fake_server import FakeEdServer, synthetic_frames, load_recording
+
+
+LISTENABLE = {
+    'thread.new': ThreadNewEvent,
+    'thread.update': ThreadUpdateEvent,
+    'comment.new': CommentNewEvent,
+    'comment.update': CommentUpdateEvent,
+    'course.count': CourseCountEvent,
+}
+
+
+class Recorder:
+    """Listener that timestamps every event it receives."""
+
+    def __init__(self, server: FakeEdServer, expected: int) -> None:
+        self.server = server
+        self.expected = expected
+        self.handled = 0
+        self.latencies: t.List[float] = []
+        self.done = asyncio.Event()
+        self.first_at = self.last_at = 0.0
+
+    def _record(self, seq: t.Optional[int]):
+
+        now = time.perf_counter()
+        if not self.handled:
+            self.first_at = now
+        self.last_at = now
+        self.handled += 1
+
+        if seq is not None and seq < len(self.server.sent_at):
+            self.latencies.append(now - self.server.sent_at[seq])
+        if self.handled >= self.expected:
+            self.done.set()
+
+    @listener(ThreadNewEvent, ThreadUpdateEvent)
+    async def on_thread(self, event):
+        self._record(event.thread.id)
+
+    @listener(CommentNewEvent, CommentUpdateEvent)
+    async def on_comment(self, event):
+        self._record(event.comment.id)
+
+    @listener(CourseCountEvent)
+    async def on_count(self, event):
+        self._record(None)
+
+
+def percentile(values: t.Sequence[float], q: float) -> float:
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+async def run_stream(frames: t.List[dict], rate: t.Optional[float], lazy: bool, standby: bool = False) -> dict:
+
+    async with FakeEdServer(frames, rate=rate) as server:
+
+        client = EdClient(ed_token='bench', api_host=server.url, lazy_models=lazy, standby=standby)
+        recorder = Recorder(server, expected=len(frames))
+        client.add_event_hooks(recorder)
+
+        task = asyncio.create_task(client.subscribe(1))
+        try:
+            await asyncio.wait_for(recorder.done.wait(), timeout=max(60, len(frames) / 100))
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            await client.close()
+
+        elapsed = recorder.last_at - server.sent_at[0]
+        return {
+            'events': recorder.handled,
+            'events_per_sec': recorder.handled / elapsed if elapsed > 0 else float('inf'),
+            'p50_ms': percentile(recorder.latencies, 50) * 1000,
+            'p99_ms': percentile(recorder.latencies, 99) * 1000,
+        }
+
+
+async def run_allocations(frames: t.List[dict], lazy: bool) -> dict:
+    """Measures memory allocated per event on the in-process path, without sockets."""
+
+    client = EdClient(ed_token='bench', lazy_models=lazy)
+    kept = []
+
+    class Keep:
+        @listener(ThreadNewEvent, ThreadUpdateEvent, CommentNewEvent, CommentUpdateEvent, CourseCountEvent)
+        async def on_event(self, event):
+            kept.append(event)
+
+    client.add_event_hooks(Keep())
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for frame in frames:
+        await client._transport._handle_message(frame)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    stats = after.compare_to(before, 'filename')
+    blocks = sum(stat.count_diff for stat in stats)
+    size = sum(stat.size_diff for stat in stats)
+    await client.close()
+
+    return {
+        'blocks_per_event': blocks / len(frames),
+        'bytes_per_event': size / len(frames),
+    }
+
+
+async def run_decode(frames: t.List[dict], listen: t.Sequence[type]) -> dict:
+    """Times decoding the frame texts, without sockets or listeners running."""
+
+    texts = [json.dumps(frame) for frame in frames]
+    client = EdClient(ed_token='bench')
+
+    class Listen:
+        @listener(*listen)
+        async def on_event(self, event):
+            pass
+
+    client.add_event_hooks(Listen())
+    transport = client._transport
+
+    def per_frame(decode: t.Callable[[str], t.Any]) -> float:
+        started = time.perf_counter()
+        for text in texts:
+            decode(text)
+        return (time.perf_counter() - started) / len(texts)
+
+    stdlib = per_frame(JsonCodec().loads)
+    codec = per_frame(transport.codec.loads)
+    routed = per_frame(transport._decode_frame)
+    skipped = transport.skipped_frames
+    await client.close()
+
+    return {
+        'codec': transport.codec.name,
+        'stdlib_us': stdlib * 1e6,
+        'codec_us': codec * 1e6,
+        'routed_us': routed * 1e6,
+        'skipped': skipped / len(texts),
+    }
+
+
+async def main(argv: t.Optional[t.List[str]] = None):
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, default=10000, help='number of synthetic frames')
+    parser.add_argument('--rate', type=float, default=None, help='frames per second (default: unthrottled)')
+    parser.add_argument('--lazy', action='store_true', help='use lazy model hydration')
+    parser.add_argument('--standby', action='store_true',
+                        help='receive every frame on a second connection too, dropping the duplicates')
+    parser.add_argument('--recording', help='replay frames from a JSON-lines recording instead')
+    parser.add_argument('--listen', nargs='+', choices=sorted(LISTENABLE), default=sorted(LISTENABLE),
+                        help='event types listened to in the decode benchmark (default: all)')
+    args = parser.parse_args(argv)
+
+    frames = load_recording(args.recording) if args.recording else synthetic_frames(args.events)
+
+    stream = await run_stream(frames, args.rate, args.lazy, args.standby)
+    allocations = await run_allocations(frames, args.lazy)
+    decode = await run_decode(frames, [LISTENABLE[name] for name in args.listen])
+
+    print(f'events:            {stream["events"]}')
+    print(f'events/sec:        {stream["events_per_sec"]:.0f}')
+    print(f'latency p50:       {stream["p50_ms"]:.3f} ms')
+    print(f'latency p99:       {stream["p99_ms"]:.3f} ms')
+    print(f'allocs/event:      {allocations["blocks_per_event"]:.1f} blocks, '
+          f'{allocations["bytes_per_event"]:.0f} bytes (retained)')
+    print(f'decode/frame:      json {decode["stdlib_us"]:.2f} us, {decode["codec"]} {decode["codec_us"]:.2f} us, '
+          f'routed {decode["routed_us"]:.2f} us ({decode["skipped"]:.0%} skipped)')
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main()))
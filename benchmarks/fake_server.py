@@ -0,0 +1,224 @@
+"""
+Local stand-in for us.edstem.org, used to benchmark edpy without touching Ed.
+
+It serves ``/api/user``, ``/api/threads/{id}``, ``/api/courses/{id}/threads`` and
+the ``/api/stream`` websocket, and replays a recorded or synthetic list of
+websocket frames to every connection once a course has been subscribed. Point a client at it with
+``EdClient(api_host=server.url)``.
+"""
+
+import json
+import hashlib
+import time
+import asyncio
+import typing as t
+
+from aiohttp import web, WSMsgType
+
+
+def synthetic_frames(count: int, course_ids: t.Sequence[int] = (1,), mix: t.Optional[dict] = None) -> t.List[dict]:
+    """
+    Builds ``count`` websocket frames. ``mix`` maps event types to relative weights.
+    Thread and comment ids equal the frame's sequence number so listeners can
+    correlate a handled event back to the moment its frame was sent.
+    """
+
+    mix = mix or {'thread.new': 1, 'thread.update': 4, 'comment.new': 2, 'comment.update': 2, 'course.count': 1}
+    cycle = [event_type for event_type, weight in mix.items() for _ in range(weight)]
+
+    frames = []
+    for seq in range(count):
+        event_type = cycle[seq % len(cycle)]
+        course_id = course_ids[seq % len(course_ids)]
+        frames.append(make_frame(event_type, seq, course_id))
+    return frames
+
+
+def make_frame(event_type: str, seq: int, course_id: int = 1) -> dict:
+
+    if event_type in ('thread.new', 'thread.update'):
+        return {'type': event_type, 'data': {'thread': make_thread(seq, course_id)}}
+    if event_type == 'thread.delete':
+        return {'type': event_type, 'data': {'thread_id': seq, 'course_id': course_id}}
+    if event_type in ('comment.new', 'comment.update'):
+        return {'type': event_type, 'data': {'comment': make_comment(seq, seq // 10, course_id)}}
+    if event_type == 'comment.delete':
+        return {'type': event_type, 'data': {'comment_id': seq, 'thread_id': seq // 10, 'course_id': course_id}}
+    if event_type == 'course.count':
+        return {'type': event_type, 'data': {'id': course_id, 'count': seq % 200}}
+    raise ValueError(f'Unknown event type: {event_type}')
+
+
+def make_user(user_id: int) -> dict:
+    return {'id': user_id, 'name': f'User {user_id}', 'avatar': None, 'role': 'user',
+            'course_role': 'student', 'tutorials': {}}
+
+
+def make_thread(thread_id: int, course_id: int = 1) -> dict:
+    return {
+        'id': thread_id, 'user_id': 100 + thread_id % 50, 'course_id': course_id, 'original_id': None,
+        'editor_id': None, 'accepted_id': None, 'duplicate_id': None, 'number': thread_id,
+        'type': 'question', 'title': f'Thread {thread_id}',
+        'content': '<document version="2.0"><paragraph>Question body</paragraph></document>',
+        'document': 'Question body', 'category': 'General', 'subcategory': '', 'subsubcategory': '',
+        'flag_count': 0, 'star_count': 0, 'view_count': 3, 'unique_view_count': 2, 'vote_count': 0,
+        'reply_count': 0, 'unresolved_count': 1, 'is_locked': False, 'is_pinned': False,
+        'is_private': False, 'is_endorsed': False, 'is_answered': False, 'is_student_answered': False,
+        'is_staff_answered': False, 'is_archived': False, 'is_anonymous': False, 'is_megathread': False,
+        'anonymous_comments': False, 'approved_status': 'approved',
+        'created_at': '2023-10-01T12:00:00.000000+11:00', 'updated_at': None, 'deleted_at': None,
+        'pinned_at': None, 'anonymous_id': 0, 'vote': 0, 'is_seen': True, 'is_starred': False,
+        'is_watched': False, 'glanced_at': None, 'new_reply_count': 0, 'duplicate_title': None,
+        'user': make_user(100 + thread_id % 50),
+    }
+
+
+def make_comment(comment_id: int, thread_id: int, course_id: int = 1, parent_id: int = None) -> dict:
+    return {
+        'id': comment_id, 'user_id': 100 + comment_id % 50, 'course_id': course_id, 'thread_id': thread_id,
+        'original_id': None, 'parent_id': parent_id, 'editor_id': None, 'number': 1, 'type': 'comment',
+        'kind': 'normal', 'content': '<document version="2.0"><paragraph>Reply</paragraph></document>',
+        'document': 'Reply', 'flag_count': 0, 'vote_count': 0, 'is_endorsed': False, 'is_anonymous': False,
+        'is_private': False, 'is_resolved': False, 'created_at': '2023-10-01T12:05:00.000000+11:00',
+        'updated_at': None, 'deleted_at': None, 'anonymous_id': 0, 'vote': 0, 'comments': [],
+    }
+
+
+def load_recording(path: str) -> t.List[dict]:
+    """Loads recorded frames, one JSON websocket message per line."""
+    with open(path) as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+class FakeEdServer:
+    """aiohttp application standing in for the parts of Ed that edpy talks to."""
+
+    def __init__(self, frames: t.Sequence[dict] = (), rate: t.Optional[float] = None,
+            course_ids: t.Sequence[int] = (1,), host: str = '127.0.0.1', port: int = 0) -> None:
+
+        self.frames = list(frames)
+        self.rate = rate    # frames per second, None replays as fast as possible
+        self.course_ids = list(course_ids)
+        self.host = host
+        self.port = port
+
+        self.threads: t.Dict[int, dict] = {}
+        self.sent_at: t.List[float] = []
+        self.requests: t.List[str] = []
+        self.replay_done = asyncio.Event()
+
+        self._runner: t.Optional[web.AppRunner] = None
+
+        self.app = web.Application()
+        self.app.router.add_get('/api/user', self._user)
+        self.app.router.add_get('/api/threads/{thread_id}', self._thread)
+        self.app.router.add_get('/api/courses/{course_id}/threads', self._list_threads)
+        self.app.router.add_get('/api/stream', self._stream)
+
+    @property
+    def url(self) -> str:
+        return f'http://{self.host}:{self.port}'
+
+    async def start(self) -> 'FakeEdServer':
+
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    def _authorized(self, request: web.Request) -> bool:
+        self.requests.append(request.path)
+        return bool(request.headers.get('Authorization'))
+
+    async def _user(self, request: web.Request):
+
+        if not self._authorized(request):
+            return web.Response(status=400)
+        return web.json_response({
+            'user': {'id': 1, 'name': 'Bench Bot', 'email': 'bench@example.com'},
+            'courses': [{'course': {'id': course_id, 'code': f'BENCH{course_id}', 'name': 'Benchmark',
+                                    'status': 'active'}, 'role': {'role': 'staff'}}
+                        for course_id in self.course_ids],
+        })
+
+    async def _thread(self, request: web.Request):
+
+        if not self._authorized(request):
+            return web.Response(status=400)
+        thread_id = int(request.match_info['thread_id'])
+        thread = self.threads.get(thread_id) or make_thread(thread_id, self.course_ids[0])
+        # lets clients revalidate cached threads; changes whenever the thread does
+        etag = '"%s"' % hashlib.md5(json.dumps(thread, sort_keys=True).encode()).hexdigest()
+        if request.headers.get('If-None-Match') == etag:
+            return web.Response(status=304, headers={'ETag': etag})
+        return web.json_response({'thread': thread, 'users': [thread['user']]}, headers={'ETag': etag})
+
+    async def _list_threads(self, request: web.Request):
+
+        if not self._authorized(request):
+            return web.Response(status=400)
+        course_id = int(request.match_info['course_id'])
+        limit = int(request.query.get('limit', 30))
+        offset = int(request.query.get('offset', 0))
+
+        threads = sorted((thread for thread in self.threads.values() if thread['course_id'] == course_id),
+                         key=lambda thread: thread['id'], reverse=True)
+        page = [{key: value for key, value in thread.items() if key not in ('comments', 'answers')}
+                for thread in threads[offset:offset + limit]]
+        return web.json_response({'threads': page, 'users': []})
+
+    async def _stream(self, request: web.Request):
+
+        if not self._authorized(request):
+            return web.Response(status=401)
+
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        await ws.send_json({'type': 'chat.init', 'data': {}})
+
+        replay = None
+        async for msg in ws:
+            if msg.type != WSMsgType.TEXT:
+                continue
+            message = json.loads(msg.data)
+            if message.get('type') == 'course.subscribe':
+                await ws.send_json({'type': 'course.subscribe', 'id': message.get('id')})
+                if replay is None:
+                    replay = asyncio.create_task(self._replay(ws))
+
+        if replay is not None:
+            replay.cancel()
+        return ws
+
+    async def _replay(self, ws: web.WebSocketResponse):
+
+        interval = 1 / self.rate if self.rate else 0
+        start = time.perf_counter()
+
+        for seq, frame in enumerate(self.frames):
+            if interval:
+                delay = start + seq * interval - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            text = json.dumps(frame)
+            # every connection gets the full replay; latency counts from the first send
+            if seq == len(self.sent_at):
+                self.sent_at.append(time.perf_counter())
+            await ws.send_str(text)
+            if not interval and seq % 256 == 0:
+                await asyncio.sleep(0)  # let the client side of the loop run
+
+        self.replay_done.set()
@@ -1,11 +1,50 @@
+import typing as t
+
+from . import actions
+from .actions import Action, ActionBatch, ActionResult
+from .cache import ResponseCache
 from .client import EdClient
+from .coalesce import EventCoalescer
+from .codec import JsonCodec, OrjsonCodec
+from .dispatch import EventDispatcher
 from .events import *
+from .executor import HookExecutor
+from .journal import EventJournal
+from .metrics import InMemoryMetrics, MetricsSink, render_prometheus
+from .mirror import CourseMirror
+from .presence import PresenceRecorder
+from .ratelimit import RateLimiter
+from .recovery import GapRecovery
+from .relay import EventRelay, RelayClient
+from .snapshots import SnapshotStore
+from .stream import EventStream
+from .registry import HookRegistry
 from .models.comment import Comment
 from .models.course import Course
 from .models.thread import Thread, ThreadType
+from .models.tree import CommentTree
+
+def listener(*events: Event, course_id: t.Union[int, t.Iterable[int], None] = None,
+        category: t.Union[str, t.Iterable[str], None] = None,
+        type: t.Union[ThreadType, str, t.Iterable, None] = None, fields: t.Union[str, t.Iterable[str], None] = None,
+        executor: t.Optional[str] = None):
+    """
+    Marks a method as a listener for the given events. ``course_id``, ``category``
+    and ``type`` narrow it down to matching events; each takes a single value or
+    several. Category and type only apply to ThreadNewEvent and ThreadUpdateEvent.
+    ``fields`` limits ThreadUpdateEvent and CommentUpdateEvent listeners to updates
+    that changed one of the named fields, going by ``event.changes``; updates
+    whose changes are unknown are delivered.
 
-def listener(*events: Event):
+    ``executor`` runs a synchronous, CPU-heavy listener in the client's
+    HookExecutor instead of on the event loop: ``'process'`` for a process pool
+    (the listener must be a staticmethod) or ``'thread'`` for a thread pool.
+    """
     def wrapper(func):
-        setattr(func, '_ed_events', events)
+        target = func.__func__ if isinstance(func, staticmethod) else func
+        setattr(target, '_ed_events', events)
+        setattr(target, '_ed_filters', {'course_id': course_id, 'category': category, 'type': type,
+                                       'fields': fields})
+        setattr(target, '_ed_executor', executor)
         return func
     return wrapper
\ No newline at end of file
@@ -0,0 +1,272 @@
+import time
+import asyncio
+import logging
+import typing as t
+from html import escape
+
+from .models.thread import ThreadType
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .client import EdClient
+
+_log = logging.getLogger('edpy.actions')
+
+STATUS_OK = 'ok'
+STATUS_FAILED = 'failed'
+STATUS_DRY_RUN = 'dry_run'
+
+
+def to_document(text: str) -> str:
+    """Wraps plain text in Ed's document markup, one paragraph per line; markup is kept as is."""
+
+    if text.lstrip().startswith('<document'):
+        return text
+    paragraphs = ''.join(f'<paragraph>{escape(line, quote=False)}</paragraph>' for line in text.split('\n'))
+    return f'<document version="2.0">{paragraphs}</document>'
+
+
+class Action:
+    """
+    One write request to Ed. ``idempotent`` actions (locking, pinning, ...) end in
+    the same state however often they are sent, so the transport retries them
+    after a transient failure like a GET; posts are only retried when throttled
+    or when the connection failed before they were sent.
+    """
+
+    __slots__ = ('method', 'endpoint', 'body', 'description', 'idempotent')
+
+    def __init__(self, method: str, endpoint: str, body: t.Optional[dict] = None, description: str = '',
+            idempotent: bool = True) -> None:
+        self.method = method
+        self.endpoint = endpoint
+        self.body = body
+        self.description = description or f'{method} {endpoint}'
+        self.idempotent = idempotent
+
+    def __repr__(self):
+        return f'<Action {self.description}>'
+
+
+def _thread_action(thread_id: int, verb: str) -> Action:
+    return Action('POST', f'/api/threads/{thread_id}/{verb}', description=f'{verb} thread {thread_id}')
+
+
+def lock_thread(thread_id: int) -> Action:
+    return _thread_action(thread_id, 'lock')
+
+
+def unlock_thread(thread_id: int) -> Action:
+    return _thread_action(thread_id, 'unlock')
+
+
+def pin_thread(thread_id: int) -> Action:
+    return _thread_action(thread_id, 'pin')
+
+
+def unpin_thread(thread_id: int) -> Action:
+    return _thread_action(thread_id, 'unpin')
+
+
+def endorse_thread(thread_id: int) -> Action:
+    return _thread_action(thread_id, 'endorse')
+
+
+def unendorse_thread(thread_id: int) -> Action:
+    return _thread_action(thread_id, 'unendorse')
+
+
+def delete_thread(thread_id: int) -> Action:
+    return Action('DELETE', f'/api/threads/{thread_id}', description=f'delete thread {thread_id}')
+
+
+def edit_thread(thread_id: int, **fields) -> Action:
+    """Changes the given thread fields, e.g. ``title`` or ``category``."""
+
+    if 'content' in fields:
+        fields['content'] = to_document(fields['content'])
+    return Action('PUT', f'/api/threads/{thread_id}', {'thread': fields},
+        description=f'edit thread {thread_id} ({", ".join(sorted(fields))})')
+
+
+def accept_answer(thread_id: int, comment_id: int) -> Action:
+    return Action('POST', f'/api/threads/{thread_id}/accept/{comment_id}',
+        description=f'accept answer {comment_id} on thread {thread_id}')
+
+
+def endorse_comment(comment_id: int) -> Action:
+    return Action('POST', f'/api/comments/{comment_id}/endorse', description=f'endorse comment {comment_id}')
+
+
+def unendorse_comment(comment_id: int) -> Action:
+    return Action('POST', f'/api/comments/{comment_id}/unendorse', description=f'unendorse comment {comment_id}')
+
+
+def resolve_comment(comment_id: int) -> Action:
+    return Action('POST', f'/api/comments/{comment_id}/resolve', description=f'resolve comment {comment_id}')
+
+
+def post_thread(course_id: int, title: str, content: str, type: t.Union[ThreadType, str] = ThreadType.POST,
+        category: str = '', subcategory: str = '', subsubcategory: str = '', is_pinned: bool = False,
+        is_private: bool = False, is_anonymous: bool = False, is_megathread: bool = False,
+        anonymous_comments: bool = False) -> Action:
+
+    thread = {
+        'type': type.value if isinstance(type, ThreadType) else ThreadType.from_str(type).value,
+        'title': title,
+        'content': to_document(content),
+        'category': category,
+        'subcategory': subcategory,
+        'subsubcategory': subsubcategory,
+        'is_pinned': is_pinned,
+        'is_private': is_private,
+        'is_anonymous': is_anonymous,
+        'is_megathread': is_megathread,
+        'anonymous_comments': anonymous_comments,
+    }
+    return Action('POST', f'/api/courses/{course_id}/threads', {'thread': thread},
+        description=f'post {thread["type"]} "{title}" in course {course_id}', idempotent=False)
+
+
+def post_comment(thread_id: int, content: str, answer: bool = False, is_private: bool = False,
+        is_anonymous: bool = False) -> Action:
+
+    comment = {'type': 'answer' if answer else 'comment', 'content': to_document(content),
+               'is_private': is_private, 'is_anonymous': is_anonymous}
+    return Action('POST', f'/api/threads/{thread_id}/comments', {'comment': comment},
+        description=f'post {comment["type"]} on thread {thread_id}', idempotent=False)
+
+
+def post_reply(comment_id: int, content: str, is_private: bool = False, is_anonymous: bool = False) -> Action:
+
+    comment = {'type': 'comment', 'content': to_document(content), 'is_private': is_private,
+               'is_anonymous': is_anonymous}
+    return Action('POST', f'/api/comments/{comment_id}/comments', {'comment': comment},
+        description=f'reply to comment {comment_id}', idempotent=False)
+
+
+class ActionResult:
+
+    __slots__ = ('index', 'action', 'status', 'response', 'error', 'attempts', 'duration')
+
+    def __init__(self, index: int, action: Action) -> None:
+        self.index = index      # position of the action in the batch
+        self.action = action
+        self.status: t.Optional[str] = None
+        self.response: t.Any = None
+        self.error: t.Optional[Exception] = None
+        self.attempts = 0       # requests sent, counting the transport's retries
+        self.duration = 0.0
+
+    @property
+    def retries(self) -> int:
+        return max(0, self.attempts - 1)
+
+    def _retrying(self, attempt: int):
+        self.attempts = attempt + 1
+
+    @property
+    def ok(self) -> bool:
+        return self.status in (STATUS_OK, STATUS_DRY_RUN)
+
+    def __repr__(self):
+        return f'<ActionResult {self.action.description}: {self.status}>'
+
+
+class ActionBatch:
+    """
+    Runs many actions concurrently over the client's session.
+
+    At most ``concurrency`` actions are in flight, on top of the client's rate
+    limiter, and actions are pulled from the iterable as slots free up, so a
+    generator of any length is never materialised. Retries are left to the
+    transport and its RateLimiter (``max_retries``), so each action is retried at
+    one layer only; each result records the ``attempts`` it took. With
+    ``dry_run`` no request is sent and every action is reported as ``'dry_run'``.
+
+    Iterate with ``async for`` to get each ActionResult as it completes, or await
+    ``run()`` for all of them in input order.
+    """
+
+    def __init__(self, client: 'EdClient', actions: t.Iterable[Action], concurrency: int = 20,
+            dry_run: bool = False) -> None:
+
+        if concurrency < 1:
+            raise ValueError('A batch needs a concurrency of at least 1.')
+
+        self.client = client
+        self.concurrency = concurrency
+        self.dry_run = dry_run
+
+        self._actions = actions
+        self._started = False
+
+        self.done = 0
+        self.succeeded = 0
+        self.failed = 0
+
+    def stats(self) -> dict:
+        return {'done': self.done, 'succeeded': self.succeeded, 'failed': self.failed}
+
+    async def run(self) -> t.List[ActionResult]:
+        results = [result async for result in self]
+        return sorted(results, key=lambda result: result.index)
+
+    async def __aiter__(self) -> t.AsyncIterator[ActionResult]:
+
+        if self._started:
+            raise RuntimeError('A batch can only be run once.')
+        self._started = True
+
+        if not self.dry_run and not self.client.logged_in:
+            await self.client._login()
+
+        actions = enumerate(iter(self._actions))
+        results: asyncio.Queue = asyncio.Queue()
+        workers = [asyncio.ensure_future(self._worker(actions, results)) for _ in range(self.concurrency)]
+        running = len(workers)
+        try:
+            while running:
+                result = await results.get()
+                if result is None:
+                    running -= 1
+                    continue
+                yield result
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    async def _worker(self, actions: t.Iterator[t.Tuple[int, Action]], results: asyncio.Queue):
+        try:
+            # workers share the iterator; next() never yields to the loop, so no action is taken twice
+            for index, action in actions:
+                results.put_nowait(await self._perform(ActionResult(index, action)))
+        finally:
+            results.put_nowait(None)
+
+    async def _perform(self, result: ActionResult) -> ActionResult:
+
+        action = result.action
+        started = time.perf_counter()
+        if self.dry_run:
+            result.status = STATUS_DRY_RUN
+        else:
+            result.attempts = 1
+            try:
+                result.response = await self.client._transport._request(action.method, action.endpoint,
+                    data=action.body, idempotent=action.idempotent, on_retry=result._retrying)
+            except Exception as error:
+                result.status, result.error = STATUS_FAILED, error
+            else:
+                result.status = STATUS_OK
+
+        result.duration = time.perf_counter() - started
+        self.done += 1
+        if result.status == STATUS_FAILED:
+            self.failed += 1
+            _log.warning('%s failed: %s', action.description, result.error)
+        else:
+            self.succeeded += 1
+        return result
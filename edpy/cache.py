@@ -0,0 +1,201 @@
+import re
+import time
+import typing as t
+from collections import OrderedDict
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .transport import Transport
+
+_THREAD_ENDPOINT = re.compile(r'^/api/threads/(\d+)$')
+_THREAD_WRITE = re.compile(r'^/api/threads/(\d+)(?:/|$)')
+_COMMENT_WRITE = re.compile(r'^/api/comments/(\d+)(?:/|$)')
+_COURSE_ENDPOINT = re.compile(r'^/api/courses/(\d+)(?:/|$)')
+
+CacheKey = t.Tuple[str, t.Optional[tuple]]
+
+
+class _Entry:
+
+    __slots__ = ('body', 'etag', 'last_modified', 'stored_at', 'course_id', 'thread_id')
+
+    def __init__(self, body: bytes, etag: t.Optional[str], last_modified: t.Optional[str],
+            course_id: t.Optional[int], thread_id: t.Optional[int]) -> None:
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.stored_at = time.monotonic()
+        self.course_id = course_id
+        self.thread_id = thread_id
+
+
+class ResponseCache:
+    """
+    LRU cache of GET response bodies, bounded to ``max_bytes`` and limited to
+    endpoints starting with one of ``prefixes``.
+
+    A cached thread is served without a request while its course is subscribed
+    on a live websocket, because ``thread.*`` and ``comment.*`` events drop it as
+    soon as it changes; a disconnect drops every entry of the courses it affected.
+    Other entries are served for ``max_age`` seconds and then revalidated with
+    If-None-Match / If-Modified-Since when the server sent an ETag or
+    Last-Modified, so an unchanged response costs a 304 instead of the full body.
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024, max_age: float = 0.0,
+            prefixes: t.Iterable[str] = ('/api/threads/', '/api/user')) -> None:
+
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.prefixes = tuple(prefixes)
+
+        self._transport: t.Optional['Transport'] = None
+        self._entries: 't.OrderedDict[CacheKey, _Entry]' = OrderedDict()
+        self._by_thread: t.Dict[int, t.Set[CacheKey]] = {}
+        self._by_course: t.Dict[int, t.Set[CacheKey]] = {}
+        self.size = 0
+        # bumped by every invalidation, so a response fetched across one is not stored
+        self.generation = 0
+
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def bind(self, transport: 'Transport'):
+        self._transport = transport
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        return {
+            'entries': len(self._entries),
+            'bytes': self.size,
+            'hits': self.hits,
+            'revalidated': self.revalidated,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+        }
+
+    def cacheable(self, endpoint: str) -> bool:
+        return endpoint.startswith(self.prefixes)
+
+    def get(self, key: CacheKey) -> t.Optional[_Entry]:
+        if (entry := self._entries.get(key)) is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def fresh(self, entry: _Entry) -> bool:
+        """Whether an entry can be served without asking the server."""
+
+        if entry.course_id is not None and entry.thread_id is not None and self._transport is not None \
+                and self._transport._course_live(entry.course_id):
+            return True
+        return time.monotonic() - entry.stored_at < self.max_age
+
+    def conditional_headers(self, entry: _Entry) -> t.Dict[str, str]:
+        headers = {}
+        if entry.etag:
+            headers['If-None-Match'] = entry.etag
+        if entry.last_modified:
+            headers['If-Modified-Since'] = entry.last_modified
+        return headers
+
+    def revalidated_entry(self, entry: _Entry):
+        entry.stored_at = time.monotonic()
+        self.revalidated += 1
+
+    def store(self, key: CacheKey, body: bytes, etag: t.Optional[str], last_modified: t.Optional[str],
+            data: t.Any = None, generation: t.Optional[int] = None):
+
+        if len(body) > self.max_bytes or (generation is not None and generation != self.generation):
+            return
+        self._remove(key)
+
+        thread = data.get('thread') if isinstance(data, dict) else None
+        course_id = thread.get('course_id') if isinstance(thread, dict) else None
+        if course_id is None and (match := _COURSE_ENDPOINT.match(key[0])) is not None:
+            course_id = int(match.group(1))     # thread lists and other course endpoints
+
+        match = _THREAD_ENDPOINT.match(key[0])
+        thread_id = int(match.group(1)) if match else None
+        self._entries[key] = _Entry(body, etag, last_modified, course_id, thread_id)
+        self.size += len(body)
+        if thread_id is not None:
+            self._by_thread.setdefault(thread_id, set()).add(key)
+        if course_id is not None:
+            self._by_course.setdefault(course_id, set()).add(key)
+
+        while self.size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key: CacheKey):
+
+        if (entry := self._entries.pop(key, None)) is None:
+            return
+        self.size -= len(entry.body)
+        for index, value in ((self._by_thread, entry.thread_id), (self._by_course, entry.course_id)):
+            if value is not None and (keys := index.get(value)) is not None:
+                keys.discard(key)
+                if not keys:
+                    del index[value]
+
+    def invalidate_thread(self, thread_id: t.Optional[int]):
+        self.generation += 1
+        for key in list(self._by_thread.get(thread_id, ())):
+            self._remove(key)
+            self.invalidations += 1
+
+    def invalidate_endpoint(self, endpoint: str, response: t.Any = None):
+        """
+        Drops what a write to ``endpoint`` may have changed: the thread it names,
+        the course it names, or for comment writes the thread of the comment,
+        taken from the ``response``. When a comment write does not say which
+        thread it touched, every cached thread is dropped.
+        """
+
+        if (match := _THREAD_WRITE.match(endpoint)) is not None:
+            self.invalidate_thread(int(match.group(1)))
+        elif (match := _COURSE_ENDPOINT.match(endpoint)) is not None:
+            self.invalidate_course(int(match.group(1)))
+        elif _COMMENT_WRITE.match(endpoint) is not None:
+            comment = response.get('comment') if isinstance(response, dict) else None
+            if isinstance(comment, dict) and comment.get('thread_id') is not None:
+                self.invalidate_thread(comment['thread_id'])
+            else:
+                self.invalidate_threads()
+
+    def invalidate_threads(self):
+        self.generation += 1
+        for thread_id in list(self._by_thread):
+            for key in list(self._by_thread.get(thread_id, ())):
+                self._remove(key)
+                self.invalidations += 1
+
+    def invalidate_course(self, course_id: int):
+        self.generation += 1
+        for key in list(self._by_course.get(course_id, ())):
+            self._remove(key)
+            self.invalidations += 1
+
+    def clear(self):
+        self.generation += 1
+        self._entries.clear()
+        self._by_thread.clear()
+        self._by_course.clear()
+        self.size = 0
+
+    def on_frame(self, event_type: str, data: dict):
+        """Drops the cached thread a websocket event changed."""
+
+        if event_type == 'thread.update':
+            self.invalidate_thread((data.get('thread') or {}).get('id'))
+        elif event_type in ('thread.delete', 'comment.delete'):
+            self.invalidate_thread(data.get('thread_id'))
+        elif event_type in ('comment.new', 'comment.update'):
+            self.invalidate_thread((data.get('comment') or {}).get('thread_id'))
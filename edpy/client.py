@@ -1,17 +1,44 @@
 import asyncio
 
+import time
 import logging
 import typing as t
-from collections import defaultdict
-from inspect import getmembers, ismethod
+from collections import deque
+from datetime import datetime, timezone
+from inspect import getmembers, isclass, isfunction, ismethod
 
+from . import actions
+from .actions import Action, ActionBatch
+from .cache import ResponseCache
+from .coalesce import EventCoalescer
+from .codec import JsonCodec
+from .dispatch import EventDispatcher
+from .events import Event
 from .errors import RequestError
+from .executor import HookExecutor, PooledHook
+from .journal import EventJournal, read_journal
+from .metrics import MetricsSink
+from .mirror import CourseMirror, MIRROR_EVENTS
+from .presence import PresenceRecorder
+from .ratelimit import RateLimiter
+from .recovery import GapRecovery
+from .snapshots import SnapshotStore
+from .stream import EventStream
+from .registry import HookRegistry
+from .shard import PROBE_INTERVAL, PROBE_TIMEOUT
+from .models.comment import Comment
 from .models.course import Course
-from .models.thread import Thread
+from .models.thread import Thread, ThreadType
 from .models.user import CourseUser
 from .models.endpoints.threads import GetThreadType
 
 from .transport import Transport
+from .utils import parse_time
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .relay import EventRelay
 
 _log = logging.getLogger('edpy.client')
 
@@ -29,21 +56,131 @@ def _ensure_login(func):
 
 class EdClient():
 
-    def __init__(self, ed_token: str = None) -> None:
+    def __init__(self, ed_token: str = None, cache_ttl: t.Optional[float] = 300,
+            dispatcher: t.Optional[EventDispatcher] = None, lazy_models: bool = False,
+            api_host: t.Optional[str] = None, shards: int = 1,
+            coalescer: t.Optional[EventCoalescer] = None, mirror: t.Optional[CourseMirror] = None,
+            recovery: t.Optional[GapRecovery] = None, rate_limiter: t.Optional[RateLimiter] = None,
+            journal: t.Optional[EventJournal] = None, metrics: t.Optional[MetricsSink] = None,
+            executor: t.Optional[HookExecutor] = None, relay: t.Optional['EventRelay'] = None,
+            response_cache: t.Optional[ResponseCache] = None,
+            presence: t.Optional[PresenceRecorder] = None,
+            snapshots: t.Optional[SnapshotStore] = None, codec: t.Optional[JsonCodec] = None,
+            probe_interval: t.Optional[float] = PROBE_INTERVAL, probe_timeout: float = PROBE_TIMEOUT,
+            standby: bool = False) -> None:
+
+        # listeners indexed by event type and course id
+        self._hooks = HookRegistry()
+        # lazy models read fields from the raw payload only when they are accessed;
+        # recovery backfills events missed while a websocket was reconnecting; standby
+        # keeps a second connection per shard so that a lost one leaves no gap
+        self._transport = Transport(self, ed_token, lazy_models=lazy_models, api_host=api_host,
+            shard_count=shards, coalescer=coalescer, recovery=recovery, rate_limiter=rate_limiter,
+            journal=journal, metrics=metrics, cache=response_cache, presence=presence,
+            snapshots=snapshots, codec=codec, probe_interval=probe_interval,
+            probe_timeout=probe_timeout, standby=standby)
+
+        # optional per-course online counts, recorded from raw course.count frames
+        self.presence = presence
+
+        # consumers of client.events(); ended when the client closes
+        self._streams: t.Set[EventStream] = set()
+
+        # optional sink for counters and histograms; None keeps the hot path free of them
+        self.metrics = metrics
+
+        # optional stage merging bursts of update events before they are dispatched
+        self.coalescer = coalescer
+        if coalescer is not None:
+            coalescer.bind(self._dispatch_event)
+
+        # optional in-memory copy of subscribed courses, updated before hooks run
+        self.mirror = mirror
+        self._seeding: t.Dict[int, asyncio.Task] = {}
+        if mirror is not None:
+            mirror.bind(self)
+
+        # optional queue + worker pool so hooks run off the websocket read loop
+        self.dispatcher = dispatcher
+        if dispatcher is not None:
+            dispatcher.bind(self._run_hooks)
+
+        # process/thread pools for listeners registered with an executor; one is
+        # created on demand if none is given
+        self.executor = executor
+        self._lazy_models = lazy_models
 
-        self._event_hooks = defaultdict(list)
-        self._transport = Transport(self, ed_token)
+        # optional local server sharing every frame received with RelayClients
+        self.relay = relay
+        if relay is not None:
+            relay.bind(self)
         
         self.logged_in = False
         self.is_subscribed = False
 
+        # cached /api/user payload; a ttl of None keeps it until invalidated
+        self.cache_ttl = cache_ttl
+        self._user_data: t.Optional[dict] = None
+        self._user_fetched_at = 0.0
+        self._user_fetch: t.Optional[asyncio.Task] = None
+        # bumped on invalidation, so a fetch already under way does not store its stale reply
+        self._user_generation = 0
+        self._courses: t.Dict[int, Course] = {}
+
     async def _login(self):
         
-        res = await self._transport._request('GET', '/api/user')
+        res = await self._get_user_data()
         user = res.get('user')
         _log.info('Logged in as {} ({})'.format(user['name'], user['email']))
         self.logged_in = True
 
+    def invalidate_cache(self):
+        """Drops the cached user and course data so the next lookup refetches it."""
+        self._user_data = None
+        self._courses = {}
+        self._user_generation += 1
+        self._user_fetch = None
+
+    def _cache_fresh(self) -> bool:
+        if self._user_data is None:
+            return False
+        if self.cache_ttl is None:
+            return True
+        return time.monotonic() - self._user_fetched_at < self.cache_ttl
+
+    async def _get_user_data(self, force: bool = False) -> dict:
+        """
+        Returns the /api/user payload, fetching it at most once at a time no matter
+        how many callers are waiting on it.
+        """
+
+        if not force and self._cache_fresh():
+            return self._user_data
+
+        if self._user_fetch is None:
+            self._user_fetch = asyncio.ensure_future(self._fetch_user_data())
+        # shield so a cancelled caller does not cancel the fetch other callers share
+        return await asyncio.shield(self._user_fetch)
+
+    async def _fetch_user_data(self) -> dict:
+
+        generation = self._user_generation
+        try:
+            res = await self._transport._request('GET', '/api/user')
+            if res is None:
+                raise RequestError('Failed to fetch user data.')
+            if generation != self._user_generation:
+                return res      # invalidated meanwhile; a later lookup refetches
+
+            self._user_data = res
+            self._user_fetched_at = time.monotonic()
+            self._courses = {course.id: course for course in
+                (Course(course.get('course')) for course in res.get('courses'))}
+            return res
+        finally:
+            if generation == self._user_generation:
+                self._user_fetch = None
+
     @_ensure_login
     async def subscribe(self, course_ids: t.Optional[t.Union[int, t.List]] = None):
         
@@ -51,61 +188,357 @@ class EdClient():
         course_ids = course_ids or [course.id for course in await self.get_courses()]
         course_ids = course_ids if isinstance(course_ids, t.Iterable) else [course_ids]
 
+        for course_id in course_ids:
+            assert isinstance(course_id, int)
+
         self.is_subscribed = True
-        while self.is_subscribed:
-            
-            for course_id in course_ids:
-                assert isinstance(course_id, int)
-                await self._transport._send({'type': 'course.subscribe', 'oid': course_id})
+        if self.relay is not None:
+            await self.relay.start()
+        for course_id in course_ids:
+            self._seed_mirror(course_id)
+        try:
+            await self._transport.subscribe(course_ids)
+        finally:
+            self.is_subscribed = False
 
-            await self._transport._connect()
+    async def add_course(self, course_id: int):
+        """Subscribes to another course at runtime without restarting the other shards."""
+        assert isinstance(course_id, int)
+        self._seed_mirror(course_id)
+        await self._transport.add_course(course_id)
+
+    def _seed_mirror(self, course_id: int):
+        """Seeds the mirror in the background while events for the course already flow in."""
+
+        if self.mirror is None:
+            return
+
+        async def seed():
+            try:
+                await self.mirror.seed(course_id)
+            except Exception:
+                _log.exception('Failed to seed mirror for course %s', course_id)
+
+        def done(task: asyncio.Task):
+            # a course removed and added again has a newer seed in its place
+            if self._seeding.get(course_id) is task:
+                del self._seeding[course_id]
+
+        task = self._seeding[course_id] = asyncio.ensure_future(seed())
+        task.add_done_callback(done)
+
+    async def remove_course(self, course_id: int):
+        """Unsubscribes from a course at runtime; only the shard carrying it reconnects."""
+        await self._transport.remove_course(course_id)
+        if self.mirror is not None:
+            # no events keep the course's threads current any more
+            if (task := self._seeding.pop(course_id, None)) is not None:
+                task.cancel()
+            self.mirror.drop_course(course_id)
+
+    async def wait_subscribed(self, timeout: t.Optional[float] = None):
+        """Waits until Ed has acknowledged the subscription of every course."""
+        await self._transport.wait_subscribed(timeout)
+
+    async def rebalance(self):
+        """Evens out the number of courses carried by each websocket shard."""
+        await self._transport.rebalance()
+
+    async def replay(self, path: str, speed: t.Optional[float] = None,
+            start: t.Union[datetime, float, None] = None, end: t.Union[datetime, float, None] = None,
+            course_ids: t.Optional[t.Iterable[int]] = None) -> int:
+        """
+        Feeds messages recorded by an EventJournal at ``path`` back through the
+        registered listeners, marked as replayed. Only the listeners see them: the
+        response cache, snapshots, mirror and relay keep the live state. With
+        ``speed`` None they are replayed as fast as possible; otherwise the recorded
+        gaps are kept, divided by ``speed``. Returns the number of messages replayed.
+        """
+
+        count, previous = 0, None
+        for received_at, _, text in read_journal(path, start=start, end=end, course_ids=course_ids):
+            if speed and previous is not None and received_at > previous:
+                await asyncio.sleep((received_at - previous) / speed)
+            previous = received_at
+
+            await self._transport._handle_message(self._transport.codec.loads(text), replayed=True, history=True)
+            count += 1
+            if not speed and count % 1024 == 0:
+                await asyncio.sleep(0)  # let other tasks run during long replays
+        return count
 
-    """
     async def close(self):
+        for task in self._seeding.values():
+            task.cancel()
+        for stream in self._streams:
+            stream.close()
+        if self.relay is not None:
+            await self.relay.close()
         await self._transport.close()
+        if self.coalescer is not None:
+            await self.coalescer.close()
+        if self.dispatcher is not None:
+            await self.dispatcher.close()
+        if self.executor is not None:
+            await self.executor.close()
         self.is_subscribed = False
-    """
 
     @_ensure_login
     async def get_course(self, course_id: int) -> Course:
-        if (course := next(filter(lambda x: x.id == course_id, await self.get_courses()), None)):
+        await self._get_user_data()
+        if (course := self._courses.get(course_id)):
             return course
         raise RequestError('Invalid course ID.')
 
     @_ensure_login
     async def get_courses(self) -> t.List[Course]:
-        res = await self._transport._request('GET', '/api/user')
-        return [Course(course.get('course')) for course in res.get('courses')]
+        await self._get_user_data()
+        return list(self._courses.values())
     
     @_ensure_login
     async def get_thread(self, thread_id) -> GetThreadType:
 
         res = await self._transport._request('GET', f'/api/threads/{thread_id}')
-        thread = Thread(res.get('thread'))
+        thread = Thread.lazy(res.get('thread'))
         users = [CourseUser(user) for user in res.get('users')]
         return GetThreadType(thread=thread, users=users)
 
+    @_ensure_login
+    async def get_threads(self, thread_ids: t.Iterable[int],
+            concurrency: int = 10) -> t.List[t.Union[GetThreadType, Exception]]:
+        """
+        Fetches many threads with at most ``concurrency`` requests in flight. Results
+        are in input order; a thread that could not be fetched is returned as the
+        exception raised for it instead of failing the whole batch.
+        """
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch(thread_id):
+            async with semaphore:
+                try:
+                    return await self.get_thread(thread_id)
+                except Exception as error:
+                    return error
+
+        return await asyncio.gather(*(fetch(thread_id) for thread_id in thread_ids))
+
+    @_ensure_login
+    async def list_threads(self, course_id: int, limit: int = 30, offset: int = 0, sort: str = 'new',
+            category: t.Optional[str] = None, type: t.Union[ThreadType, str, None] = None) -> t.List[Thread]:
+        """Returns one page of a course's thread listing. Threads are lazy and carry no comments."""
+
+        params = {'limit': limit, 'offset': offset, 'sort': sort}
+        if category is not None:
+            params['category'] = category
+        if type is not None:
+            params['type'] = type.value if isinstance(type, ThreadType) else type
+
+        res = await self._transport._request('GET', f'/api/courses/{course_id}/threads', params=params)
+        return [Thread.lazy(thread) for thread in res.get('threads')]
+
+    async def iter_threads(self, course_id: int, sort: str = 'new', limit: t.Optional[int] = None,
+            page_size: int = 30, prefetch: int = 2, category: t.Optional[str] = None,
+            type: t.Union[ThreadType, str, None] = None,
+            since: t.Union[datetime, str, None] = None) -> t.AsyncIterator[Thread]:
+        """
+        Yields every thread of a course, up to ``limit``, while fetching the next
+        ``prefetch`` pages concurrently. At most ``prefetch + 1`` pages are held at
+        once regardless of the size of the course.
+
+        ``category`` and ``type`` are sent with the request; ``since`` keeps threads
+        created at or after that time and, when sorting by ``'new'``, stops paging
+        at the first older thread.
+        """
+
+        if not self.logged_in:
+            await self._login()
+
+        if (since := parse_time(since)) is not None and since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        thread_type = ThreadType.from_str(type) if isinstance(type, str) else type
+
+        def fetch(page: int) -> asyncio.Task:
+            return asyncio.ensure_future(self.list_threads(course_id, limit=page_size,
+                offset=page * page_size, sort=sort, category=category, type=thread_type))
+
+        pages = deque(fetch(page) for page in range(prefetch + 1))
+        next_page, count = prefetch + 1, 0
+        try:
+            while pages:
+                threads = await pages.popleft()
+                if len(threads) < page_size:
+                    # last page; anything fetched past it is empty
+                    for task in pages:
+                        task.cancel()
+                    pages.clear()
+                else:
+                    pages.append(fetch(next_page))
+                    next_page += 1
+
+                for thread in threads:
+                    # filters are applied again in case the server ignored them
+                    if category is not None and thread.category != category:
+                        continue
+                    if thread_type is not None and thread.type is not thread_type:
+                        continue
+                    if since is not None and (created_at := parse_time(thread.created_at)) is not None \
+                            and created_at < since:
+                        if sort == 'new':
+                            return
+                        continue
+
+                    yield thread
+                    count += 1
+                    if limit is not None and count >= limit:
+                        return
+        finally:
+            for task in pages:
+                task.cancel()
+
+    @_ensure_login
+    async def perform(self, action: Action) -> t.Any:
+        """Sends one write action, e.g. ``actions.lock_thread(123)``, and returns Ed's response."""
+        return await self._transport._request(action.method, action.endpoint, data=action.body,
+            idempotent=action.idempotent)
+
+    async def post_thread(self, course_id: int, title: str, content: str,
+            type: t.Union[ThreadType, str] = ThreadType.POST, **options) -> Thread:
+        """
+        Posts a thread. ``content`` is plain text or Ed document markup; ``options``
+        are the other fields of ``actions.post_thread``, e.g. ``category``.
+        """
+        res = await self.perform(actions.post_thread(course_id, title, content, type, **options))
+        return Thread.lazy(res.get('thread'))
+
+    async def post_comment(self, thread_id: int, content: str, answer: bool = False, **options) -> Comment:
+        """Posts a comment, or an answer with ``answer=True``, on a thread."""
+        res = await self.perform(actions.post_comment(thread_id, content, answer, **options))
+        return Comment.lazy(res.get('comment'))
+
+    async def post_reply(self, comment_id: int, content: str, **options) -> Comment:
+        """Replies to a comment."""
+        res = await self.perform(actions.post_reply(comment_id, content, **options))
+        return Comment.lazy(res.get('comment'))
+
+    def batch(self, actions: t.Iterable[Action], concurrency: int = 20, dry_run: bool = False) -> ActionBatch:
+        """
+        Prepares many actions to run concurrently; iterate the batch with ``async
+        for`` to follow progress, or await its ``run()``.
+        """
+        return ActionBatch(self, actions, concurrency=concurrency, dry_run=dry_run)
 
     def add_event_hooks(self, cls):
         
+        if isclass(cls):
+            # the functions of a class are unbound and would be called without ``self``
+            raise TypeError(f'add_event_hooks takes an instance of {cls.__name__}, not the class itself')
+
+        # staticmethods are included, as process pool listeners must be plain functions
         methods = getmembers(cls, predicate=lambda meth: hasattr(meth, '__name__')
-            and not meth.__name__.startswith('_') and ismethod(meth)
+            and not meth.__name__.startswith('_') and (ismethod(meth) or isfunction(meth))
             and hasattr(meth, '_ed_events'))
         
         for _, listener in methods:
-            events = listener._ed_events
+            events, filters = listener._ed_events, getattr(listener, '_ed_filters', {})
+            if (kind := getattr(listener, '_ed_executor', None)) is not None:
+                if self.executor is None:
+                    self.executor = HookExecutor(lazy_models=self._lazy_models)
+                listener = PooledHook(listener, kind, self.executor, on_error=self._on_hook_error)
             for event in events:
-                self._event_hooks[event.__name__].append(listener)
+                self._add_hook(event, listener, filters)
+
+    def _add_hook(self, event: t.Type[Event], func: t.Callable, filters: dict):
 
-    async def _dispatch_event(self, event):
+        if filters.get('fields') is not None and self._transport.snapshots is None:
+            # field filters need the last known state to diff updates against
+            self._transport.snapshots = SnapshotStore()
+        self._hooks.add(event, func, **filters)
 
-        hooks = self._event_hooks[type(event).__name__]
+    async def events(self, *events: t.Type[Event], max_batch: int = 100, max_wait: float = 0.5,
+            max_size: int = 1000, overflow: str = 'block', **filters) -> t.AsyncIterator[t.List[Event]]:
+        """
+        Yields lists of events of the given types, each flushed once it holds
+        ``max_batch`` events or ``max_wait`` seconds after the first one is
+        waiting. Events are buffered from the first iteration on, up to
+        ``max_size``, with ``overflow`` handled as described in EventStream.
+        ``filters`` are the same as for ``listener``. Listeners registered with
+        ``add_event_hooks`` keep receiving the same events.
+        """
+
+        stream = EventStream(max_batch=max_batch, max_wait=max_wait, max_size=max_size, overflow=overflow)
+        hook = stream.put
+        for event in events:
+            self._add_hook(event, hook, filters)
+        self._streams.add(stream)
+        try:
+            async for batch in stream:
+                yield batch
+        finally:
+            self._hooks.remove(hook)
+            self._streams.discard(stream)
+            stream.close()
+
+    def _wants_type(self, event_cls) -> bool:
+        """Whether events of this type are used at all, before looking at a frame."""
+        if self.mirror is not None and event_cls in MIRROR_EVENTS:
+            return True
+        return self._hooks.has(event_cls.__name__)
+
+    def _wants_event(self, event_type: str, event_cls, data: dict, changes: t.Optional[dict] = None) -> bool:
+        """Whether a frame needs to be built at all, judged from its raw payload."""
+        if self.mirror is not None and event_cls in MIRROR_EVENTS:
+            return True
+        return self._hooks.matches_frame(event_cls.__name__, event_type, data, changes)
+
+    async def _dispatch_event(self, event, history: bool = False):
+
+        if event is None:
+            return
+
+        # journal replays are history and must not roll the mirror back
+        if self.mirror is not None and not history and isinstance(event, MIRROR_EVENTS):
+            self.mirror.apply(event)
+
+        if self.dispatcher is not None:
+            if self._hooks.hooks_for(event):
+                await self.dispatcher.put(event)
+            return
+
+        await self._run_hooks(event)
+
+    async def _run_hooks(self, event):
+
+        hooks = self._hooks.hooks_for(event)
 
         if not hooks:
             return
-        
-        async def _hook_wrapper(hook, event):
-            await hook(event)
 
-        tasks = [_hook_wrapper(hook, event) for hook in hooks]
+        if (metrics := self.metrics) is not None:
+            name = type(event).__name__
+            metrics.inc('edpy_events_dispatched_total', type=name)
+            if event.received_at is not None:
+                metrics.observe('edpy_dispatch_latency_seconds', time.perf_counter() - event.received_at,
+                    type=name)
+
+        tasks = [self._run_hook(hook, event) for hook in hooks]
         await asyncio.gather(*tasks)
+
+    async def _run_hook(self, hook, event):
+
+        metrics = self.metrics
+        started = time.perf_counter() if metrics is not None else 0.0
+        try:
+            await hook(event)
+        except Exception:
+            # one failing hook must not take down the others or the listen loop
+            _log.exception('Unhandled exception in event hook %s', hook.__qualname__)
+            self._on_hook_error(hook)
+        finally:
+            if metrics is not None:
+                metrics.observe('edpy_hook_duration_seconds', time.perf_counter() - started,
+                    hook=hook.__qualname__)
+
+    def _on_hook_error(self, hook):
+        if self.metrics is not None:
+            self.metrics.inc('edpy_hook_errors_total', hook=hook.__qualname__)
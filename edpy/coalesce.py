@@ -0,0 +1,147 @@
+import asyncio
+import logging
+import typing as t
+
+from .events import (Event, ThreadUpdateEvent, ThreadDeleteEvent, CommentUpdateEvent,
+                     CommentDeleteEvent)
+from .models.comment import Comment
+from .models.thread import Thread
+from .snapshots import merge_changes
+
+_log = logging.getLogger('edpy.coalesce')
+
+
+def _merge_payload(previous: Event, event: Event):
+    """Rebuilds the model of ``event`` from both payloads, ``event`` winning."""
+
+    if isinstance(event, ThreadUpdateEvent):
+        raw = {**previous.thread._raw, **event.thread._raw}
+        event.thread = Thread.lazy(raw) if event.thread._lazy else Thread(raw, **raw)
+    else:
+        raw = {**previous.comment._raw, **event.comment._raw}
+        event.comment = Comment.lazy(raw) if event.comment._lazy else Comment.eager(raw)
+
+
+class EventCoalescer:
+    """
+    Collapses bursts of ``thread.update`` / ``comment.update`` events so one update
+    per thread or comment id reaches the hooks.
+
+    An update is held for ``window`` seconds; every further update for the same id
+    is merged into it and restarts the window, but no update is held longer than
+    ``max_delay`` seconds after the first one of its burst. Updates may carry only
+    the changed fields, so the payloads are merged, later values winning. A delete
+    cancels any pending update for the same id, and a thread delete those for the
+    thread's comments too; deletes are dispatched right away.
+    """
+
+    def __init__(self, window: float = 0.5, max_delay: float = 2.0) -> None:
+
+        if window <= 0 or max_delay < window:
+            raise ValueError('Coalescing needs 0 < window <= max_delay.')
+
+        self.window = window
+        self.max_delay = max_delay
+
+        self._emit: t.Optional[t.Callable[[Event], t.Awaitable]] = None
+        # (kind, id) -> [latest event, time first seen, flush timer]
+        self._pending: t.Dict[t.Tuple[str, int], list] = {}
+        self._tasks: t.Set[asyncio.Task] = set()
+
+        self.merged = 0
+        self.cancelled = 0
+        self.flushed = 0
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def bind(self, emit: t.Callable[[Event], t.Awaitable]):
+        self._emit = emit
+
+    def stats(self) -> dict:
+        return {
+            'pending': self.pending,
+            'merged': self.merged,
+            'cancelled': self.cancelled,
+            'flushed': self.flushed,
+        }
+
+    def offer(self, event: Event) -> bool:
+        """
+        Returns True if the event was taken over by the coalescer and must not be
+        dispatched by the caller.
+        """
+
+        if isinstance(event, ThreadUpdateEvent):
+            key = ('thread', event.thread.id)
+        elif isinstance(event, CommentUpdateEvent):
+            key = ('comment', event.comment.id)
+        elif isinstance(event, ThreadDeleteEvent):
+            thread_id = event.thread.id
+            self._cancel(('thread', thread_id))
+            # deletes are rare, so the pending comments are scanned rather than indexed
+            for key in [key for key, entry in self._pending.items()
+                        if key[0] == 'comment' and entry[0].comment.thread_id == thread_id]:
+                self._cancel(key)
+            return False
+        elif isinstance(event, CommentDeleteEvent):
+            self._cancel(('comment', event.comment.id))
+            return False
+        else:
+            return False
+
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+
+        if (entry := self._pending.get(key)) is not None:
+            _merge_payload(entry[0], event)
+            event.changes = merge_changes(entry[0].changes, event.changes)
+            entry[0] = event
+            entry[2].cancel()
+            self.merged += 1
+            deadline = min(now + self.window, entry[1] + self.max_delay)
+        else:
+            entry = self._pending[key] = [event, now, None]
+            deadline = now + self.window
+
+        entry[2] = loop.call_at(deadline, self._flush, key)
+        return True
+
+    def _cancel(self, key: t.Tuple[str, int]):
+        if (entry := self._pending.pop(key, None)) is not None:
+            entry[2].cancel()
+            self.cancelled += 1
+
+    def _flush(self, key: t.Tuple[str, int]):
+
+        if (entry := self._pending.pop(key, None)) is None:
+            return
+
+        self.flushed += 1
+        task = asyncio.create_task(self._emit(entry[0]))
+        self._tasks.add(task)
+        task.add_done_callback(self._on_done)
+
+    def _on_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            _log.error('Dispatching coalesced event failed', exc_info=task.exception())
+
+    async def flush(self):
+        """Dispatches every pending update now."""
+
+        for key in list(self._pending):
+            self._pending[key][2].cancel()
+            self._flush(key)
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def close(self):
+        """Drops every pending update and waits for in-flight dispatches."""
+
+        for entry in self._pending.values():
+            entry[2].cancel()
+        self._pending.clear()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
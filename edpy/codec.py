@@ -0,0 +1,61 @@
+import re
+import json
+import typing as t
+
+try:
+    import orjson
+except ImportError:     # optional; the stdlib codec is used without it
+    orjson = None
+
+# the top-level "type" of a frame, when it is the first key as Ed sends it
+_FRAME_TYPE = re.compile(r'\{\s*"type"\s*:\s*"([a-z_.]+)"')
+_COMPACT_PREFIX = '{"type":"'
+_SPACED_PREFIX = '{"type": "'
+
+
+def peek_type(text: str) -> t.Optional[str]:
+    """
+    Reads the event type from the start of a raw frame without decoding it.
+    Returns None when the frame does not start with its type.
+    """
+
+    # plain prefix checks first; they are several times cheaper than the regex
+    for prefix in (_COMPACT_PREFIX, _SPACED_PREFIX):
+        if text.startswith(prefix):
+            end = text.find('"', len(prefix))
+            return text[len(prefix):end] if end > 0 else None
+    match = _FRAME_TYPE.match(text)
+    return match.group(1) if match else None
+
+
+class JsonCodec:
+    """Decodes frames and responses with the stdlib ``json`` module."""
+
+    name = 'json'
+
+    def loads(self, data: t.Union[str, bytes]) -> t.Any:
+        return json.loads(data)
+
+    def dumps(self, value: t.Any) -> str:
+        return json.dumps(value, separators=(',', ':'))
+
+
+class OrjsonCodec(JsonCodec):
+    """Decodes with ``orjson``, several times faster on large thread payloads."""
+
+    name = 'orjson'
+
+    def __init__(self) -> None:
+        if orjson is None:
+            raise RuntimeError('OrjsonCodec requires orjson; install it with `pip install orjson`.')
+
+    def loads(self, data: t.Union[str, bytes]) -> t.Any:
+        return orjson.loads(data)
+
+    def dumps(self, value: t.Any) -> str:
+        return orjson.dumps(value).decode()
+
+
+def default_codec() -> JsonCodec:
+    """The stdlib codec; pass ``codec=OrjsonCodec()`` to a client to opt into orjson."""
+    return JsonCodec()
@@ -0,0 +1,198 @@
+import asyncio
+import logging
+import typing as t
+from collections import Counter, deque
+from itertools import count
+
+from .events import (Event, ThreadNewEvent, ThreadUpdateEvent, ThreadDeleteEvent, CommentNewEvent,
+                     CommentUpdateEvent, CommentDeleteEvent, CourseCountEvent)
+
+_log = logging.getLogger('edpy.dispatch')
+
+OVERFLOW_BLOCK = 'block'
+OVERFLOW_DROP_OLDEST = 'drop_oldest'
+OVERFLOW_DROP = 'drop'
+
+OVERFLOW_POLICIES = (OVERFLOW_BLOCK, OVERFLOW_DROP_OLDEST, OVERFLOW_DROP)
+
+
+def _ordering_key(event: Event) -> t.Optional[int]:
+    """Returns the id events must stay ordered by, which is the thread they belong to."""
+
+    if isinstance(event, (ThreadNewEvent, ThreadUpdateEvent, ThreadDeleteEvent)):
+        return event.thread.id
+    if isinstance(event, (CommentNewEvent, CommentUpdateEvent, CommentDeleteEvent)):
+        return event.comment.thread_id
+    if isinstance(event, CourseCountEvent):
+        return event.course_id
+    return None
+
+
+class EventDispatcher:
+    """
+    Bounded event queue drained by a pool of worker tasks, so slow hooks do not
+    block the websocket from being read.
+
+    Events are sharded across workers by thread id, so updates to the same thread
+    are always handled in the order they were received. ``max_size`` bounds the
+    events queued across all workers together, so a single busy thread can use
+    all of it. When it is reached the ``overflow`` policy decides what happens:
+
+    - ``'block'``: wait for space, which pushes back on the websocket reader.
+    - ``'drop_oldest'``: discard the oldest queued event to make room.
+    - ``'drop'``: discard the incoming event if its type is listed in
+      ``drop_types``, otherwise wait for space.
+
+    ``close`` lets the workers handle what is still queued for up to
+    ``drain_timeout`` seconds; events left after that are counted in
+    ``discarded``.
+    """
+
+    def __init__(self, workers: int = 4, max_size: int = 1000, overflow: str = OVERFLOW_BLOCK,
+            drop_types: t.Iterable[t.Type[Event]] = (), drain_timeout: t.Optional[float] = 5.0) -> None:
+
+        if workers < 1:
+            raise ValueError('Dispatcher needs at least one worker.')
+        if max_size < 1:
+            raise ValueError('Dispatcher needs room for at least one event.')
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f'Invalid overflow policy: {overflow}')
+
+        self.workers = workers
+        self.max_size = max_size
+        self.overflow = overflow
+        self.drop_types = tuple(drop_types)
+        self.drain_timeout = drain_timeout
+
+        self._handler: t.Optional[t.Callable[[Event], t.Awaitable]] = None
+        # per worker, (arrival number, event) so the oldest event overall can be found
+        self._queues: t.List['t.Deque[t.Tuple[int, Event]]'] = []
+        self._ready: t.List[asyncio.Event] = []
+        self._tasks: t.List[asyncio.Task] = []
+        self._round_robin = count()
+        self._arrivals = count()
+
+        self._size = 0          # queued, across every worker
+        self._unfinished = 0    # queued or being handled
+        self._space: t.Optional[asyncio.Event] = None
+        self._idle: t.Optional[asyncio.Event] = None
+
+        self.dropped: t.Counter[str] = Counter()
+        self.processed = 0
+        self.discarded = 0
+
+    @property
+    def depth(self) -> int:
+        """Number of events currently waiting in the queues."""
+        return self._size
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def bind(self, handler: t.Callable[[Event], t.Awaitable]):
+        self._handler = handler
+
+    def stats(self) -> dict:
+        return {
+            'depth': self.depth,
+            'processed': self.processed,
+            'dropped': sum(self.dropped.values()),
+            'dropped_by_type': dict(self.dropped),
+            'discarded': self.discarded,
+        }
+
+    def start(self):
+
+        if self._tasks:
+            return
+        if self._handler is None:
+            raise RuntimeError('Dispatcher is not bound to a client.')
+
+        self._queues = [deque() for _ in range(self.workers)]
+        self._ready = [asyncio.Event() for _ in range(self.workers)]
+        self._space, self._idle = asyncio.Event(), asyncio.Event()
+        self._idle.set()
+        self._tasks = [asyncio.create_task(self._worker(index)) for index in range(self.workers)]
+
+    async def put(self, event: Event):
+
+        if not self._tasks:
+            self.start()
+
+        while self._size >= self.max_size:
+            if self.overflow == OVERFLOW_DROP_OLDEST:
+                self._drop_oldest()
+            elif self.overflow == OVERFLOW_DROP and isinstance(event, self.drop_types):
+                self._record_drop(event)
+                return
+            else:
+                self._space.clear()
+                await self._space.wait()
+
+        key = _ordering_key(event)
+        index = (key if key is not None else next(self._round_robin)) % self.workers
+        self._queues[index].append((next(self._arrivals), event))
+        self._size += 1
+        self._unfinished += 1
+        self._idle.clear()
+        self._ready[index].set()
+
+    def _drop_oldest(self):
+
+        queue = min((queue for queue in self._queues if queue), key=lambda queue: queue[0][0])
+        _, dropped = queue.popleft()
+        self._size -= 1
+        self._finished()
+        self._record_drop(dropped)
+
+    def _record_drop(self, event: Event):
+        name = type(event).__name__
+        self.dropped[name] += 1
+        _log.debug('Dispatch queue full; dropped %s.', name)
+
+    def _finished(self):
+        self._unfinished -= 1
+        if not self._unfinished:
+            self._idle.set()
+
+    async def _worker(self, index: int):
+
+        queue, ready = self._queues[index], self._ready[index]
+        while True:
+            if not queue:
+                ready.clear()
+                await ready.wait()
+                continue
+            _, event = queue.popleft()
+            self._size -= 1
+            self._space.set()
+            try:
+                await self._handler(event)
+            except Exception:
+                _log.exception('Unhandled exception in event hook for %s', type(event).__name__)
+            finally:
+                self.processed += 1
+                self._finished()
+
+    async def join(self):
+        """Waits until every queued event has been handled."""
+        if self._idle is not None:
+            await self._idle.wait()
+
+    async def close(self):
+
+        if self._tasks:
+            try:
+                await asyncio.wait_for(self.join(), self.drain_timeout)
+            except asyncio.TimeoutError:
+                pass
+        if self._size:
+            self.discarded += self._size
+            _log.warning('Dispatcher closed with %d events still queued; they were discarded.', self._size)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queues, self._ready = [], []
+        self._size = self._unfinished = 0
@@ -1,5 +1,18 @@
+import typing as t
+
+
 class AuthenticationError(Exception):
     """Raised when a request fails due to invalid authentication."""
 
 class RequestError(Exception):
-    """Raised when a request to the Ed server fails."""
\ No newline at end of file
+    """Raised when a request to the Ed server fails."""
+
+    def __init__(self, message: str = '', status: t.Optional[int] = None, transient: t.Optional[bool] = None) -> None:
+        super().__init__(message)
+        # HTTP status of the failed response; None if no response was received
+        self.status = status
+        # whether sending the request again later may succeed: throttling, server
+        # errors and connection failures, which say so explicitly
+        self.transient = transient if transient is not None else status is not None and (
+            status == 429 or status >= 500)
+
@@ -2,7 +2,14 @@ from .models.comment import Comment
 from .models.thread import Thread
 
 class Event:
-    pass
+    # set on events that were not received live: backfilled after a reconnect or
+    # replayed from a journal
+    replayed = False
+    # time.perf_counter() when the frame carrying the event was read off the websocket
+    received_at = None
+    # on update events with a SnapshotStore: {field: (old, new)}, or None if the
+    # previous state was unknown
+    changes = None
 
 class ThreadNewEvent(Event):
    """Event when new thread is created"""
@@ -45,4 +52,40 @@ class CourseCountEvent(Event):
 
    def __init__(self, course_id, count) -> None:
       self.course_id = course_id
-      self.count = count
\ No newline at end of file
+      self.count = count
+
+
+# websocket event type -> event class
+EVENT_TYPES = {
+    'thread.new': ThreadNewEvent,
+    'thread.update': ThreadUpdateEvent,
+    'thread.delete': ThreadDeleteEvent,
+    'comment.new': CommentNewEvent,
+    'comment.update': CommentUpdateEvent,
+    'comment.delete': CommentDeleteEvent,
+    'course.count': CourseCountEvent,
+}
+
+def build_event(event_type: str, data: dict, lazy: bool = False) -> Event:
+    """Builds the event object for a websocket frame of the given type."""
+
+    if event_type in ('thread.new', 'thread.update'):
+        data = data.get('thread')
+        thread = Thread.lazy(data) if lazy else Thread(data, **data)
+        return EVENT_TYPES[event_type](thread)
+
+    if event_type == 'thread.delete':   # only id is nontrivial
+        return ThreadDeleteEvent(Thread(data, id=data.get('thread_id')))
+
+    if event_type in ('comment.new', 'comment.update'):
+        data = data.get('comment')
+        comment = Comment.lazy(data) if lazy else Comment(data, **data)
+        return EVENT_TYPES[event_type](comment)
+
+    if event_type == 'comment.delete':  # only id and thread_id are nontrivial
+        return CommentDeleteEvent(Comment(data, id=data.get('comment_id'), thread_id=data.get('thread_id')))
+
+    if event_type == 'course.count':
+        return CourseCountEvent(data.get('id'), data.get('count'))
+
+    raise ValueError(f'Unknown event type: {event_type}')
@@ -0,0 +1,181 @@
+import os
+import asyncio
+import logging
+import typing as t
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from inspect import iscoroutinefunction, ismethod
+
+from .events import (Event, EVENT_TYPES, ThreadNewEvent, ThreadUpdateEvent, CommentNewEvent,
+                     CommentUpdateEvent, CourseCountEvent, build_event)
+
+_log = logging.getLogger('edpy.executor')
+
+EXECUTOR_PROCESS = 'process'
+EXECUTOR_THREAD = 'thread'
+
+EXECUTORS = (EXECUTOR_PROCESS, EXECUTOR_THREAD)
+
+# event class name -> websocket event type
+_FRAME_TYPES = {event_cls.__name__: event_type for event_type, event_cls in EVENT_TYPES.items()}
+
+
+def event_payload(event: Event) -> t.Tuple[str, dict]:
+    """
+    Returns the websocket event type and frame data an event was built from, which
+    is all a worker process needs to build it again.
+    """
+
+    event_type = _FRAME_TYPES[type(event).__name__]
+    if isinstance(event, (ThreadNewEvent, ThreadUpdateEvent)):
+        return event_type, {'thread': event.thread._raw}
+    if isinstance(event, (CommentNewEvent, CommentUpdateEvent)):
+        return event_type, {'comment': event.comment._raw}
+    if isinstance(event, CourseCountEvent):
+        return event_type, {'id': event.course_id, 'count': event.count}
+    # delete events keep the frame data itself
+    return event_type, (event.thread._raw if hasattr(event, 'thread') else event.comment._raw)
+
+
+def _call_hook(func: t.Callable, event_type: str, data: dict, lazy: bool, replayed: bool,
+        changes: t.Optional[dict]) -> t.Any:
+    """Runs in the worker process: rebuilds the event and calls the hook with it."""
+
+    event = build_event(event_type, data, lazy=lazy)
+    event.replayed = replayed
+    event.changes = changes
+    return func(event)
+
+
+class HookExecutor:
+    """
+    Runs CPU-heavy listeners off the event loop, in a process pool or a thread
+    pool, both started on first use.
+
+    Events bound for a process are sent as their raw payload and rebuilt there, so
+    process listeners must be plain functions or staticmethods and their results
+    must be picklable. Thread listeners get the event object itself. At most
+    ``max_pending`` calls are queued or running at once; further submissions wait
+    for one to finish, which pushes back on whoever dispatches events.
+    """
+
+    def __init__(self, processes: t.Optional[int] = None, threads: t.Optional[int] = None,
+            max_pending: t.Optional[int] = None, lazy_models: bool = False) -> None:
+
+        self.processes = processes or os.cpu_count() or 1
+        self.threads = threads or min(32, self.processes + 4)
+        self.max_pending = max_pending or 2 * max(self.processes, self.threads)
+        self.lazy_models = lazy_models
+
+        self._pools: t.Dict[str, Executor] = {}
+        self._slots = asyncio.Semaphore(self.max_pending)
+        self._pending: t.Set[asyncio.Future] = set()
+
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+
+    def stats(self) -> dict:
+        return {
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'failed': self.failed,
+            'pending': len(self._pending),
+        }
+
+    def _pool(self, kind: str) -> Executor:
+
+        if (pool := self._pools.get(kind)) is None:
+            if kind == EXECUTOR_PROCESS:
+                pool = ProcessPoolExecutor(max_workers=self.processes)
+            elif kind == EXECUTOR_THREAD:
+                pool = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='edpy-hook')
+            else:
+                raise ValueError(f'Invalid executor: {kind}')
+            self._pools[kind] = pool
+        return pool
+
+    async def submit(self, kind: str, func: t.Callable, event: Event) -> asyncio.Future:
+        """
+        Starts ``func(event)`` in the given pool once a slot is free and returns a
+        future for its result.
+        """
+
+        await self._slots.acquire()
+        try:
+            if kind == EXECUTOR_PROCESS:
+                call = partial(_call_hook, func, *event_payload(event), self.lazy_models, event.replayed,
+                    event.changes)
+            else:
+                call = partial(func, event)
+            future = asyncio.get_running_loop().run_in_executor(self._pool(kind), call)
+        except BaseException:
+            self._slots.release()
+            raise
+
+        self.submitted += 1
+        self._pending.add(future)
+        future.add_done_callback(self._on_done)
+        return future
+
+    async def run(self, kind: str, func: t.Callable, event: Event) -> t.Any:
+        """Runs ``func(event)`` in the given pool and returns its result."""
+        return await (await self.submit(kind, func, event))
+
+    def _on_done(self, future: asyncio.Future):
+
+        self._pending.discard(future)
+        self._slots.release()
+        if not future.cancelled() and future.exception() is not None:
+            self.failed += 1
+        else:
+            self.completed += 1
+
+    async def join(self):
+        """Waits until every submitted call has finished."""
+        while self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+
+    async def close(self):
+
+        await self.join()
+        for pool in self._pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+        self._pools.clear()
+
+
+class PooledHook:
+    """
+    Listener that hands events to a HookExecutor. Calling it only waits for a free
+    slot and returns a future for the hook's result; a failure is also logged and
+    passed to ``on_error``.
+    """
+
+    def __init__(self, func: t.Callable, kind: str, executor: HookExecutor,
+            on_error: t.Optional[t.Callable[['PooledHook'], None]] = None) -> None:
+
+        if kind not in EXECUTORS:
+            raise ValueError(f'Invalid executor: {kind}')
+        if iscoroutinefunction(func):
+            raise ValueError(f'{func.__qualname__} runs in a pool and cannot be a coroutine function')
+        if kind == EXECUTOR_PROCESS and ismethod(func):
+            raise ValueError(f'{func.__qualname__} runs in another process and must be a function or staticmethod')
+
+        self.func = func
+        self.kind = kind
+        self.executor = executor
+        self.on_error = on_error
+        self.__qualname__ = func.__qualname__
+
+    async def __call__(self, event: Event) -> asyncio.Future:
+        future = await self.executor.submit(self.kind, self.func, event)
+        future.add_done_callback(self._on_done)
+        return future
+
+    def _on_done(self, future: asyncio.Future):
+
+        if future.cancelled() or (error := future.exception()) is None:
+            return
+        _log.error('Unhandled exception in event hook %s', self.__qualname__, exc_info=error)
+        if self.on_error is not None:
+            self.on_error(self)
@@ -0,0 +1,236 @@
+import os
+import json
+import mmap
+import time
+import queue
+import struct
+import asyncio
+import logging
+import threading
+import typing as t
+from datetime import datetime
+
+_log = logging.getLogger('edpy.journal')
+
+# receive time (unix seconds), course id (-1 if unknown), payload length
+RECORD_HEADER = struct.Struct('<dqI')
+
+SEGMENT_SUFFIX = '.log'
+INDEX_SUFFIX = '.idx.json'
+
+_STOP = object()
+
+
+def course_of(message: dict) -> t.Optional[int]:
+    """Returns the course a websocket message belongs to, if it says."""
+
+    data = message.get('data')
+    if not isinstance(data, dict):
+        return None
+    for key in ('thread', 'comment'):
+        if isinstance(data.get(key), dict):
+            return data[key].get('course_id')
+    if message.get('type') == 'course.count':
+        return data.get('id')
+    return data.get('course_id')
+
+
+def _timestamp(value: t.Union[datetime, float, None]) -> t.Optional[float]:
+    return value.timestamp() if isinstance(value, datetime) else value
+
+
+class EventJournal:
+    """
+    Append-only journal of raw websocket messages.
+
+    Messages are written to ``segment-<n>.log`` files in ``path`` and a new segment
+    is started once one grows past ``segment_size`` bytes. Each finished segment
+    gets an index file with its time range and courses, so replays can skip it.
+    Writes are handed to a background thread in batches, so appending never blocks
+    the listen loop on disk I/O. If that thread fails (disk full, permissions), the
+    error is kept in ``failed`` and later messages are dropped and counted rather
+    than queued without end.
+    """
+
+    def __init__(self, path: str, segment_size: int = 64 * 1024 * 1024, batch_size: int = 512) -> None:
+
+        self.path = path
+        self.segment_size = segment_size
+        self.batch_size = batch_size
+
+        self._queue: 'queue.SimpleQueue' = queue.SimpleQueue()
+        self._thread: t.Optional[threading.Thread] = None
+
+        self.written = 0
+        self.segments_rotated = 0
+        self.dropped = 0
+        self.failed: t.Optional[Exception] = None
+
+    def append(self, text: str, message: t.Optional[dict] = None, received_at: t.Optional[float] = None):
+        """Queues a raw message for writing; drops it once the writer has failed."""
+
+        if self.failed is not None:
+            self.dropped += 1
+            return
+        if self._thread is None:
+            self._start()
+        course_id = course_of(message) if message is not None else None
+        self._queue.put((received_at or time.time(), course_id, text))
+
+    def _start(self):
+        os.makedirs(self.path, exist_ok=True)
+        self._thread = threading.Thread(target=self._writer, name='edpy-journal', daemon=True)
+        self._thread.start()
+
+    async def close(self):
+        """Writes everything queued so far and finishes the current segment."""
+
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        await asyncio.get_running_loop().run_in_executor(None, self._thread.join)
+        self._thread = None
+
+    def _writer(self):
+
+        segment = None
+        try:
+            segment = _SegmentWriter(self.path, _next_segment_number(self.path))
+            while True:
+                batch = [self._queue.get()]
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+
+                stop = False
+                for record in batch:
+                    if record is _STOP:
+                        stop = True
+                        continue
+                    segment.write(*record)
+                    self.written += 1
+                segment.flush()
+
+                if stop:
+                    return
+                if segment.size >= self.segment_size:
+                    segment.close()
+                    segment = _SegmentWriter(self.path, segment.number + 1)
+                    self.segments_rotated += 1
+        except Exception as error:
+            _log.exception('Journal writer failed; journaling stopped.')
+            self.failed = error
+            # free what was queued; append() drops everything from now on
+            while True:
+                try:
+                    if self._queue.get_nowait() is not _STOP:
+                        self.dropped += 1
+                except queue.Empty:
+                    break
+        finally:
+            if segment is not None:
+                segment.close()
+
+
+class _SegmentWriter:
+
+    def __init__(self, path: str, number: int) -> None:
+        self.number = number
+        self.filename = os.path.join(path, f'segment-{number:08d}{SEGMENT_SUFFIX}')
+        self.file = open(self.filename, 'ab')
+        self.size = 0
+        self.count = 0
+        self.first_ts: t.Optional[float] = None
+        self.last_ts: t.Optional[float] = None
+        self.courses: t.Set[int] = set()
+
+    def write(self, received_at: float, course_id: t.Optional[int], text: str):
+
+        payload = text.encode()
+        self.file.write(RECORD_HEADER.pack(received_at, course_id if course_id is not None else -1, len(payload)))
+        self.file.write(payload)
+
+        self.size += RECORD_HEADER.size + len(payload)
+        self.count += 1
+        self.first_ts = received_at if self.first_ts is None else self.first_ts
+        self.last_ts = received_at
+        if course_id is not None:
+            self.courses.add(course_id)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+
+        if self.file.closed:
+            return
+        self.file.close()
+        if not self.count:
+            os.remove(self.filename)
+            return
+        with open(self.filename[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX, 'w') as index:
+            json.dump({'first_ts': self.first_ts, 'last_ts': self.last_ts, 'count': self.count,
+                       'courses': sorted(self.courses)}, index)
+
+
+def _segments(path: str) -> t.List[str]:
+    return sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith(SEGMENT_SUFFIX))
+
+
+def _next_segment_number(path: str) -> int:
+    segments = _segments(path)
+    if not segments:
+        return 0
+    return int(os.path.basename(segments[-1])[len('segment-'):-len(SEGMENT_SUFFIX)]) + 1
+
+
+def _load_index(segment: str) -> t.Optional[dict]:
+    try:
+        with open(segment[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX) as index:
+            return json.load(index)
+    except (OSError, ValueError):
+        return None     # segment still being written, or index lost; it will be scanned
+
+
+def read_journal(path: str, start: t.Union[datetime, float, None] = None, end: t.Union[datetime, float, None] = None,
+        course_ids: t.Optional[t.Iterable[int]] = None) -> t.Iterator[t.Tuple[float, t.Optional[int], str]]:
+    """
+    Yields ``(received_at, course_id, text)`` for every journaled message in order,
+    optionally limited to a time range and a set of courses. Segments are
+    memory-mapped, and skipped entirely when their index rules them out.
+    """
+
+    start, end = _timestamp(start), _timestamp(end)
+    courses = set(course_ids) if course_ids is not None else None
+
+    for segment in _segments(path):
+        if (index := _load_index(segment)) is not None:
+            if start is not None and index['last_ts'] < start:
+                continue
+            if end is not None and index['first_ts'] > end:
+                continue
+            if courses is not None and not courses.intersection(index['courses']):
+                continue
+
+        with open(segment, 'rb') as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                continue
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                offset, size = 0, len(data)
+                while offset + RECORD_HEADER.size <= size:
+                    received_at, course_id, length = RECORD_HEADER.unpack_from(data, offset)
+                    offset += RECORD_HEADER.size
+                    if offset + length > size:
+                        break   # torn write at the end of a segment
+                    payload_at, offset = offset, offset + length
+
+                    if start is not None and received_at < start:
+                        continue
+                    if end is not None and received_at > end:
+                        return
+                    course_id = course_id if course_id >= 0 else None
+                    if courses is not None and course_id not in courses:
+                        continue
+                    yield received_at, course_id, data[payload_at:offset].decode()
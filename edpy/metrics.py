@@ -0,0 +1,122 @@
+import re
+import typing as t
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+_ID_SEGMENT = re.compile(r'/\d+(?=/|$)')
+
+LabelKey = t.Tuple[t.Tuple[str, str], ...]
+
+
+def _key(labels: t.Dict[str, t.Any]) -> LabelKey:
+    return tuple(sorted((label, str(label_value)) for label, label_value in labels.items())) if labels else ()
+
+
+def endpoint_label(endpoint: str) -> str:
+    """Collapses ids in an endpoint so every thread or course shares one label."""
+    return _ID_SEGMENT.sub('/{id}', endpoint)
+
+
+class MetricsSink(ABC):
+    """
+    Receives the metrics edpy records. Implement both methods to forward them to
+    another system; a client without a sink records nothing.
+    """
+
+    @abstractmethod
+    def inc(self, name: str, value: float = 1, **labels: t.Any):
+        """Adds ``value`` to the counter ``name``."""
+
+    @abstractmethod
+    def observe(self, name: str, value: float, **labels: t.Any):
+        """Records one sample of the histogram ``name``."""
+
+
+class Histogram:
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: t.Sequence[float]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)     # the last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the ``q`` quantile."""
+
+        target, seen = q * self.count, 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float('inf')
+
+
+class InMemoryMetrics(MetricsSink):
+    """Keeps counters and fixed-bucket histograms in process."""
+
+    def __init__(self, buckets: t.Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self.buckets = tuple(sorted(buckets))
+        self.counters: t.Dict[str, t.Dict[LabelKey, float]] = {}
+        self.histograms: t.Dict[str, t.Dict[LabelKey, Histogram]] = {}
+
+    def inc(self, name: str, value: float = 1, **labels: t.Any):
+        series = self.counters.setdefault(name, {})
+        key = _key(labels)
+        series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels: t.Any):
+        series = self.histograms.setdefault(name, {})
+        key = _key(labels)
+        if (histogram := series.get(key)) is None:
+            histogram = series[key] = Histogram(self.buckets)
+        histogram.observe(value)
+
+    def counter(self, name: str, **labels: t.Any) -> float:
+        return self.counters.get(name, {}).get(_key(labels), 0)
+
+    def histogram(self, name: str, **labels: t.Any) -> t.Optional[Histogram]:
+        return self.histograms.get(name, {}).get(_key(labels))
+
+    def render_prometheus(self) -> str:
+        return render_prometheus(self)
+
+
+def _format_labels(key: LabelKey, extra: t.Optional[t.Tuple[str, str]] = None) -> str:
+
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{label}="{value}"' for (label, _), value in zip(pairs, escaped)) + '}'
+
+
+def render_prometheus(metrics: InMemoryMetrics) -> str:
+    """Renders the metrics in the Prometheus text exposition format."""
+
+    lines = []
+    for name, series in sorted(metrics.counters.items()):
+        lines.append(f'# TYPE {name} counter')
+        for key, value in series.items():
+            lines.append(f'{name}{_format_labels(key)} {value:g}')
+
+    for name, series in sorted(metrics.histograms.items()):
+        lines.append(f'# TYPE {name} histogram')
+        for key, histogram in series.items():
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{_format_labels(key, ("le", f"{bound:g}"))} {cumulative}')
+            lines.append(f'{name}_bucket{_format_labels(key, ("le", "+Inf"))} {histogram.count}')
+            lines.append(f'{name}_sum{_format_labels(key)} {histogram.sum:g}')
+            lines.append(f'{name}_count{_format_labels(key)} {histogram.count}')
+
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,178 @@
+import logging
+import typing as t
+from collections import OrderedDict, defaultdict
+
+from .events import (Event, ThreadNewEvent, ThreadUpdateEvent, ThreadDeleteEvent, CommentNewEvent,
+                     CommentUpdateEvent, CommentDeleteEvent)
+from .models.thread import Thread
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .client import EdClient
+
+_log = logging.getLogger('edpy.mirror')
+
+# events the mirror keeps itself current from
+MIRROR_EVENTS = (ThreadNewEvent, ThreadUpdateEvent, ThreadDeleteEvent, CommentNewEvent,
+                 CommentUpdateEvent, CommentDeleteEvent)
+
+
+class CourseMirror:
+    """
+    In-memory copy of the threads of subscribed courses.
+
+    The mirror is seeded from Ed's thread listing when a course is subscribed and
+    kept current from ``thread.*`` and ``comment.*`` events, merging partial updates
+    into the stored thread, so handlers can look up the full state of a thread
+    without a request. Threads are stored as lazy ``Thread`` objects; at most
+    ``max_threads`` are kept, evicting archived threads first and then the least
+    recently used ones.
+
+    The listing carries no answers or comments, so comment events are only merged
+    into threads that came with them, i.e. threads first seen in a ``thread.new``
+    event; for seeded threads, fetch the thread to see its comments.
+
+    Handlers still receive the thread carried by the event, which for
+    ``thread.update`` may hold only the changed fields. The mirror applies each
+    event before the handlers run, so ``mirror.get(event.thread.id)`` returns the
+    merged thread.
+    """
+
+    def __init__(self, max_threads: int = 5000) -> None:
+
+        self.max_threads = max_threads
+        self.evicted = 0
+
+        self._client: t.Optional['EdClient'] = None
+        self._threads: 't.OrderedDict[int, Thread]' = OrderedDict()
+        self._by_number: t.Dict[t.Tuple[int, int], int] = {}
+        self._by_category: t.Dict[t.Tuple[int, str], t.Set[int]] = defaultdict(set)
+        self._by_user: t.Dict[int, t.Set[int]] = defaultdict(set)
+        self._archived: t.Set[int] = set()
+        # ids deleted while each running seed pages through the listing
+        self._seeding_deleted: t.List[t.Set[int]] = []
+
+    def __len__(self):
+        return len(self._threads)
+
+    def __contains__(self, thread_id: int):
+        return thread_id in self._threads
+
+    def bind(self, client: 'EdClient'):
+        self._client = client
+
+    async def seed(self, course_id: int, page_size: int = 100):
+        """Loads up to ``max_threads`` of the most recent threads of a course."""
+
+        deleted: t.Set[int] = set()
+        self._seeding_deleted.append(deleted)
+        try:
+            threads = [thread async for thread in self._client.iter_threads(course_id, sort='new',
+                limit=self.max_threads, page_size=page_size)]
+        finally:
+            self._seeding_deleted.remove(deleted)
+
+        # oldest first so the newest threads end up most recently used; threads that
+        # events already brought in or deleted are newer than the listing and win
+        for thread in reversed(threads[:self.max_threads]):
+            if thread.id not in self._threads and thread.id not in deleted:
+                self._store(thread._raw)
+        _log.info('Mirror seeded course %s with %d threads.', course_id, len(threads))
+
+    def drop_course(self, course_id: int):
+        """Forgets every thread of a course, e.g. once it is unsubscribed."""
+        for thread_id in [thread_id for thread_id, thread in self._threads.items()
+                          if thread._raw.get('course_id') == course_id]:
+            self._remove(thread_id)
+
+    def get(self, thread_id: int) -> t.Optional[Thread]:
+
+        if (thread := self._threads.get(thread_id)) is not None:
+            self._threads.move_to_end(thread_id)
+        return thread
+
+    def get_by_number(self, course_id: int, number: int) -> t.Optional[Thread]:
+        thread_id = self._by_number.get((course_id, number))
+        return self.get(thread_id) if thread_id is not None else None
+
+    def get_by_category(self, course_id: int, category: str) -> t.List[Thread]:
+        return [self.get(thread_id) for thread_id in list(self._by_category.get((course_id, category), ()))]
+
+    def get_by_user(self, user_id: int) -> t.List[Thread]:
+        return [self.get(thread_id) for thread_id in list(self._by_user.get(user_id, ()))]
+
+    def apply(self, event: Event):
+        """Applies a websocket event to the mirrored state."""
+
+        if isinstance(event, (ThreadNewEvent, ThreadUpdateEvent)):
+            raw = event.thread._raw
+            current = self._threads.get(raw.get('id'))
+            self._store({**current._raw, **raw} if current is not None else dict(raw))
+
+        elif isinstance(event, ThreadDeleteEvent):
+            self._remove(event.thread.id)
+            for deleted in self._seeding_deleted:
+                deleted.add(event.thread.id)
+
+        elif isinstance(event, (CommentNewEvent, CommentUpdateEvent, CommentDeleteEvent)):
+            thread_id = event.comment.thread_id
+            if (thread := self._threads.get(thread_id)) is None:
+                return
+
+            raw = thread._raw
+            # threads loaded from the listing carry no comments to merge into
+            if raw.get('comments') is None and raw.get('answers') is None:
+                return
+
+            # the thread's comment index finds the comment without walking the tree;
+            # comments do not change what the thread is indexed by, so it is kept
+            thread.apply(event)
+            self._threads.move_to_end(thread_id)
+
+    def _store(self, raw: dict):
+
+        thread_id = raw.get('id')
+        self._unindex(thread_id)
+
+        thread = Thread.lazy(raw)
+        self._threads[thread_id] = thread
+        self._threads.move_to_end(thread_id)
+
+        course_id = raw.get('course_id')
+        if raw.get('number') is not None:
+            self._by_number[(course_id, raw['number'])] = thread_id
+        if raw.get('category') is not None:
+            self._by_category[(course_id, raw['category'])].add(thread_id)
+        if raw.get('user_id') is not None:
+            self._by_user[raw['user_id']].add(thread_id)
+        if raw.get('is_archived'):
+            self._archived.add(thread_id)
+
+        while len(self._threads) > self.max_threads:
+            victim = next(iter(self._archived)) if self._archived else next(iter(self._threads))
+            self._remove(victim)
+            self.evicted += 1
+
+    def _remove(self, thread_id: int):
+        self._unindex(thread_id)
+        self._threads.pop(thread_id, None)
+
+    def _unindex(self, thread_id: int):
+
+        if (thread := self._threads.get(thread_id)) is None:
+            return
+
+        raw = thread._raw
+        course_id = raw.get('course_id')
+        if self._by_number.get((course_id, raw.get('number'))) == thread_id:
+            del self._by_number[(course_id, raw.get('number'))]
+        if (ids := self._by_category.get((course_id, raw.get('category')))) is not None:
+            ids.discard(thread_id)
+            if not ids:
+                del self._by_category[(course_id, raw.get('category'))]
+        if (ids := self._by_user.get(raw.get('user_id'))) is not None:
+            ids.discard(thread_id)
+            if not ids:
+                del self._by_user[raw.get('user_id')]
+        self._archived.discard(thread_id)
@@ -10,7 +10,7 @@ class Comment:
     __slots__ = ( '_raw', 'id', 'user_id', 'course_id', 'thread_id', 'original_id',
         'parent_id', 'editor_id', 'number', 'type', 'kind', 'content', 'document', 'flag_count',
         'vote_count', 'is_endorsed', 'is_anonymous', 'is_private', 'is_resolved', 'created_at',
-        'updated_at', 'deleted_at', 'anonymous_id', 'vote', 'comments', 'user')
+        'updated_at', 'deleted_at', 'anonymous_id', 'vote', 'comments', 'user', '_lazy')
 
     def __init__(self, data: dict, id: int = None, user_id: int = None, course_id: int = None, thread_id: int = None,
             original_id: t.Optional[int] = None, parent_id: t.Optional[int] = None,
@@ -22,6 +22,7 @@ class Comment:
             comments: t.List['Comment'] = None, user: t.Optional[CourseUser] = None):
         
         self._raw = data
+        self._lazy = False
         self.id: int = id
         self.user_id: int = user_id
         self.course_id: int = course_id
@@ -45,8 +46,61 @@ class Comment:
         self.deleted_at: t.Optional[str] = deleted_at
         self.anonymous_id: int = anonymous_id
         self.vote: int = vote
-        self.comments: t.List['Comment'] = comments
+        self.comments: t.List['Comment'] = Comment.from_list(comments)
         self.user: t.Optional[CourseUser] = CourseUser(user) if user else None
 
+    @classmethod
+    def lazy(cls, data: dict) -> 'Comment':
+        """Creates a comment that reads each field from ``data`` only when it is first accessed."""
+        comment = cls.__new__(cls)
+        comment._raw = data
+        comment._lazy = True
+        return comment
+
+    @classmethod
+    def eager(cls, data: dict) -> 'Comment':
+        """Creates a comment with every field read up front, ignoring keys it does not know."""
+        return cls(data, **{key: value for key, value in data.items() if key in _FIELDS})
+
+    @classmethod
+    def from_list(cls, data: t.Optional[t.List[dict]], lazy: bool = False) -> t.Optional[t.List['Comment']]:
+        """Wraps a list of raw comments, keeping None for a missing list."""
+        if data is None:
+            return None
+        return [cls.lazy(comment) if lazy else cls.eager(comment) for comment in data]
+
+    def __getattr__(self, name):
+        # only reached for slots that were never assigned, i.e. fields of lazy comments
+        if name in ('_raw', '_lazy') or name not in Comment.__slots__:
+            raise AttributeError(f"'Comment' object has no attribute '{name}'")
+
+        value = self._raw.get(name)
+        if name == 'user':
+            value = CourseUser.lazy(value) if value else None
+        elif name == 'comments':
+            value = Comment.from_list(value, lazy=True)
+
+        setattr(self, name, value)
+        return value
+
+    def _refresh(self):
+        """Picks up fields changed in the raw payload, keeping the replies as they are."""
+
+        for name in Comment.__slots__:
+            if name in ('_raw', '_lazy', 'comments'):
+                continue
+            if self._lazy:
+                try:
+                    delattr(self, name)     # read again on next access
+                except AttributeError:
+                    pass
+                continue
+            value = self._raw.get(name)
+            setattr(self, name, CourseUser(value) if name == 'user' and value else value)
+
     def __repr__(self):
-        return f'<Comment id={self.id}>'
\ No newline at end of file
+        return f'<Comment id={self.id}>'
+
+
+# keyword arguments of Comment.__init__, i.e. the fields read from a payload
+_FIELDS = frozenset(Comment.__slots__) - {'_raw', '_lazy'}
@@ -2,8 +2,14 @@ import typing as t
 from enum import Enum
 
 from .comment import Comment
+from .tree import CommentTree
 from .user import CourseUser
 
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from ..events import Event
+
 class ThreadType(Enum):
     """Thread types when posting to Ed."""
     
@@ -28,7 +34,7 @@ class Thread:
         'is_archived', 'is_anonymous', 'is_megathread', 'anonymous_comments', 'approved_status',
         'created_at', 'updated_at', 'deleted_at', 'pinned_at', 'anonymous_id', 'vote',
         'is_seen', 'is_starred', 'is_watched', 'glanced_at', 'new_reply_count', 'duplicate_title',
-        'answers', 'comments', 'user')
+        'answers', 'comments', 'user', '_tree', '_lazy')
     
     def __init__(self, data: dict, id: int = None, user_id: int = None, course_id: int = None, original_id: int = None, 
             editor_id: int = None, accepted_id: t.Optional[int] = None, duplicate_id: t.Optional[int] = None,
@@ -48,6 +54,7 @@ class Thread:
             comments: list[Comment] = None, user: t.Optional[CourseUser] = None):
         
         self._raw = data
+        self._lazy = False
         self.id: int = id
         self.user_id: int = user_id
         self.course_id: int = course_id
@@ -94,9 +101,108 @@ class Thread:
         self.glanced_at: str = glanced_at
         self.new_reply_count: int = new_reply_count
         self.duplicate_title: t.Optional[str] = duplicate_title
-        self.answers: list[Comment] = answers
-        self.comments: list[Comment] = comments
+        self.answers: list[Comment] = Comment.from_list(answers)
+        self.comments: list[Comment] = Comment.from_list(comments)
         self.user: t.Optional[CourseUser] = CourseUser(user) if user else None
 
+    @classmethod
+    def lazy(cls, data: dict) -> 'Thread':
+        """Creates a thread that reads each field from ``data`` only when it is first accessed."""
+        thread = cls.__new__(cls)
+        thread._raw = data
+        thread._lazy = True
+        return thread
+
+    def __getattr__(self, name):
+        # only reached for slots that were never assigned, i.e. fields of lazy threads
+        if name in ('_raw', '_tree', '_lazy') or name not in Thread.__slots__:
+            raise AttributeError(f"'Thread' object has no attribute '{name}'")
+
+        value = self._raw.get(name)
+        if name == 'type':
+            value = ThreadType.from_str(value) if value else None
+        elif name == 'user':
+            value = CourseUser.lazy(value) if value else None
+        elif name in ('answers', 'comments'):
+            value = Comment.from_list(value, lazy=True)
+
+        setattr(self, name, value)
+        return value
+
+    @property
+    def tree(self) -> CommentTree:
+        """Index of the answers and comments by id, built on first access."""
+        try:
+            return self._tree
+        except AttributeError:
+            self._tree = CommentTree(self._raw)
+            return self._tree
+
+    def apply(self, event: 'Event') -> bool:
+        """
+        Applies a comment event of this thread to its answers and comments in place;
+        see ``CommentTree.apply``. Only the Comment object of the affected comment
+        and the list holding it are patched, found through the tree's index.
+        """
+
+        from ..events import CommentNewEvent, CommentDeleteEvent
+
+        tree = self.tree
+        comment_id = event.comment.id if isinstance(event, (CommentNewEvent, CommentDeleteEvent)) else None
+        if isinstance(event, CommentDeleteEvent):
+            # the list holding the comment has to be found while it is still indexed
+            node = tree._nodes.get(comment_id)
+            owner = self._owner(node) if node is not None else None
+            held = self._loaded_comment(node) if owner is not None else None
+            if not tree.apply(event):
+                return False
+            if held is not None:
+                getattr(*owner).remove(held)
+            return True
+
+        added = isinstance(event, CommentNewEvent) and comment_id not in tree
+        if not tree.apply(event):
+            return False
+        node = tree._nodes.get(event.comment.id)
+        if added:
+            if (owner := self._owner(node)) is not None:
+                comment = node.held = Comment.lazy(node.raw) if self._lazy else Comment.eager(node.raw)
+                if (comments := getattr(*owner)) is None:
+                    setattr(*owner, [comment])
+                else:
+                    comments.append(comment)
+        elif (comment := self._loaded_comment(node)) is not None:
+            comment._refresh()
+        return True
+
+    def _owner(self, node) -> t.Optional[t.Tuple[t.Union['Thread', Comment], str]]:
+        """The object and attribute holding a comment's list, if that list was built."""
+
+        if node.parent is None:
+            holder, name = self, 'answers' if node.container is self._raw.get('answers') else 'comments'
+        elif (holder := self._loaded_comment(node.parent)) is None:
+            return None
+        else:
+            name = 'comments'
+        try:
+            object.__getattribute__(holder, name)
+        except AttributeError:
+            return None     # built from the payload on first access
+        return holder, name
+
+    def _loaded_comment(self, node) -> t.Optional[Comment]:
+        """The Comment object already built for a comment, walking down from the thread."""
+
+        if node.held is not None:
+            return node.held
+        if (owner := self._owner(node)) is None or (comments := getattr(*owner)) is None:
+            return None
+        # remember the whole list at once, so each list is walked a single time
+        nodes = self._tree._nodes
+        for comment in comments:
+            if (entry := nodes.get(comment._raw.get('id'))) is not None and entry.raw is comment._raw:
+                entry.held = comment
+        return node.held
+
     def __repr__(self):
         return f'<Thread id={self.id}>'
\ No newline at end of file
@@ -0,0 +1,192 @@
+import typing as t
+
+from .comment import Comment
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from ..events import Event
+
+
+class _Node:
+    """A comment in the tree: its raw payload, the list holding it and its place in the tree."""
+
+    __slots__ = ('raw', 'container', 'parent', 'depth', 'size', 'comment', 'held')
+
+    def __init__(self, raw: dict, container: list, parent: t.Optional['_Node'], depth: int) -> None:
+        self.raw = raw
+        self.container = container
+        self.parent = parent
+        self.depth = depth
+        self.size = 1       # this comment and every reply below it
+        self.comment: t.Optional[Comment] = None
+        # the Comment object the thread's own lists hold, once Thread.apply looked it up
+        self.held: t.Optional[Comment] = None
+
+
+class CommentTree:
+    """
+    Flat index of the answers and comments of a thread, with parent links, depths
+    (0 for top-level answers and comments) and subtree sizes.
+
+    The tree works on the thread's raw payload: applying a comment event edits the
+    nested lists in place and keeps the index current, walking only the ancestors
+    of the comment, so the thread never needs to be fetched again. Comments are
+    returned as lazy ``Comment`` objects.
+    """
+
+    def __init__(self, thread: dict) -> None:
+
+        self.thread_id: t.Optional[int] = thread.get('id')
+        self._thread = thread
+        self._nodes: t.Dict[int, _Node] = {}
+
+        order = []
+        stack = [(comment, container, None)
+                 for key in ('comments', 'answers') if (container := thread.get(key))
+                 for comment in reversed(container)]
+        while stack:
+            raw, container, parent = stack.pop()
+            node = _Node(raw, container, parent, parent.depth + 1 if parent is not None else 0)
+            self._nodes[raw.get('id')] = node
+            order.append(node)
+            if (replies := raw.get('comments')):
+                stack.extend((reply, replies, node) for reply in reversed(replies))
+
+        # replies come after their parent in pre-order, so sizes add up bottom-up
+        for node in reversed(order):
+            if node.parent is not None:
+                node.parent.size += node.size
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def __contains__(self, comment_id: int):
+        return comment_id in self._nodes
+
+    def __iter__(self) -> t.Iterator[Comment]:
+        return (self._comment(node) for node in list(self._nodes.values()))
+
+    def _comment(self, node: _Node) -> Comment:
+        if node.comment is None:
+            node.comment = Comment.lazy(node.raw)
+        return node.comment
+
+    def get(self, comment_id: int) -> t.Optional[Comment]:
+        node = self._nodes.get(comment_id)
+        return self._comment(node) if node is not None else None
+
+    def parent(self, comment_id: int) -> t.Optional[Comment]:
+        """The comment replied to, or None for top-level and unknown comments."""
+        node = self._nodes.get(comment_id)
+        return self._comment(node.parent) if node is not None and node.parent is not None else None
+
+    def ancestors(self, comment_id: int) -> t.List[Comment]:
+        """The parent chain of a comment, nearest first."""
+
+        chain = []
+        node = self._nodes.get(comment_id)
+        while node is not None and (node := node.parent) is not None:
+            chain.append(self._comment(node))
+        return chain
+
+    def replies(self, comment_id: int) -> t.List[Comment]:
+        """The direct replies to a comment."""
+
+        if (node := self._nodes.get(comment_id)) is None:
+            return []
+        return [self._comment(self._nodes[reply.get('id')]) for reply in node.raw.get('comments') or ()]
+
+    def depth(self, comment_id: int) -> t.Optional[int]:
+        node = self._nodes.get(comment_id)
+        return node.depth if node is not None else None
+
+    def reply_count(self, comment_id: int) -> int:
+        """Number of replies anywhere below a comment."""
+        node = self._nodes.get(comment_id)
+        return node.size - 1 if node is not None else 0
+
+    def apply(self, event: 'Event') -> bool:
+        """
+        Applies a ``comment.new``, ``comment.update`` or ``comment.delete`` event of
+        this thread. Returns False when the event does not belong to the thread or
+        refers to a comment the tree does not hold.
+        """
+
+        from ..events import CommentNewEvent, CommentUpdateEvent, CommentDeleteEvent
+
+        if not isinstance(event, (CommentNewEvent, CommentUpdateEvent, CommentDeleteEvent)):
+            return False
+        comment = event.comment
+        if comment.thread_id not in (None, self.thread_id):
+            return False
+
+        # delete frames carry only the ids, as comment_id and thread_id
+        if isinstance(event, CommentDeleteEvent):
+            return self.remove(comment.id)
+        if isinstance(event, CommentNewEvent) and comment.id not in self._nodes:
+            return self.add(comment._raw)
+        return self.update(comment._raw)
+
+    def add(self, raw: dict) -> bool:
+
+        if (parent_id := raw.get('parent_id')) is not None:
+            if (parent := self._nodes.get(parent_id)) is None:
+                return False
+            if parent.raw.get('comments') is None:
+                parent.raw['comments'] = []
+            container = parent.raw['comments']
+        else:
+            parent = None
+            key = 'answers' if raw.get('type') == 'answer' else 'comments'
+            if self._thread.get(key) is None:
+                self._thread[key] = []
+            container = self._thread[key]
+
+        container.append(raw)
+        node = self._nodes[raw.get('id')] = _Node(raw, container, parent,
+            parent.depth + 1 if parent is not None else 0)
+        for reply in raw.get('comments') or ():
+            self._index(reply, raw['comments'], node)
+        self._resize(parent, node.size)
+        return True
+
+    def _index(self, raw: dict, container: list, parent: _Node):
+        """Indexes a reply that arrived nested inside a new comment, and its own replies."""
+
+        node = self._nodes[raw.get('id')] = _Node(raw, container, parent, parent.depth + 1)
+        for reply in raw.get('comments') or ():
+            self._index(reply, raw['comments'], node)
+        parent.size += node.size
+
+    def update(self, raw: dict) -> bool:
+
+        if (node := self._nodes.get(raw.get('id'))) is None:
+            return False
+        # updates may not carry the replies; the indexed ones are kept
+        node.raw.update((key, value) for key, value in raw.items() if key != 'comments')
+        node.comment = None
+        return True
+
+    def remove(self, comment_id: int) -> bool:
+
+        if (node := self._nodes.get(comment_id)) is None:
+            return False
+
+        for index, sibling in enumerate(node.container):
+            if sibling is node.raw:
+                del node.container[index]
+                break
+
+        stack = [node.raw]
+        while stack:
+            raw = stack.pop()
+            self._nodes.pop(raw.get('id'), None)
+            stack.extend(raw.get('comments') or ())
+        self._resize(node.parent, -node.size)
+        return True
+
+    def _resize(self, node: t.Optional[_Node], delta: int):
+        while node is not None:
+            node.size += delta
+            node = node.parent
@@ -14,5 +14,21 @@ class CourseUser:
         for slot in self.__slots__:
             setattr(self, slot, data.get(slot))
 
+    @classmethod
+    def lazy(cls, data: dict) -> 'CourseUser':
+        """Creates a user that reads each field from ``data`` only when it is first accessed."""
+        user = cls.__new__(cls)
+        user._raw = data
+        return user
+
+    def __getattr__(self, name):
+        # only reached for slots that were never assigned, i.e. fields of lazy users
+        if name == '_raw' or name not in CourseUser.__slots__:
+            raise AttributeError(f"'CourseUser' object has no attribute '{name}'")
+
+        value = self._raw.get(name)
+        setattr(self, name, value)
+        return value
+
     def __repr__(self):
         return f'<CourseUser name={self.name} id={self.id}>'
\ No newline at end of file
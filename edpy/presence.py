@@ -0,0 +1,266 @@
+import os
+import time
+import typing as t
+from array import array
+from collections import deque
+
+try:
+    import numpy as np
+except ImportError:     # queries need numpy; recording does not
+    np = None
+
+CHUNK_SUFFIX = '.bin'
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError('Presence queries require numpy; install it with `pip install numpy`.')
+
+
+class _Chunk:
+    """Samples of one course in parallel arrays: 8 bytes of time and 4 of count each."""
+
+    __slots__ = ('timestamps', 'counts')
+
+    def __init__(self) -> None:
+        self.timestamps = array('d')
+        self.counts = array('i')
+
+    def __len__(self):
+        return len(self.timestamps)
+
+
+class _Series:
+
+    __slots__ = ('chunks', 'size', 'on_disk', 'last_count')
+
+    def __init__(self) -> None:
+        self.chunks: t.Deque[_Chunk] = deque([_Chunk()])
+        self.size = 0
+        # (first timestamp, last timestamp, path) of chunks no longer held in memory
+        self.on_disk: t.List[t.Tuple[float, float, str]] = []
+        self.last_count: t.Optional[int] = None
+
+
+class PresenceRecorder:
+    """
+    Records the number of users online per course from ``course.count`` frames.
+
+    Samples are appended to compact arrays, ``chunk_size`` at a time, straight from
+    the raw frame; no event object is built for them. Up to ``capacity`` samples
+    per course stay in memory. Older chunks are dropped, or written to
+    ``spill_dir`` first when one is given, so months of samples can be queried
+    without holding them in memory; ``close`` writes what is left.
+
+    Presence is a step function, so queries weigh every count by how long it
+    lasted. They return NumPy arrays and need NumPy installed. Replayed frames,
+    from a journal or a backfill, are not recorded: they would be stamped with
+    the time of the replay.
+    """
+
+    def __init__(self, capacity: int = 100_000, chunk_size: int = 4096, spill_dir: t.Optional[str] = None) -> None:
+
+        if chunk_size < 1 or capacity < chunk_size:
+            raise ValueError('capacity must hold at least one chunk.')
+
+        self.capacity = capacity
+        self.chunk_size = chunk_size
+        self.spill_dir = spill_dir
+        self._series: t.Dict[int, _Series] = {}
+
+        self.recorded = 0
+        self.spilled = 0
+
+        if spill_dir is not None:
+            os.makedirs(spill_dir, exist_ok=True)
+            self._load_index()
+
+    @property
+    def course_ids(self) -> t.List[int]:
+        return sorted(self._series)
+
+    def record(self, course_id: int, count: int, timestamp: t.Optional[float] = None):
+        """Appends a sample; repeated counts are skipped as they do not change the series."""
+
+        if (series := self._series.get(course_id)) is None:
+            series = self._series[course_id] = _Series()
+        if count == series.last_count:
+            return
+        series.last_count = count
+
+        chunk = series.chunks[-1]
+        if len(chunk) >= self.chunk_size:
+            chunk = _Chunk()
+            series.chunks.append(chunk)
+            if series.size + self.chunk_size > self.capacity:
+                self._evict(course_id, series)
+
+        chunk.timestamps.append(time.time() if timestamp is None else timestamp)
+        chunk.counts.append(count)
+        series.size += 1
+        self.recorded += 1
+
+    def _evict(self, course_id: int, series: _Series):
+
+        chunk = series.chunks.popleft()
+        series.size -= len(chunk)
+        if self.spill_dir is not None:
+            self._spill(course_id, series, chunk)
+
+    def _spill(self, course_id: int, series: _Series, chunk: _Chunk):
+
+        if not len(chunk):
+            return
+        first, last = chunk.timestamps[0], chunk.timestamps[-1]
+        path = os.path.join(self.spill_dir, f'{course_id}_{first!r}_{last!r}{CHUNK_SUFFIX}')
+        with open(path, 'wb') as file:
+            chunk.timestamps.tofile(file)
+            chunk.counts.tofile(file)
+        series.on_disk.append((first, last, path))
+        self.spilled += 1
+
+    def _load_index(self):
+
+        for name in sorted(os.listdir(self.spill_dir)):
+            if not name.endswith(CHUNK_SUFFIX):
+                continue
+            course_id, first, last = name[:-len(CHUNK_SUFFIX)].split('_')
+            if (series := self._series.get(int(course_id))) is None:
+                series = self._series[int(course_id)] = _Series()
+            series.on_disk.append((float(first), float(last), os.path.join(self.spill_dir, name)))
+        for series in self._series.values():
+            series.on_disk.sort()
+
+    def flush(self):
+        """Writes every sample held in memory to ``spill_dir``."""
+
+        if self.spill_dir is None:
+            return
+        for course_id, series in self._series.items():
+            while series.chunks:
+                self._spill(course_id, series, series.chunks.popleft())
+            series.chunks.append(_Chunk())
+            series.size = 0
+
+    def close(self):
+        self.flush()
+
+    # queries
+
+    def samples(self, course_id: int, start: t.Optional[float] = None,
+            end: t.Optional[float] = None) -> t.Tuple['np.ndarray', 'np.ndarray']:
+        """Returns the ``(timestamps, counts)`` recorded for a course, oldest first."""
+
+        _require_numpy()
+        series = self._series.get(course_id)
+        if series is None:
+            return np.empty(0), np.empty(0, dtype=np.int32)
+
+        parts = []
+        for first, last, path in series.on_disk:
+            if (start is not None and last < start) or (end is not None and first > end):
+                continue
+            raw = np.fromfile(path, dtype=np.uint8)
+            length = raw.size // 12
+            parts.append((raw[:length * 8].view('<f8'), raw[length * 8:].view('<i4')))
+        for chunk in series.chunks:
+            if len(chunk):
+                parts.append((np.frombuffer(chunk.timestamps, dtype=np.float64),
+                              np.frombuffer(chunk.counts, dtype=np.int32)))
+        if not parts:
+            return np.empty(0), np.empty(0, dtype=np.int32)
+
+        timestamps = np.concatenate([part[0] for part in parts])
+        counts = np.concatenate([part[1] for part in parts])
+        mask = np.ones(timestamps.size, dtype=bool)
+        if start is not None:
+            # keep the last sample before ``start``, which is the count at ``start``
+            mask &= timestamps >= timestamps[max(0, np.searchsorted(timestamps, start, side='right') - 1)]
+        if end is not None:
+            mask &= timestamps <= end
+        return timestamps[mask], counts[mask]
+
+    def _pieces(self, course_id: int, edges: 'np.ndarray') -> t.Tuple['np.ndarray', 'np.ndarray', 'np.ndarray']:
+        """
+        Splits the step function at ``edges`` and returns, for every constant piece,
+        the bucket it falls in, its count and its duration.
+        """
+
+        timestamps, counts = self.samples(course_id, start=edges[0], end=edges[-1])
+        points = np.union1d(timestamps[(timestamps > edges[0]) & (timestamps < edges[-1])], edges)
+        # count in effect at each point: the last sample at or before it, 0 before the first
+        index = np.searchsorted(timestamps, points[:-1], side='right') - 1
+        values = np.where(index >= 0, counts[np.maximum(index, 0)], 0)
+        durations = np.diff(points)
+        buckets = np.searchsorted(edges, points[:-1], side='right') - 1
+        return buckets, values, durations
+
+    def resample(self, course_id: int, interval: float = 3600, how: str = 'max', start: t.Optional[float] = None,
+            end: t.Optional[float] = None) -> t.Tuple['np.ndarray', 'np.ndarray']:
+        """
+        Aggregates a course's presence into buckets of ``interval`` seconds and
+        returns ``(bucket_starts, values)``. ``how`` is ``'max'``, ``'min'`` or
+        ``'mean'`` (time-weighted).
+        """
+
+        _require_numpy()
+        timestamps, _ = self.samples(course_id)
+        if not timestamps.size:
+            return np.empty(0), np.empty(0)
+
+        start = timestamps[0] if start is None else start
+        end = max(timestamps[-1], start + interval) if end is None else end
+        edges = np.arange(start, end + interval, interval, dtype=np.float64)
+        edges = edges[:np.searchsorted(edges, end, side='left') + 1]
+        buckets, values, durations = self._pieces(course_id, edges)
+        count = edges.size - 1
+
+        if how == 'mean':
+            weighted = np.bincount(buckets, weights=values * durations, minlength=count)
+            result = weighted / np.diff(edges)
+        elif how in ('max', 'min'):
+            ufunc = np.maximum if how == 'max' else np.minimum
+            result = np.full(count, -np.inf if how == 'max' else np.inf)
+            ufunc.at(result, buckets, values)
+        else:
+            raise ValueError(f'Invalid aggregation: {how}')
+        return edges[:-1], result
+
+    def rolling(self, course_id: int, window: float, interval: float = 60, how: str = 'max',
+            start: t.Optional[float] = None, end: t.Optional[float] = None) -> t.Tuple['np.ndarray', 'np.ndarray']:
+        """
+        Rolling max, min or mean over ``window`` seconds, evaluated every
+        ``interval`` seconds; each value covers the window ending with its bucket.
+        """
+
+        _require_numpy()
+        if how not in ('max', 'min', 'mean'):
+            raise ValueError(f'Invalid aggregation: {how}')
+        bucket_starts, values = self.resample(course_id, interval, how, start, end)
+        size = max(1, int(round(window / interval)))
+        if values.size < size:
+            return np.empty(0), np.empty(0)
+        windows = np.lib.stride_tricks.sliding_window_view(values, size)
+        result = getattr(windows, how)(axis=1)
+        return bucket_starts[size - 1:], result
+
+    def percentile(self, course_id: int, q: t.Union[float, t.Sequence[float]], start: t.Optional[float] = None,
+            end: t.Optional[float] = None) -> t.Union[float, 'np.ndarray']:
+        """Time-weighted percentile(s) ``q`` (0-100) of a course's online count."""
+
+        _require_numpy()
+        timestamps, _ = self.samples(course_id)
+        if not timestamps.size:
+            return np.nan if np.isscalar(q) else np.full(len(q), np.nan)
+
+        start = timestamps[0] if start is None else start
+        end = timestamps[-1] if end is None else end
+        if end <= start:
+            end = start + 1
+        _, values, durations = self._pieces(course_id, np.array([start, end], dtype=np.float64))
+
+        order = np.argsort(values, kind='stable')
+        cumulative = np.cumsum(durations[order])
+        targets = np.asarray(q, dtype=np.float64) / 100 * cumulative[-1]
+        index = np.minimum(np.searchsorted(cumulative, targets, side='left'), order.size - 1)
+        return values[order][index]
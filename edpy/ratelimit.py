@@ -0,0 +1,191 @@
+import time
+import random
+import asyncio
+import logging
+import typing as t
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+
+_log = logging.getLogger('edpy.ratelimit')
+
+# methods that are safe to send again when the outcome of a request is unknown
+IDEMPOTENT_METHODS = frozenset(('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'))
+
+
+def parse_retry_after(value: t.Optional[str]) -> t.Optional[float]:
+    """Parses a Retry-After header given either in seconds or as an HTTP date."""
+
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Allows ``rate`` acquisitions per second with bursts of up to ``capacity``."""
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated', 'blocked_until')
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0    # set from Retry-After; nothing is let through before it
+
+    async def acquire(self) -> float:
+        """Takes a token, waiting for one if needed; returns the time spent waiting."""
+
+        waited = 0.0
+        while True:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                delay = self.blocked_until - now
+            else:
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            await asyncio.sleep(delay)
+            waited += delay
+
+
+class AdaptiveConcurrency:
+    """
+    Limit on concurrent requests that halves when Ed throttles and grows by one
+    after a full window of successful requests (additive increase, multiplicative
+    decrease).
+    """
+
+    def __init__(self, maximum: int, minimum: int = 1) -> None:
+        self.maximum = maximum
+        self.minimum = minimum
+        self.limit = maximum
+        self.in_use = 0
+        self._successes = 0
+        self._released = asyncio.Event()
+
+    async def acquire(self) -> float:
+
+        waited, start = 0.0, time.monotonic()
+        while self.in_use >= self.limit:
+            self._released.clear()
+            await self._released.wait()
+            waited = time.monotonic() - start
+        self.in_use += 1
+        return waited
+
+    def release(self):
+        self.in_use -= 1
+        self._released.set()
+
+    def on_success(self):
+        self._successes += 1
+        if self._successes >= self.limit and self.limit < self.maximum:
+            self.limit += 1
+            self._successes = 0
+
+    def on_throttle(self):
+        self.limit = max(self.minimum, self.limit // 2)
+        self._successes = 0
+
+
+class RateLimiter:
+    """
+    Client-side limits shared by every REST call of a client.
+
+    ``rate`` and ``burst`` configure a token bucket for all endpoints; ``groups``
+    maps endpoint prefixes (e.g. ``'/api/threads'``) to their own ``(rate, burst)``
+    buckets, the longest matching prefix winning. A rate of None means no token
+    limit. Concurrency adapts between ``min_concurrency`` and ``max_concurrency``,
+    backing off on 429 responses and recovering as requests succeed. Failed
+    requests are retried up to ``max_retries`` times with jittered exponential
+    backoff, honouring Retry-After.
+    """
+
+    def __init__(self, rate: t.Optional[float] = None, burst: t.Optional[int] = None,
+            groups: t.Optional[t.Dict[str, t.Tuple[float, int]]] = None, max_concurrency: int = 32,
+            min_concurrency: int = 1, max_retries: int = 3, backoff_base: float = 0.5,
+            backoff_cap: float = 30) -> None:
+
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+
+        self._default = TokenBucket(rate, burst or max(1, int(rate))) if rate else None
+        self._groups = sorted(((prefix, TokenBucket(group_rate, group_burst))
+                               for prefix, (group_rate, group_burst) in (groups or {}).items()),
+                              key=lambda group: len(group[0]), reverse=True)
+        self.concurrency = AdaptiveConcurrency(max_concurrency, min_concurrency)
+
+        # seconds requests spent waiting on the limiter, Retry-After and retry backoff
+        self.throttled_time = 0.0
+        self.throttled_responses = 0
+        self.retries = 0
+
+    def stats(self) -> dict:
+        return {
+            'throttled_time': self.throttled_time,
+            'throttled_responses': self.throttled_responses,
+            'retries': self.retries,
+            'concurrency_limit': self.concurrency.limit,
+            'in_flight': self.concurrency.in_use,
+        }
+
+    def _bucket(self, endpoint: str) -> t.Optional[TokenBucket]:
+        for prefix, bucket in self._groups:
+            if endpoint.startswith(prefix):
+                return bucket
+        return self._default
+
+    async def acquire(self, endpoint: str):
+
+        waited = 0.0
+        if (bucket := self._bucket(endpoint)) is not None:
+            waited += await bucket.acquire()
+        waited += await self.concurrency.acquire()
+        self.throttled_time += waited
+
+    def release(self):
+        self.concurrency.release()
+
+    def on_success(self):
+        self.concurrency.on_success()
+
+    def on_throttled(self, endpoint: str, retry_after: t.Optional[float]):
+
+        self.throttled_responses += 1
+        self.concurrency.on_throttle()
+        if retry_after and (bucket := self._bucket(endpoint)) is not None:
+            bucket.blocked_until = max(bucket.blocked_until, time.monotonic() + retry_after)
+        _log.debug('Throttled on %s; concurrency limit now %d.', endpoint, self.concurrency.limit)
+
+    def should_retry(self, method: str, attempt: int, throttled: bool, idempotent: t.Optional[bool] = None) -> bool:
+        """
+        Whether a failed attempt may be sent again. Throttled requests were not
+        processed, so they are retried whatever the method; other failures only
+        for idempotent requests, judged by the method unless ``idempotent`` says.
+        """
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        return attempt <= self.max_retries and (throttled or idempotent)
+
+    def backoff(self, attempt: int, retry_after: t.Optional[float] = None) -> float:
+
+        delay = min(self.backoff_cap, self.backoff_base * 2 ** (attempt - 1))
+        delay = delay / 2 + random.uniform(0, delay / 2)
+        self.retries += 1
+        return max(delay, retry_after or 0)
+
+    async def wait(self, delay: float):
+        """Sleeps before a retry, counting the time as throttled."""
+        await asyncio.sleep(delay)
+        self.throttled_time += delay
@@ -0,0 +1,215 @@
+import asyncio
+import logging
+import typing as t
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from .errors import RequestError
+from .utils import parse_time
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .transport import Transport
+
+_log = logging.getLogger('edpy.recovery')
+
+
+def _flatten_comments(comments: t.Optional[list]) -> t.Iterator[dict]:
+    for comment in comments or ():
+        yield comment
+        yield from _flatten_comments(comment.get('comments'))
+
+
+class _CourseCursor:
+    """What has been seen of one course, used to tell which items a gap left out."""
+
+    __slots__ = ('last_thread_id', 'last_comment_id', 'disconnected_at', 'active')
+
+    def __init__(self) -> None:
+        self.last_thread_id: int = 0
+        self.last_comment_id: int = 0
+        self.disconnected_at: t.Optional[datetime] = None
+        # recently active thread ids, the threads most likely to get comments during a gap
+        self.active: 't.OrderedDict[int, None]' = OrderedDict()
+
+
+class GapRecovery:
+    """
+    Backfills events missed while a websocket connection was down.
+
+    The transport reports every ``thread.new``/``comment.new`` frame so the last
+    seen ids per course are known. After a shard reconnects, each of its courses
+    is checked over REST once Ed acknowledges its subscription again: missed
+    threads come from the thread listing, and missed comments from the new
+    threads and the threads that were recently active. Both are emitted as
+    regular events with ``replayed`` set, and live frames that arrive late for an
+    already replayed item (or the other way around) are dropped. Connections
+    restarted on purpose, e.g. to drop a course, are not backfilled.
+    """
+
+    def __init__(self, max_pages: int = 5, page_size: int = 30, active_threads: int = 50,
+            dedup_size: int = 10000) -> None:
+
+        self.max_pages = max_pages
+        self.page_size = page_size
+        self.active_threads = active_threads
+        self.dedup_size = dedup_size
+
+        self._transport: t.Optional['Transport'] = None
+        self._cursors: t.Dict[int, _CourseCursor] = {}
+        self._seen: 't.OrderedDict[t.Tuple[str, int], None]' = OrderedDict()
+        self._tasks: t.Dict[int, asyncio.Task] = {}
+
+        self.replayed = 0
+        self.duplicates = 0
+
+    def bind(self, transport: 'Transport'):
+        self._transport = transport
+
+    def stats(self) -> dict:
+        return {
+            'replayed': self.replayed,
+            'duplicates': self.duplicates,
+            'recovering': len(self._tasks),
+        }
+
+    def _cursor(self, course_id: int) -> _CourseCursor:
+        if (cursor := self._cursors.get(course_id)) is None:
+            cursor = self._cursors[course_id] = _CourseCursor()
+        return cursor
+
+    def _touch(self, cursor: _CourseCursor, thread_id: t.Optional[int]):
+        if thread_id is None:
+            return
+        cursor.active[thread_id] = None
+        cursor.active.move_to_end(thread_id)
+        if len(cursor.active) > self.active_threads:
+            cursor.active.popitem(last=False)
+
+    def _first_sighting(self, key: t.Tuple[str, int]) -> bool:
+
+        if key in self._seen:
+            self.duplicates += 1
+            return False
+        self._seen[key] = None
+        if len(self._seen) > self.dedup_size:
+            self._seen.popitem(last=False)
+        return True
+
+    def observe(self, event_type: str, data: dict) -> bool:
+        """Records a frame; returns False if it duplicates one already dispatched."""
+
+        if event_type in ('thread.new', 'thread.update'):
+            thread = data.get('thread') or {}
+            cursor = self._cursor(thread.get('course_id'))
+            self._touch(cursor, thread.get('id'))
+            if event_type == 'thread.new':
+                if not self._first_sighting(('thread', thread.get('id'))):
+                    return False
+                cursor.last_thread_id = max(cursor.last_thread_id, thread.get('id') or 0)
+
+        elif event_type in ('comment.new', 'comment.update'):
+            comment = data.get('comment') or {}
+            cursor = self._cursor(comment.get('course_id'))
+            self._touch(cursor, comment.get('thread_id'))
+            if event_type == 'comment.new':
+                if not self._first_sighting(('comment', comment.get('id'))):
+                    return False
+                cursor.last_comment_id = max(cursor.last_comment_id, comment.get('id') or 0)
+
+        return True
+
+    def disconnected(self, course_ids: t.Iterable[int]):
+
+        now = datetime.now(timezone.utc)
+        for course_id in course_ids:
+            cursor = self._cursor(course_id)
+            # keep the start of the gap if reconnecting failed several times in a row
+            if cursor.disconnected_at is None:
+                cursor.disconnected_at = now
+
+    def subscribed(self, course_id: int):
+        """
+        Starts backfilling a course with a gap once its subscription is acknowledged,
+        so nothing falls between the backfill and the first live event.
+        """
+        if (cursor := self._cursors.get(course_id)) is not None and cursor.disconnected_at is not None:
+            self.recover((course_id,))
+
+    def recover(self, course_ids: t.Iterable[int]):
+        """Starts backfilling the given courses in the background."""
+
+        for course_id in course_ids:
+            if course_id in self._tasks:
+                continue
+            task = asyncio.ensure_future(self._recover(course_id))
+            self._tasks[course_id] = task
+            task.add_done_callback(lambda _, course_id=course_id: self._tasks.pop(course_id, None))
+
+    async def close(self):
+        for task in list(self._tasks.values()):
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+    async def _recover(self, course_id: int):
+
+        cursor = self._cursor(course_id)
+        try:
+            await self._backfill(course_id, cursor)
+        except Exception:
+            _log.exception('Failed to backfill course %s after reconnect', course_id)
+        else:
+            cursor.disconnected_at = None
+
+    def _missed_thread(self, thread: dict, cursor: _CourseCursor) -> bool:
+        if cursor.last_thread_id:
+            return (thread.get('id') or 0) > cursor.last_thread_id
+        created_at = parse_time(thread.get('created_at'))
+        return created_at is not None and cursor.disconnected_at is not None and created_at > cursor.disconnected_at
+
+    def _missed_comment(self, comment: dict, cursor: _CourseCursor) -> bool:
+        if cursor.last_comment_id:
+            return (comment.get('id') or 0) > cursor.last_comment_id
+        created_at = parse_time(comment.get('created_at'))
+        return created_at is not None and cursor.disconnected_at is not None and created_at > cursor.disconnected_at
+
+    async def _backfill(self, course_id: int, cursor: _CourseCursor):
+
+        client = self._transport.client
+
+        missed_threads = []
+        for page in range(self.max_pages):
+            threads = await client.list_threads(course_id, limit=self.page_size,
+                offset=page * self.page_size, sort='new')
+            missed = [thread._raw for thread in threads if self._missed_thread(thread._raw, cursor)]
+            missed_threads.extend(missed)
+            # the listing is newest first, so the first thread we already know ends the gap
+            if len(missed) < len(threads) or len(threads) < self.page_size:
+                break
+
+        thread_ids = [thread.get('id') for thread in missed_threads] + list(cursor.active)
+        missed_comments = []
+        for thread_id in dict.fromkeys(thread_ids):
+            try:
+                res = await client.get_thread(thread_id)
+            except RequestError:
+                continue    # deleted or no longer visible
+            raw = res.thread._raw
+            missed_comments.extend(comment for comment in _flatten_comments(raw.get('answers'))
+                                   if self._missed_comment(comment, cursor))
+            missed_comments.extend(comment for comment in _flatten_comments(raw.get('comments'))
+                                   if self._missed_comment(comment, cursor))
+
+        if missed_threads or missed_comments:
+            _log.info('Course %s: replaying %d threads and %d comments missed while disconnected.',
+                course_id, len(missed_threads), len(missed_comments))
+
+        for thread in reversed(missed_threads):
+            await self._replay('thread.new', {'thread': thread})
+        for comment in sorted(missed_comments, key=lambda comment: comment.get('id') or 0):
+            await self._replay('comment.new', {'comment': comment})
+
+    async def _replay(self, event_type: str, data: dict):
+        self.replayed += 1
+        await self._transport._handle_message({'type': event_type, 'data': data}, replayed=True)
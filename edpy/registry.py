@@ -0,0 +1,147 @@
+import typing as t
+from itertools import count
+
+from .events import (Event, ThreadNewEvent, ThreadUpdateEvent, ThreadDeleteEvent, CommentNewEvent,
+                     CommentUpdateEvent, CommentDeleteEvent, CourseCountEvent)
+from .models.thread import ThreadType
+
+# events whose payload is a full thread, the only ones carrying a category and a type
+THREAD_EVENTS = (ThreadNewEvent, ThreadUpdateEvent)
+# events carrying the fields they changed
+UPDATE_EVENTS = (ThreadUpdateEvent, CommentUpdateEvent)
+
+_ANY_COURSE = None
+
+
+def _values(value: t.Any) -> t.Optional[t.FrozenSet]:
+    if value is None:
+        return None
+    if isinstance(value, (str, int, ThreadType)):
+        value = (value,)
+    return frozenset(item.value if isinstance(item, ThreadType) else item for item in value)
+
+
+def frame_fields(event_type: str, data: dict) -> t.Tuple[t.Optional[int], t.Optional[str], t.Optional[str]]:
+    """Returns the course id, category and thread type of a raw websocket frame."""
+
+    if event_type in ('thread.new', 'thread.update'):
+        thread = data.get('thread') or {}
+        return thread.get('course_id'), thread.get('category'), thread.get('type')
+    if event_type in ('comment.new', 'comment.update'):
+        return (data.get('comment') or {}).get('course_id'), None, None
+    if event_type == 'course.count':
+        return data.get('id'), None, None
+    return data.get('course_id'), None, None
+
+
+def event_fields(event: Event) -> t.Tuple[t.Optional[int], t.Optional[str], t.Optional[str]]:
+    """Same as ``frame_fields``, read from a built event."""
+
+    if isinstance(event, THREAD_EVENTS):
+        raw = event.thread._raw
+        return raw.get('course_id'), raw.get('category'), raw.get('type')
+    if isinstance(event, ThreadDeleteEvent):
+        return event.thread._raw.get('course_id'), None, None
+    if isinstance(event, (CommentNewEvent, CommentUpdateEvent, CommentDeleteEvent)):
+        return event.comment._raw.get('course_id'), None, None
+    if isinstance(event, CourseCountEvent):
+        return event.course_id, None, None
+    return None, None, None
+
+
+class _Hook:
+    """A registered listener and the predicates an event must pass to reach it."""
+
+    __slots__ = ('func', 'categories', 'types', 'fields')
+
+    def __init__(self, func: t.Callable, categories: t.Optional[t.FrozenSet], types: t.Optional[t.FrozenSet],
+            fields: t.Optional[t.FrozenSet]) -> None:
+        self.func = func
+        self.categories = categories
+        self.types = types
+        self.fields = fields
+
+    def accepts(self, category: t.Optional[str], thread_type: t.Optional[str],
+            changes: t.Optional[dict]) -> bool:
+        if self.categories is not None and category not in self.categories:
+            return False
+        if self.types is not None and thread_type not in self.types:
+            return False
+        # unknown changes (None) may include the fields, so they pass
+        if self.fields is not None and changes is not None and self.fields.isdisjoint(changes):
+            return False
+        return True
+
+
+class HookRegistry:
+    """
+    Listeners indexed by event type and course id, so finding the hooks of a frame
+    is two dict lookups. Category, thread type and changed field predicates are
+    checked only on the hooks found that way. Hooks are returned in registration
+    order.
+    """
+
+    def __init__(self) -> None:
+        # event class name -> course id (None for any course) -> hooks
+        self._index: t.Dict[str, t.Dict[t.Optional[int], t.List[_Hook]]] = {}
+        # func -> registration number; never reused, so order survives removals
+        self._order: t.Dict[t.Callable, int] = {}
+        self._registrations = count()
+
+    def __len__(self):
+        return len(self._order)
+
+    def add(self, event_cls: t.Type[Event], func: t.Callable, course_id: t.Union[int, t.Iterable[int], None] = None,
+            category: t.Union[str, t.Iterable[str], None] = None,
+            type: t.Union[ThreadType, str, t.Iterable, None] = None,
+            fields: t.Union[str, t.Iterable[str], None] = None):
+
+        categories, types, fields = _values(category), _values(type), _values(fields)
+        if (categories is not None or types is not None) and not issubclass(event_cls, THREAD_EVENTS):
+            raise ValueError(f'category and type filters only apply to thread events, not {event_cls.__name__}')
+        if fields is not None and not issubclass(event_cls, UPDATE_EVENTS):
+            raise ValueError(f'field filters only apply to update events, not {event_cls.__name__}')
+
+        hook = _Hook(func, categories, types, fields)
+        if func not in self._order:
+            self._order[func] = next(self._registrations)
+        by_course = self._index.setdefault(event_cls.__name__, {})
+        for course in _values(course_id) or (_ANY_COURSE,):
+            by_course.setdefault(course, []).append(hook)
+
+    def remove(self, func: t.Callable):
+        """Unregisters a listener from every event it was added for."""
+
+        if self._order.pop(func, None) is None:
+            return
+        for event_name, by_course in list(self._index.items()):
+            for course, hooks in list(by_course.items()):
+                hooks[:] = [hook for hook in hooks if hook.func != func]
+                if not hooks:
+                    del by_course[course]
+            if not by_course:
+                del self._index[event_name]
+
+    def has(self, event_name: str) -> bool:
+        return event_name in self._index
+
+    def match(self, event_name: str, course_id: t.Optional[int], category: t.Optional[str] = None,
+            thread_type: t.Optional[str] = None, changes: t.Optional[dict] = None) -> t.List[t.Callable]:
+
+        if (by_course := self._index.get(event_name)) is None:
+            return []
+
+        hooks = by_course.get(_ANY_COURSE, ())
+        if course_id is not None and (for_course := by_course.get(course_id)):
+            hooks = sorted((*hooks, *for_course), key=lambda hook: self._order[hook.func]) if hooks else for_course
+        return [hook.func for hook in hooks if hook.accepts(category, thread_type, changes)]
+
+    def matches_frame(self, event_name: str, event_type: str, data: dict, changes: t.Optional[dict] = None) -> bool:
+        """Whether any hook wants a raw frame, checked before its event is built."""
+
+        if event_name not in self._index:
+            return False
+        return bool(self.match(event_name, *frame_fields(event_type, data), changes))
+
+    def hooks_for(self, event: Event) -> t.List[t.Callable]:
+        return self.match(type(event).__name__, *event_fields(event), event.changes)
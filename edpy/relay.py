@@ -0,0 +1,319 @@
+import time
+import uuid
+import struct
+import asyncio
+import logging
+import typing as t
+from collections import deque
+
+from .client import EdClient
+from .codec import JsonCodec
+from .journal import course_of
+from .shard import _backoff
+
+_log = logging.getLogger('edpy.relay')
+
+# payload length, sequence number (0 for control frames), flags
+FRAME_HEADER = struct.Struct('<IQB')
+
+FLAG_REPLAYED = 1
+
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+
+
+def encode_frame(seq: int, payload: bytes, flags: int = 0) -> bytes:
+    return FRAME_HEADER.pack(len(payload), seq, flags) + payload
+
+
+async def read_frame(reader: asyncio.StreamReader) -> t.Tuple[int, int, bytes]:
+    """Reads one frame; raises IncompleteReadError once the connection is closed."""
+
+    length, seq, flags = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+    if length > MAX_FRAME_SIZE:
+        raise ValueError(f'Relay frame of {length} bytes exceeds the limit.')
+    return seq, flags, await reader.readexactly(length)
+
+
+def _control(data: dict, codec: JsonCodec) -> bytes:
+    return encode_frame(0, codec.dumps(data).encode())
+
+
+class _Subscriber:
+    """A connected RelayClient and the frames waiting to be written to it."""
+
+    __slots__ = ('writer', 'courses', 'queue', 'backlog', 'task', 'sent')
+
+    def __init__(self, writer: asyncio.StreamWriter, courses: t.Optional[t.Set[int]], buffer_size: int) -> None:
+        self.writer = writer
+        self.courses = courses
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=buffer_size)
+        # frames missed before connecting, written ahead of the queue
+        self.backlog: t.List[bytes] = []
+        self.task: t.Optional[asyncio.Task] = None
+        self.sent = 0
+
+    def wants(self, course_id: t.Optional[int]) -> bool:
+        return self.courses is None or course_id is None or course_id in self.courses
+
+
+class EventRelay:
+    """
+    Shares the websocket subscription of one EdClient with other processes.
+
+    Every event frame the client receives is numbered and sent to the connected
+    RelayClients over a Unix socket (``path``) or TCP (``host``/``port``), each
+    frame being a small binary header followed by the raw JSON message. A
+    subscriber may ask for a subset of courses. Frames wait in a per-subscriber
+    buffer of ``buffer_size``; a subscriber that falls that far behind is
+    disconnected rather than slowing the others down. The last ``history`` frames
+    are kept so a reconnecting subscriber can resume after the last sequence
+    number it received; those are written straight from the history, so a backlog
+    longer than ``buffer_size`` does not count as falling behind. Frames are
+    encoded with ``codec``, by default the one of the client the relay belongs to.
+    """
+
+    def __init__(self, path: t.Optional[str] = None, host: str = '127.0.0.1', port: int = 0,
+            buffer_size: int = 1000, history: int = 10000, codec: t.Optional[JsonCodec] = None) -> None:
+
+        self.path = path
+        self.codec = codec or JsonCodec()
+        self._codec_given = codec is not None
+        self.host = host
+        self.port = port
+        self.buffer_size = buffer_size
+
+        # changes whenever the relay restarts, so subscribers know old sequence numbers are void
+        self.epoch = uuid.uuid4().hex
+        self.seq = 0
+        self._history: 't.Deque[t.Tuple[int, t.Optional[int], bytes]]' = deque(maxlen=history)
+
+        self._server: t.Optional[asyncio.AbstractServer] = None
+        self._subscribers: t.Set[_Subscriber] = set()
+        # connections that have not sent their hello yet
+        self._greeting: t.Set[asyncio.StreamWriter] = set()
+
+        self.published = 0
+        self.slow_disconnects = 0
+
+    def bind(self, client: EdClient):
+        if not self._codec_given:
+            self.codec = client._transport.codec
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    def stats(self) -> dict:
+        return {
+            'seq': self.seq,
+            'subscribers': len(self._subscribers),
+            'published': self.published,
+            'slow_disconnects': self.slow_disconnects,
+        }
+
+    async def start(self):
+
+        if self._server is not None:
+            return
+        if self.path is not None:
+            self._server = await asyncio.start_unix_server(self._on_connect, path=self.path)
+        else:
+            self._server = await asyncio.start_server(self._on_connect, host=self.host, port=self.port)
+            self.port = self._server.sockets[0].getsockname()[1]
+        _log.info('Relay listening on %s.', self.path or f'{self.host}:{self.port}')
+
+    async def close(self):
+
+        if self._server is None:
+            return
+        self._server.close()
+        # wait_closed waits for open connections on newer Pythons, so close them first
+        for subscriber in list(self._subscribers):
+            self._drop(subscriber)
+        for writer in list(self._greeting):
+            writer.close()
+        await self._server.wait_closed()
+        self._server = None
+
+    def publish(self, message: dict, replayed: bool = False):
+        """Numbers a websocket message and queues it for every interested subscriber."""
+
+        self.seq += 1
+        course_id = course_of(message)
+        frame = encode_frame(self.seq, self.codec.dumps(message).encode(),
+            FLAG_REPLAYED if replayed else 0)
+        self._history.append((self.seq, course_id, frame))
+        self.published += 1
+
+        for subscriber in list(self._subscribers):
+            if subscriber.wants(course_id):
+                self._enqueue(subscriber, frame)
+
+    def _enqueue(self, subscriber: _Subscriber, frame: bytes):
+        try:
+            subscriber.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            self.slow_disconnects += 1
+            _log.warning('Relay subscriber fell %d frames behind; disconnecting it.', self.buffer_size)
+            self._drop(subscriber)
+
+    def _drop(self, subscriber: _Subscriber):
+        self._subscribers.discard(subscriber)
+        if subscriber.task is not None:
+            subscriber.task.cancel()
+        subscriber.writer.close()
+
+    async def _on_connect(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+
+        self._greeting.add(writer)
+        try:
+            _, _, payload = await read_frame(reader)
+            hello = self.codec.loads(payload)
+        except (asyncio.IncompleteReadError, ValueError, ConnectionError):
+            writer.close()
+            return
+        finally:
+            self._greeting.discard(writer)
+
+        courses = set(hello['courses']) if hello.get('courses') is not None else None
+        subscriber = _Subscriber(writer, courses, self.buffer_size)
+
+        resume = hello.get('resume') if hello.get('epoch') == self.epoch else None
+        oldest = self._history[0][0] if self._history else self.seq + 1
+        writer.write(_control({'epoch': self.epoch, 'seq': self.seq, 'oldest': oldest}, self.codec))
+
+        # frames missed since ``resume`` go first; publish() cannot run in between,
+        # so every later frame lands in the queue
+        if resume is not None:
+            subscriber.backlog = [frame for seq, course_id, frame in self._history
+                                  if seq > resume and subscriber.wants(course_id)]
+
+        self._subscribers.add(subscriber)
+        subscriber.task = asyncio.ensure_future(self._write(subscriber))
+        # the subscriber never sends anything else; reading notices when it goes away
+        try:
+            await reader.read()
+        except ConnectionError:
+            pass
+        self._drop(subscriber)
+
+    async def _write(self, subscriber: _Subscriber):
+
+        writer, queue = subscriber.writer, subscriber.queue
+        try:
+            backlog, subscriber.backlog = subscriber.backlog, []
+            for index, frame in enumerate(backlog, 1):
+                writer.write(frame)
+                subscriber.sent += 1
+                if index % 256 == 0:
+                    await writer.drain()
+            while True:
+                writer.write(await queue.get())
+                subscriber.sent += 1
+                # write everything already queued before waiting on the socket
+                while not queue.empty():
+                    writer.write(queue.get_nowait())
+                    subscriber.sent += 1
+                await writer.drain()
+        except ConnectionError:
+            self._drop(subscriber)
+
+
+class RelayClient(EdClient):
+    """
+    EdClient fed by an EventRelay instead of its own websocket connection.
+
+    Listeners are registered the same way, with ``listener`` and
+    ``add_event_hooks``. ``subscribe`` connects to the relay and keeps reading
+    until closed, reconnecting and resuming after the last frame received. REST
+    methods still talk to Ed directly and need a token.
+    """
+
+    def __init__(self, path: t.Optional[str] = None, host: str = '127.0.0.1', port: t.Optional[int] = None,
+            **kwargs) -> None:
+
+        super().__init__(**kwargs)
+        if path is None and port is None:
+            raise ValueError('RelayClient needs a socket path or a port.')
+
+        self.relay_path = path
+        self.relay_host = host
+        self.relay_port = port
+
+        self.last_seq: t.Optional[int] = None
+        self._epoch: t.Optional[str] = None
+        self._writer: t.Optional[asyncio.StreamWriter] = None
+        self._closed = False
+        self.gaps = 0
+
+    async def subscribe(self, course_ids: t.Optional[t.Union[int, t.List]] = None):
+
+        if course_ids is not None and not isinstance(course_ids, t.Iterable):
+            course_ids = [course_ids]
+
+        self._closed = False
+        self.is_subscribed = True
+        attempt = 0
+        try:
+            while not self._closed:
+                attempt += 1
+                try:
+                    if self.relay_path is not None:
+                        reader, self._writer = await asyncio.open_unix_connection(self.relay_path)
+                    else:
+                        reader, self._writer = await asyncio.open_connection(self.relay_host, self.relay_port)
+                except OSError as error:
+                    _log.warning('Failed to connect to relay (%s). Retrying...', error)
+                    await asyncio.sleep(_backoff(attempt))
+                    continue
+
+                resumed_from = self.last_seq
+                try:
+                    await self._listen(reader, course_ids)
+                except (asyncio.IncompleteReadError, OSError):
+                    pass
+                finally:
+                    self._writer.close()
+                    self._writer = None
+                if self._closed:
+                    break
+
+                # back off even after a clean disconnect, so a relay dropping a subscriber
+                # right away (or restarting) is not hammered; only progress resets it
+                if self.last_seq != resumed_from:
+                    attempt = 0
+                delay = _backoff(attempt + 1)
+                _log.warning('Disconnected from relay; resuming after frame %s in %.1fs.', self.last_seq, delay)
+                await asyncio.sleep(delay)
+        finally:
+            self.is_subscribed = False
+
+    async def _listen(self, reader: asyncio.StreamReader, course_ids: t.Optional[t.Iterable[int]]):
+
+        codec = self._transport.codec
+        self._writer.write(_control({'courses': list(course_ids) if course_ids is not None else None,
+                                     'resume': self.last_seq, 'epoch': self._epoch}, codec))
+
+        _, _, payload = await read_frame(reader)
+        hello = codec.loads(payload)
+        if hello['epoch'] != self._epoch:
+            self._epoch, self.last_seq = hello['epoch'], None   # the relay restarted
+        elif self.last_seq is not None and hello['oldest'] > self.last_seq + 1:
+            self.gaps += 1
+            _log.warning('Relay no longer holds frames %d to %d; they were missed.',
+                self.last_seq + 1, hello['oldest'] - 1)
+
+        while True:
+            seq, flags, payload = await read_frame(reader)
+            received_at = time.perf_counter()
+            self.last_seq = seq
+            if (message := self._transport._decode_frame(payload.decode())) is None:
+                continue
+            await self._transport._handle_message(message, replayed=bool(flags & FLAG_REPLAYED),
+                received_at=received_at)
+
+    async def close(self):
+        self._closed = True
+        if self._writer is not None:
+            self._writer.close()
+        await super().close()
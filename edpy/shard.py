@@ -0,0 +1,518 @@
+import time
+import random
+import asyncio
+import logging
+import typing as t
+from collections import OrderedDict
+
+import aiohttp
+
+from .codec import peek_type
+from .events import EVENT_TYPES
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .transport import Transport
+
+_log = logging.getLogger('edpy.shard')
+
+CLOSE_TYPES = (
+    aiohttp.WSMsgType.CLOSE,
+    aiohttp.WSMsgType.CLOSING,
+    aiohttp.WSMsgType.CLOSED
+)
+
+BACKOFF_BASE = 1
+BACKOFF_CAP = 60
+
+SEND_TIMEOUT = 10
+SEND_RETRIES = 2
+MAX_IN_FLIGHT = 256
+
+# a connection idle for PROBE_INTERVAL seconds is pinged, and dropped if nothing
+# arrives within PROBE_TIMEOUT seconds of the ping
+PROBE_INTERVAL = 10.0
+PROBE_TIMEOUT = 5.0
+
+# event frames remembered to drop their second copy when a standby connection is open,
+# and for how many seconds at most
+DEDUP_WINDOW = 4096
+DEDUP_MAX_AGE = 30.0
+
+# how long a restart waits for the first connection of a pair to be subscribed
+# again before it closes the second one anyway
+RESTART_TIMEOUT = 30.0
+
+
+def _backoff(attempt: int) -> float:
+    """Capped exponential backoff with jitter, so many clients do not reconnect in lockstep."""
+    delay = min(BACKOFF_CAP, BACKOFF_BASE * 2 ** (attempt - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class _Pending:
+    """An outgoing message waiting for the reply carrying its id."""
+
+    __slots__ = ('data', 'future', 'timeout', 'retries', 'timer')
+
+    def __init__(self, data: dict, future: asyncio.Future, timeout: float, retries: int) -> None:
+        self.data = data
+        self.future = future
+        self.timeout = timeout
+        self.retries = retries
+        self.timer: t.Optional[asyncio.TimerHandle] = None
+
+
+class ArrivalWindow:
+    """
+    Drops the second copy of event frames received on two connections. Frames are
+    identified by their raw text, which Ed sends identically to every connection.
+    A frame repeated on the connection it first arrived on is a new event and is
+    kept; only a copy from the other connection is dropped.
+
+    A frame only one connection delivered must not swallow an identical, genuinely
+    new frame later arriving on the other one, so frames are forgotten after
+    ``max_age`` seconds, and the frames waiting for a connection's copy are
+    forgotten when that connection drops or comes back.
+    """
+
+    def __init__(self, size: int = DEDUP_WINDOW, max_age: float = DEDUP_MAX_AGE) -> None:
+        self.size = size
+        self.max_age = max_age
+        # frame hash -> [connection it arrived on first, copies still expected, arrival time]
+        self._pending: 't.OrderedDict[int, list]' = OrderedDict()
+        self.duplicates = 0
+
+    def first(self, link: 'Shard', text: str) -> bool:
+        """Whether this is the first copy of the frame; replies and unknown frames always are."""
+
+        if peek_type(text) not in EVENT_TYPES:
+            return True
+
+        key = hash(text)
+        if (entry := self._pending.get(key)) is not None:
+            if entry[0] is not link:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._pending[key]
+                self.duplicates += 1
+                return False
+            entry[1] += 1
+            return True
+
+        now = time.monotonic()
+        self._pending[key] = [link, 1, now]
+        # frames the other connection never delivered, e.g. while it was down
+        pending = self._pending
+        while len(pending) > self.size or now - next(iter(pending.values()))[2] > self.max_age:
+            pending.popitem(last=False)
+        return True
+
+    def forget(self, link: 'Shard'):
+        """Drops the frames that arrived on ``link`` first; their other copy will not come."""
+        for key in [key for key, entry in self._pending.items() if entry[0] is link]:
+            del self._pending[key]
+
+
+class Shard:
+    """
+    A single websocket connection to Ed carrying the subscriptions of a subset of
+    courses. Each shard runs its own listen loop and reconnects on its own, and
+    hands every frame to the transport it belongs to.
+
+    A shard may keep a hot standby: a second connection subscribed to the same
+    courses. Both deliver frames and the first copy of each event wins, so when
+    either connection dies the other carries on with no gap and no backfill.
+    """
+
+    def __init__(self, transport: 'Transport', shard_id: int, primary: t.Optional['Shard'] = None) -> None:
+
+        self.transport = transport
+        self.shard_id = shard_id
+        # a standby shares the course set of its primary
+        self.primary = primary
+        self.course_ids: t.Set[int] = primary.course_ids if primary is not None else set()
+        self.standby: t.Optional[Shard] = None
+
+        self._ws: t.Optional[aiohttp.ClientWebSocketResponse] = None
+        self._ws_closed = True
+        self._closed = False
+        self._task: t.Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._connected_once = False
+
+        # courses whose course.subscribe has been acknowledged on the current connection
+        self.subscribed: t.Set[int] = set()
+
+        self._message_id = 0
+        self._message_queue: t.List[_Pending] = []
+        self._in_flight: 't.OrderedDict[int, _Pending]' = OrderedDict()
+        self._slot_freed = asyncio.Event()
+
+        # monotonic time of the last message of any kind on the current connection
+        self._last_seen = 0.0
+
+        # set on a course.subscribe ack; restart() waits on it
+        self._acked = asyncio.Event()
+        # the current connection is being closed on purpose
+        self._restarting = False
+
+    def __repr__(self):
+        role = ' standby' if self.primary is not None else ''
+        return f'<Shard id={self.shard_id}{role} courses={len(self.course_ids)}>'
+
+    @property
+    def links(self) -> t.Tuple['Shard', ...]:
+        """This connection and its standby, if any."""
+        return (self, self.standby) if self.standby is not None else (self,)
+
+    @property
+    def partner(self) -> t.Optional['Shard']:
+        """The other connection of the pair: the standby of a primary, or the primary of a standby."""
+        return self.standby if self.primary is None else self.primary
+
+    def live(self, course_id: int) -> bool:
+        """Whether events of a course arrive on this shard or its standby."""
+        return any(link.ws_connected and course_id in link.subscribed for link in self.links)
+
+    @property
+    def ws_connected(self):
+        return self._ws is not None and not self._ws.closed
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> asyncio.Task:
+        if self.standby is not None:
+            self.standby.start()
+        if not self.running:
+            self._closed = False
+            self._task = asyncio.create_task(self._run())
+        return self._task
+
+    async def _run(self):
+
+        drops = 0
+        while not self._closed:
+            if not self.course_ids:
+                # idle shards hold no connection until a course is assigned to them
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            started = time.monotonic()
+            await self._connect()
+            if self._closed or self._restarting:
+                continue
+
+            # wait before reconnecting after a drop too, so a restarting server is not hit
+            # by every client at once; connections dropping soon after opening back off further
+            drops = drops + 1 if time.monotonic() - started < BACKOFF_CAP else 1
+            await asyncio.sleep(_backoff(drops))
+
+    async def subscribe(self, course_id: int):
+
+        self.course_ids.add(course_id)
+        for link in self.links:
+            link._wakeup.set()
+            if link.ws_connected:
+                await link._subscribe(course_id)
+
+    async def _subscribe(self, course_id: int):
+
+        future = await self._send({'type': 'course.subscribe', 'oid': course_id})
+
+        def on_ack(future: asyncio.Future):
+            if future.cancelled():
+                return
+            if (error := future.exception()) is not None:
+                _log.warning('Course %s not subscribed: %r', course_id, error)
+            elif course_id in self.course_ids:
+                _log.info(f'Course {course_id} subscribed.')
+                self.subscribed.add(course_id)
+                self._acked.set()
+                self.transport._on_subscribed(course_id)
+
+        future.add_done_callback(on_ack)
+
+    async def unsubscribe(self, course_id: int):
+        """
+        Drops a course from this shard. Ed has no unsubscribe message, so the shard
+        reconnects with its remaining courses; other shards are left untouched.
+        """
+
+        if course_id not in self.course_ids:
+            return
+        self.course_ids.discard(course_id)
+        for link in self.links:
+            link.subscribed.discard(course_id)
+        await self.restart()
+
+    async def restart(self):
+        """
+        Closes the current connection; the run loop reconnects with the current
+        courses. With a standby the connections restart one at a time, the second
+        once the first is subscribed again, so events keep arriving throughout.
+        """
+
+        for index, link in enumerate(self.links):
+            if index:
+                try:
+                    await asyncio.wait_for(self.links[index - 1]._wait_resubscribed(), RESTART_TIMEOUT)
+                except asyncio.TimeoutError:
+                    _log.warning('Shard %d: not resubscribed after %ds; restarting the standby anyway.',
+                        self.shard_id, RESTART_TIMEOUT)
+            if link._ws is not None:
+                link._restarting = True
+                await link._ws.close()
+
+    async def _wait_resubscribed(self):
+
+        # the connection being closed is still reported open until the listen loop ends
+        while self._restarting or not (self.ws_connected and self.course_ids <= self.subscribed):
+            if not self.course_ids:
+                return      # an idle shard does not reconnect
+            self._acked.clear()
+            await self._acked.wait()
+
+    async def close(self):
+
+        if self.standby is not None:
+            await self.standby.close()
+        self._closed = True
+        self._ws_closed = True
+        self._wakeup.set()
+        if self._ws is not None:
+            await self._ws.close(code=aiohttp.WSCloseCode.OK)
+            self._ws = None
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+        for pending in self._message_queue:
+            self._fail(pending, ConnectionError('Shard closed.'))
+        self._message_queue.clear()
+
+    async def _connect(self):
+
+        attempt = 0
+        self._ws_closed = False
+        while not self.ws_connected and not self._ws_closed:
+            attempt += 1
+            try:
+                # pings are answered and sent by the listen loop and the watchdog; the
+                # close handshake gets no longer than a probe, the peer may be gone
+                self._ws = await self.transport._session.ws_connect(
+                    url=self.transport.ws_url + '/api/stream',
+                    headers={'Authorization': self.transport.ed_token},
+                    autoping=False, timeout=self.transport.probe_timeout)
+            except aiohttp.WSServerHandshakeError as ce:
+                if ce.status == 401:
+                    _log.warning('Authentication failed.')
+                    if attempt == 10:
+                        _log.error('Failed due to unkwown reason.')
+                        raise ce
+                elif ce.status != 503:  # 503 may happen at times
+                    _log.warning('Failed to connect to websocket with status code {} and '
+                        'error message "{}". Retrying...'.format(ce.status, ce.message))
+
+                await asyncio.sleep(_backoff(attempt))
+            except (aiohttp.ClientError, OSError) as error:
+                _log.warning('Shard %d: failed to connect to websocket (%s). Retrying...', self.shard_id, error)
+                await asyncio.sleep(_backoff(attempt))
+            else:
+                _log.info('Shard %d: connection to websocket established.', self.shard_id)
+                attempt = 0
+                self._restarting = False
+
+                # sent alongside the listen loop, which is what reads the replies that
+                # free up room in the in-flight table
+                sending = asyncio.ensure_future(self._on_connected())
+                self._last_seen = time.monotonic()
+                watchdog = asyncio.ensure_future(self._watch(self._ws))
+
+                if self._connected_once:
+                    self.transport._on_reconnect(self)
+                self._connected_once = True
+
+                try:
+                    await self._listen()
+                finally:
+                    sending.cancel()
+                    watchdog.cancel()
+                self.transport._on_disconnect(self)
+
+    async def _on_connected(self):
+
+        for course_id in sorted(self.course_ids):
+            await self._subscribe(course_id)
+
+        if self._message_queue:
+            queued, self._message_queue = self._message_queue, []
+            for pending in queued:
+                await self._transmit(pending)
+
+    async def _watch(self, ws: aiohttp.ClientWebSocketResponse):
+        """
+        Pings the connection once it has been idle for ``probe_interval`` seconds and
+        closes it if nothing, not even the pong, arrives within ``probe_timeout``. A
+        half-open connection is then noticed within seconds instead of never.
+        """
+
+        interval, timeout = self.transport.probe_interval, self.transport.probe_timeout
+        if interval is None:
+            return
+
+        while not ws.closed:
+            if (idle := time.monotonic() - self._last_seen) < interval:
+                await asyncio.sleep(interval - idle)
+                continue
+
+            probed_at = time.monotonic()
+            try:
+                await ws.ping()
+            except (ConnectionError, RuntimeError):
+                return
+            await asyncio.sleep(timeout)
+            if self._last_seen < probed_at and not ws.closed:
+                _log.warning('Shard %d: no reply to a ping in %.1fs; dropping the connection.', self.shard_id, timeout)
+                if (metrics := self.transport.metrics) is not None:
+                    metrics.inc('edpy_ws_probe_failures_total', shard=self.shard_id)
+                await ws.close(code=aiohttp.WSCloseCode.GOING_AWAY)
+                return
+
+    @property
+    def in_flight(self) -> int:
+        """Number of messages sent or queued that are still waiting for a reply."""
+        return len(self._in_flight) + len(self._message_queue)
+
+    async def _send(self, data: dict, timeout: float = SEND_TIMEOUT, retries: int = SEND_RETRIES) -> asyncio.Future:
+        """
+        Sends a message and returns a future resolved with Ed's reply to it. The
+        message is resent up to ``retries`` times if no reply arrives within
+        ``timeout`` seconds, after which the future fails with a TimeoutError.
+        """
+
+        # bound the table of unanswered messages; wait for replies to free up room
+        while self.in_flight >= MAX_IN_FLIGHT:
+            self._slot_freed.clear()
+            await self._slot_freed.wait()
+
+        future = asyncio.get_running_loop().create_future()
+        pending = _Pending(data, future, timeout, retries)
+
+        if not self.ws_connected:
+            _log.debug('WebSocket not ready; queued outgoing payload.')
+            self._message_queue.append(pending)
+            return future
+
+        await self._transmit(pending)
+        return future
+
+    async def _transmit(self, pending: _Pending):
+
+        if not self.ws_connected:
+            self._message_queue.append(pending)
+            return
+
+        data = pending.data
+        data['id'] = self._message_id = self._message_id + 1
+        self._in_flight[data['id']] = pending
+        pending.timer = asyncio.get_running_loop().call_later(pending.timeout, self._on_timeout, data['id'])
+
+        _log.debug('Sending payload %s', str(data))
+        try:
+            await self._ws.send_json(data)
+        except (ConnectionError, RuntimeError) as error:
+            self._prune(data['id'], error)
+
+    def _on_timeout(self, message_id: int):
+
+        if (pending := self._in_flight.pop(message_id, None)) is None:
+            return
+
+        if pending.retries > 0 and self.ws_connected:
+            pending.retries -= 1
+            _log.debug('No reply to message %s; retrying.', message_id)
+            task = asyncio.ensure_future(self._transmit(pending))
+            task.add_done_callback(lambda task: task.cancelled() or task.exception())
+            return
+
+        self._fail(pending, asyncio.TimeoutError(f'No reply to {pending.data.get("type")} message.'))
+
+    def _prune(self, message_id: int, error: Exception):
+        if (pending := self._in_flight.pop(message_id, None)) is not None:
+            self._fail(pending, error)
+
+    def _fail(self, pending: _Pending, error: Exception):
+
+        if pending.timer is not None:
+            pending.timer.cancel()
+        if not pending.future.done():
+            pending.future.set_exception(error)
+            # callers may not await every future; keep asyncio from logging the error
+            pending.future.exception()
+        self._slot_freed.set()
+
+    def _resolve(self, message: dict) -> bool:
+        """Resolves the future waiting for this reply, if any."""
+
+        if (pending := self._in_flight.pop(message.get('id'), None)) is None:
+            return False
+
+        if pending.timer is not None:
+            pending.timer.cancel()
+        if not pending.future.done():
+            pending.future.set_result(message)
+        self._slot_freed.set()
+        return True
+
+    async def _listen(self):
+        """ Listens for websocket messages. """
+        close_code = None
+
+        arrivals = self.transport.arrivals
+        async for msg in self._ws:
+            self._last_seen = time.monotonic()
+            if msg.type == aiohttp.WSMsgType.TEXT:
+                received_at = time.perf_counter()
+                # with a standby, the copy from the slower connection stops here
+                if arrivals is not None and not arrivals.first(self, msg.data):
+                    continue
+                if (message := self.transport._decode_frame(msg.data)) is None:
+                    continue
+                if (journal := self.transport.journal) is not None:
+                    journal.append(msg.data, message)
+                await self._handle_frame(message, received_at)
+            elif msg.type == aiohttp.WSMsgType.PING:
+                await self._ws.pong(msg.data)
+            elif msg.type == aiohttp.WSMsgType.ERROR:
+                _log.error('Websocket connection closed with exception %s', self._ws.exception())
+                close_code = aiohttp.WSCloseCode.INTERNAL_ERROR
+            elif msg.type in CLOSE_TYPES:
+                _log.info('Websocket connection closed with [%d] %s', msg.data, msg.extra)
+                close_code = msg.data
+                break
+
+        close_code = close_code or (self._ws.close_code if self._ws else None)
+        _log.log(logging.INFO if self._closed else logging.WARNING,
+            'Shard %d: WebSocket disconnected with the following: code=%s', self.shard_id, close_code)
+        if self._ws:
+            await self._ws.close(code=close_code or aiohttp.WSCloseCode.OK)
+            self._ws = None
+        self._ws_closed = True
+
+        # replies to messages sent on this connection will never arrive
+        self.subscribed.clear()
+        for message_id in list(self._in_flight):
+            self._prune(message_id, ConnectionError('WebSocket disconnected before a reply arrived.'))
+
+    async def _handle_frame(self, message: dict, received_at: t.Optional[float] = None):
+
+        if 'id' in message and self._resolve(message):
+            return
+
+        await self.transport._handle_message(message, received_at=received_at)
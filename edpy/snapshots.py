@@ -0,0 +1,99 @@
+import typing as t
+from collections import OrderedDict
+
+from .models.comment import Comment
+from .models.thread import Thread
+
+# nested objects are not snapshotted; they are large and change through their own events
+_NESTED = ('_raw', 'answers', 'comments', 'user')
+
+THREAD_FIELDS = frozenset(field for field in Thread.__slots__ if field not in _NESTED)
+COMMENT_FIELDS = frozenset(field for field in Comment.__slots__ if field not in _NESTED)
+
+Changes = t.Dict[str, t.Tuple[t.Any, t.Any]]
+
+
+def merge_changes(first: t.Optional[Changes], second: t.Optional[Changes]) -> t.Optional[Changes]:
+    """Combines the changes of two consecutive updates into those of one."""
+
+    if first is None or second is None:
+        return None
+    merged = dict(first)
+    for field, (old, new) in second.items():
+        old = merged[field][0] if field in merged else old
+        if old == new:
+            merged.pop(field, None)
+        else:
+            merged[field] = (old, new)
+    return merged
+
+
+class SnapshotStore:
+    """
+    Last known field values of recently seen threads and comments, used to tell
+    what an update event changed.
+
+    ``thread.new`` and ``comment.new`` frames record a snapshot, and each update
+    is compared against it field by field and then merged into it. At most
+    ``max_items`` snapshots are kept, least recently updated first out. An
+    update for an id with no snapshot has unknown changes (None).
+    """
+
+    def __init__(self, max_items: int = 10000) -> None:
+
+        self.max_items = max_items
+        self._snapshots: 't.OrderedDict[t.Tuple[str, int], dict]' = OrderedDict()
+
+        self.diffed = 0
+        self.unknown = 0
+
+    def __len__(self):
+        return len(self._snapshots)
+
+    def stats(self) -> dict:
+        return {
+            'snapshots': len(self._snapshots),
+            'diffed': self.diffed,
+            'unknown': self.unknown,
+        }
+
+    def get(self, kind: str, item_id: int) -> t.Optional[dict]:
+        return self._snapshots.get((kind, item_id))
+
+    def observe(self, event_type: str, data: dict) -> t.Optional[Changes]:
+        """
+        Records a frame and, for updates, returns the fields it changed as
+        ``{field: (old, new)}``, or None when the previous state is unknown.
+        """
+
+        if event_type in ('thread.new', 'thread.update'):
+            kind, raw, fields = 'thread', data.get('thread') or {}, THREAD_FIELDS
+        elif event_type in ('comment.new', 'comment.update'):
+            kind, raw, fields = 'comment', data.get('comment') or {}, COMMENT_FIELDS
+        elif event_type == 'thread.delete':
+            self._snapshots.pop(('thread', data.get('thread_id')), None)
+            return None
+        elif event_type == 'comment.delete':
+            self._snapshots.pop(('comment', data.get('comment_id')), None)
+            return None
+        else:
+            return None
+
+        key = (kind, raw.get('id'))
+        snapshot = self._snapshots.get(key)
+        values = {field: value for field, value in raw.items() if field in fields}
+
+        if snapshot is None:
+            self._snapshots[key] = values
+            if len(self._snapshots) > self.max_items:
+                self._snapshots.popitem(last=False)
+            if event_type.endswith('.update'):
+                self.unknown += 1
+            return None
+
+        self._snapshots.move_to_end(key)
+        changes = {field: (snapshot.get(field), value) for field, value in values.items()
+                   if snapshot.get(field) != value}
+        snapshot.update(values)
+        self.diffed += 1
+        return changes
@@ -0,0 +1,114 @@
+import asyncio
+import typing as t
+from collections import deque
+
+from .dispatch import OVERFLOW_BLOCK, OVERFLOW_DROP, OVERFLOW_DROP_OLDEST, OVERFLOW_POLICIES
+from .events import Event
+
+
+class EventStream:
+    """
+    Buffer between the listener registry and one ``client.events()`` consumer.
+
+    Events are handed out in batches of up to ``max_batch``: a batch is returned
+    as soon as it is full, or ``max_wait`` seconds after the consumer started
+    waiting with at least one event buffered. At most ``max_size`` events are
+    buffered; when the consumer falls behind, ``overflow`` decides what happens:
+
+    - ``'block'``: the dispatch path waits for room, which pushes back on the
+      websocket reader (or the dispatcher workers).
+    - ``'drop_oldest'``: the oldest buffered event is discarded.
+    - ``'drop'``: the incoming event is discarded.
+    """
+
+    def __init__(self, max_batch: int = 100, max_wait: float = 0.5, max_size: int = 1000,
+            overflow: str = OVERFLOW_BLOCK) -> None:
+
+        if max_batch < 1 or max_size < 1:
+            raise ValueError('Streams need max_batch and max_size of at least 1.')
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f'Invalid overflow policy: {overflow}')
+
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.max_size = max_size
+        self.overflow = overflow
+
+        self._buffer: t.Deque[Event] = deque()
+        self._readable = asyncio.Event()
+        self._writable = asyncio.Event()
+        self._closed = False
+
+        self.delivered = 0
+        self.dropped = 0
+
+    @property
+    def depth(self) -> int:
+        return len(self._buffer)
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def stats(self) -> dict:
+        return {
+            'depth': len(self._buffer),
+            'delivered': self.delivered,
+            'dropped': self.dropped,
+        }
+
+    async def put(self, event: Event):
+
+        while len(self._buffer) >= self.max_size and not self._closed:
+            if self.overflow == OVERFLOW_DROP_OLDEST:
+                self._buffer.popleft()
+                self.dropped += 1
+            elif self.overflow == OVERFLOW_DROP:
+                self.dropped += 1
+                return
+            else:
+                self._writable.clear()
+                await self._writable.wait()
+
+        if self._closed:
+            return
+        self._buffer.append(event)
+        self._readable.set()
+
+    async def next_batch(self) -> t.List[Event]:
+        """Waits for the next batch; raises StopAsyncIteration once closed and drained."""
+
+        while not self._buffer:
+            if self._closed:
+                raise StopAsyncIteration
+            self._readable.clear()
+            await self._readable.wait()
+
+        if len(self._buffer) < self.max_batch and not self._closed:
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + self.max_wait
+            while len(self._buffer) < self.max_batch and not self._closed:
+                if (remaining := deadline - loop.time()) <= 0:
+                    break
+                self._readable.clear()
+                try:
+                    await asyncio.wait_for(self._readable.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+
+        batch = [self._buffer.popleft() for _ in range(min(self.max_batch, len(self._buffer)))]
+        self.delivered += len(batch)
+        self._writable.set()
+        return batch
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> t.List[Event]:
+        return await self.next_batch()
+
+    def close(self):
+        """Ends the stream once the events already buffered have been handed out."""
+        self._closed = True
+        self._readable.set()
+        self._writable.set()
@@ -1,63 +1,193 @@
 import os
+import copy
 import logging
 import asyncio
+import time
 import aiohttp
+import typing as t
 
-from collections import defaultdict
 from typing import TYPE_CHECKING
 
+from .codec import JsonCodec, default_codec, peek_type
 from .errors import AuthenticationError, RequestError
-from .events import (ThreadNewEvent, ThreadUpdateEvent, ThreadDeleteEvent, CommentNewEvent,
-                     CommentUpdateEvent, CommentDeleteEvent, CourseCountEvent)
-from .models.comment import Comment
-from .models.thread import Thread
+from .events import EVENT_TYPES, build_event
+from .metrics import endpoint_label
+from .ratelimit import RateLimiter, parse_retry_after
+from .shard import PROBE_INTERVAL, PROBE_TIMEOUT, ArrivalWindow, Shard
 
 if TYPE_CHECKING:
+    from .cache import ResponseCache
     from .client import EdClient
+    from .coalesce import EventCoalescer
+    from .journal import EventJournal
+    from .metrics import MetricsSink
+    from .presence import PresenceRecorder
+    from .recovery import GapRecovery
+    from .snapshots import SnapshotStore
 
 _log = logging.getLogger('edpy.transport')
 
 API_HOST = 'us.edstem.org'
 
-CLOSE_TYPES = (
-    aiohttp.WSMsgType.CLOSE,
-    aiohttp.WSMsgType.CLOSING,
-    aiohttp.WSMsgType.CLOSED
-)
+
+class _SharedRequest:
+    """A GET request on the wire and the number of callers waiting for it."""
+
+    __slots__ = ('future', 'callers')
+
+    def __init__(self, future: asyncio.Future) -> None:
+        self.future = future
+        self.callers = 1
 
 
 class Transport:
     """The class responsible for dealing with connections to Ed client."""
 
-    def __init__(self, client: 'EdClient', ed_token: str) -> None:
+    def __init__(self, client: 'EdClient', ed_token: str, lazy_models: bool = False,
+            api_host: str = None, shard_count: int = 1, coalescer: 'EventCoalescer' = None,
+            recovery: 'GapRecovery' = None, rate_limiter: RateLimiter = None,
+            journal: 'EventJournal' = None, metrics: 'MetricsSink' = None,
+            cache: 'ResponseCache' = None, presence: 'PresenceRecorder' = None,
+            snapshots: 'SnapshotStore' = None, codec: JsonCodec = None,
+            probe_interval: t.Optional[float] = PROBE_INTERVAL, probe_timeout: float = PROBE_TIMEOUT,
+            standby: bool = False) -> None:
+
+        if shard_count < 1:
+            raise ValueError('Transport needs at least one shard.')
 
         self.client = client
         self.ed_token = ed_token or os.getenv('ED_API_TOKEN')
-
-        self._ws = None
-        self._ws_closed = True
+        self.lazy_models = lazy_models
+        self.coalescer = coalescer
+        self.journal = journal
+        self.presence = presence
+        self.snapshots = snapshots
+        # decodes frames and REST responses; the stdlib unless a faster codec is given
+        self.codec = codec or default_codec()
+        self.skipped_frames = 0
+        self.metrics = metrics
+        self.recovery = recovery
+        if recovery is not None:
+            recovery.bind(self)
+        self.cache = cache
+        if cache is not None:
+            cache.bind(self)
+
+        # host may carry its own scheme (e.g. http://127.0.0.1:8080 for a local stand-in)
+        host = api_host or os.getenv('ED_API_HOST') or API_HOST
+        self.api_url = (host if '://' in host else 'https://' + host).rstrip('/')
+        self.ws_url = 'ws' + self.api_url[len('http'):]
 
         self._session = aiohttp.ClientSession()
-        
-        self._message_id = 0
-        self._message_queue: list[str] = []
-        self._message_sent = defaultdict(dict)
+        # shared by every REST call; the default only adapts concurrency and retries
+        self.rate_limiter = rate_limiter or RateLimiter()
+
+        # GET requests currently on the wire, keyed by endpoint and parameters
+        self._in_flight: t.Dict[tuple, _SharedRequest] = {}
+        self.coalesced_requests = 0
+
+        # idle connections are pinged after probe_interval seconds (None disables it)
+        # and dropped if nothing arrives within probe_timeout
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+
+        # courses are spread across shard_count websocket connections sharing one session
+        self._shards = [Shard(self, shard_id) for shard_id in range(shard_count)]
+        self._course_shards: t.Dict[int, Shard] = {}
+        self._disconnected_at: t.Dict[Shard, float] = {}
+
+        # with standby, every shard keeps a second subscribed connection; the copy of
+        # each event arriving second is dropped before it is decoded
+        self.arrivals = ArrivalWindow() if standby else None
+        if standby:
+            for shard in self._shards:
+                shard.standby = Shard(self, shard.shard_id, primary=shard)
+        # connections lost while their partner kept receiving, so nothing was missed
+        self._covered: t.Set[Shard] = set()
+        self.failovers = 0
+        self._subscribed = asyncio.Event()
 
     @property
     def ws_connected(self):
-        return self._ws is not None and not self._ws.closed
+        return any(link.ws_connected for shard in self._shards for link in shard.links)
 
-    """
-    async def close(self):
-        if not self._ws:
-            return
-        
-        await self._ws.close(code=aiohttp.WSCloseCode.OK)
-        self._ws = None
-        self._ws_closed = True
-    """
+    @property
+    def all_subscribed(self) -> bool:
+        """Whether Ed has acknowledged the subscription of every course."""
+        return bool(self._course_shards) and all(
+            any(course_id in link.subscribed for link in shard.links)
+            for course_id, shard in self._course_shards.items())
+
+    def _course_live(self, course_id: int) -> bool:
+        """Whether events of a course are currently being received."""
+        shard = self._course_shards.get(course_id)
+        return shard is not None and shard.live(course_id)
+
+    def _on_subscribed(self, course_id: int):
+        # the backfill starts only now: events from here on arrive live
+        if self.recovery is not None:
+            self.recovery.subscribed(course_id)
+        self._subscribed.set()
+
+    async def wait_subscribed(self, timeout: t.Optional[float] = None):
+        """Waits until every course is subscribed; raises TimeoutError after ``timeout`` seconds."""
 
-    async def _request(self, method: str, endpoint: str, to=None):
+        async def wait():
+            while not self.all_subscribed:
+                self._subscribed.clear()
+                await self._subscribed.wait()
+
+        await asyncio.wait_for(wait(), timeout)
+
+    @property
+    def shards(self) -> t.List[Shard]:
+        return list(self._shards)
+
+    async def _request(self, method: str, endpoint: str, to=None, params: t.Optional[dict] = None,
+            data: t.Optional[dict] = None, idempotent: t.Optional[bool] = None,
+            on_retry: t.Optional[t.Callable[[int], None]] = None):
+        """
+        Sends a request to Ed, with ``data`` as its JSON body. Concurrent identical
+        GET requests share a single round trip; each caller receives its own copy of
+        the decoded response. ``idempotent`` overrides the method in deciding
+        whether failed writes are retried, e.g. for a POST that locks a thread;
+        ``on_retry`` is called with the number of the attempt about to be retried.
+        """
+
+        if method != 'GET':
+            response = None
+            try:
+                response = await self._send_request(method, endpoint, to, params, data, idempotent, on_retry)
+                return response
+            finally:
+                if self.cache is not None:
+                    # whatever the outcome, the cached copy may no longer match
+                    self.cache.invalidate_endpoint(endpoint, response)
+
+        key = (endpoint, to, tuple(sorted(params.items())) if params else None)
+        if (shared := self._in_flight.get(key)) is None:
+            future = asyncio.ensure_future(self._send_request(method, endpoint, to, params))
+            shared = self._in_flight[key] = _SharedRequest(future)
+            future.add_done_callback(lambda future: self._request_done(key, future))
+        else:
+            shared.callers += 1
+            self.coalesced_requests += 1
+
+        # shield so one cancelled caller does not cancel the request for the others
+        response = await asyncio.shield(shared.future)
+        # no caller can join once the request is done, so a response nobody shares is
+        # handed over as is; shared ones stay untouched and every caller gets a copy,
+        # since models edit their payload in place
+        return copy.deepcopy(response) if shared.callers > 1 else response
+
+    def _request_done(self, key: tuple, future: asyncio.Future):
+        self._in_flight.pop(key, None)
+        if not future.cancelled():
+            future.exception()  # retrieved here in case every caller was cancelled
+
+    async def _send_request(self, method: str, endpoint: str, to=None, params: t.Optional[dict] = None,
+            data: t.Optional[dict] = None, idempotent: t.Optional[bool] = None,
+            on_retry: t.Optional[t.Callable[[int], None]] = None):
 
         if not self.ed_token:
             raise RequestError('Ed API token is not provided and cannot be loaded from environment') 
@@ -65,153 +195,281 @@ class Transport:
         _log.debug('Sending request to Ed server with the following parameters: method=%s, endpoint=%s',
                 method, endpoint)
 
-        try:
-            async with self._session.request(method=method, url= 'https://{}{}'.format(API_HOST, endpoint),
-                                             headers={'Authorization': self.ed_token}) as res:
-                
-                _log.debug('Received response from server: status_code=%s, reason=%s', res.status, res.reason)
-                if (code := res.status) != 200:
-                    if code == 400:
-                        raise AuthenticationError('Invalid Ed API token.')
-                    if code == 403:
-                        raise RequestError('Missing permission')
-                    if code == 404:
-                        raise RequestError('Invalid API endpoint.')
-
-                if to is str:
-                    return await res.text()
-
-                json = await res.json()
-                return json if to is None else to.from_dict(json)
-
-        except aiohttp.ClientConnectorError:
-            pass
-        except aiohttp.ContentTypeError as error:
-            _log.debug('Error decoding JSON: status=%s message=%s payload=%s', 
-               error.status, error.message, await res.text())
-
-    async def _connect(self):
+        headers = {'Authorization': self.ed_token}
+        cache, entry = self.cache, None
+        if cache is not None and method == 'GET' and to is None and cache.cacheable(endpoint):
+            key = (endpoint, tuple(sorted(params.items())) if params else None)
+            generation = cache.generation
+            if (entry := cache.get(key)) is not None:
+                if cache.fresh(entry):
+                    cache.hits += 1
+                    return self.codec.loads(entry.body)
+                headers.update(cache.conditional_headers(entry))
+        else:
+            cache = None
 
+        limiter = self.rate_limiter
+        metrics = self.metrics
         attempt = 0
-        self._ws_closed = False
-        while not self.ws_connected and not self._ws_closed:
+        while True:
             attempt += 1
+            await limiter.acquire(endpoint)
+            status = 'error'
+            started = time.perf_counter()
             try:
-                self._ws = await self._session.ws_connect(
-                    url='wss://{}/api/stream'.format(API_HOST),
-                    headers={'Authorization': self.ed_token},
-                    heartbeat=60)
-            except aiohttp.WSServerHandshakeError as ce:
-                if isinstance(ce, aiohttp.WSServerHandshakeError):
-                    if ce.status == 401:
-                        _log.warning('Authentication failed.')
-                        if attempt == 10:
-                            _log.error('Failed due to unkwown reason.')
-                            raise ce
-                    elif ce.status == 503:  # may happen at times
-                        pass
-                else:
-                    _log.warning('Failed to connect to websocket with status code {} and\
-                        error message "{}".Retrying...'.format(ce.status, ce.message))
-
-                backoff = 5
-                await asyncio.sleep(backoff)
-            else:
-                _log.info('Connection to websocket established.')
-                attempt = 0
-
-                if self._message_queue:
-                    for message in self._message_queue:
-                        await self._send(message)
-                    self._message_queue.clear()
-
-                await self._listen()
-
-    async def _send(self, data: dict):
-
-        data['id'] = self._message_id = self._message_id + 1
-        self._message_sent[self._message_id] = data
-        
-        if not self.ws_connected:
-            _log.debug('WebSocket not ready; queued outgoing payload.')
-            self._message_queue.append(data)
+                async with self._session.request(method=method, url=self.api_url + endpoint, params=params,
+                                                 json=data, headers=headers) as res:
+                    
+                    _log.debug('Received response from server: status_code=%s, reason=%s', res.status, res.reason)
+                    code = status = res.status
+                    if code == 429 or code >= 500:
+                        retry_after = parse_retry_after(res.headers.get('Retry-After'))
+                        if code == 429:
+                            limiter.on_throttled(endpoint, retry_after)
+                        if not limiter.should_retry(method, attempt, code == 429, idempotent):
+                            raise RequestError(f'Request failed with status code {code}.', status=code)
+                        delay = limiter.backoff(attempt, retry_after)
+                        _log.warning('Request to %s failed with status code %s; retrying in %.1fs.',
+                            endpoint, code, delay)
+                    elif code == 304 and entry is not None:
+                        limiter.on_success()
+                        cache.revalidated_entry(entry)
+                        return self.codec.loads(entry.body)
+                    else:
+                        if code != 200:
+                            if code == 400:
+                                raise AuthenticationError('Invalid Ed API token.')
+                            if code == 403:
+                                raise RequestError('Missing permission', status=code)
+                            if code == 404:
+                                raise RequestError('Invalid API endpoint.', status=code)
+                            if code >= 400:
+                                raise RequestError(f'Request failed with status code {code}.', status=code)
+
+                        limiter.on_success()
+                        if to is str:
+                            return await res.text()
+
+                        if cache is not None and code == 200 and res.content_type == 'application/json':
+                            body = await res.read()
+                            data = self.codec.loads(body)
+                            cache.misses += 1
+                            cache.store(key, body, res.headers.get('ETag'), res.headers.get('Last-Modified'),
+                                data, generation)
+                            return data
+
+                        data = await res.json(loads=self.codec.loads)
+                        return data if to is None else to.from_dict(data)
+
+            except aiohttp.ClientConnectorError as error:
+                # the request never reached Ed, so it is safe to send again whatever the method
+                if not limiter.should_retry(method, attempt, throttled=True):
+                    raise RequestError('Failed to connect to Ed server.', transient=True) from error
+                delay = limiter.backoff(attempt)
+            except (aiohttp.ServerDisconnectedError, aiohttp.ClientOSError, asyncio.TimeoutError) as error:
+                if not limiter.should_retry(method, attempt, False, idempotent):
+                    raise RequestError(f'Request to Ed server failed: {error!r}', transient=True) from error
+                delay = limiter.backoff(attempt)
+            except aiohttp.ContentTypeError as error:
+                _log.debug('Error decoding JSON: status=%s message=%s payload=%s', 
+                   error.status, error.message, await res.text())
+                return None
+            finally:
+                limiter.release()
+                if metrics is not None:
+                    label = endpoint_label(endpoint)
+                    metrics.inc('edpy_requests_total', method=method, endpoint=label, status=status)
+                    metrics.observe('edpy_request_duration_seconds', time.perf_counter() - started,
+                        method=method, endpoint=label)
+
+            if on_retry is not None:
+                on_retry(attempt)
+            await limiter.wait(delay)
+
+    async def subscribe(self, course_ids: t.Iterable[int]):
+        """Subscribes to the given courses and runs every shard until the transport is closed."""
+
+        for course_id in course_ids:
+            await self.add_course(course_id)
+
+        await asyncio.gather(*(shard.start() for shard in self._shards))
+
+    async def add_course(self, course_id: int):
+        """Subscribes to a course on the least loaded shard."""
+
+        if course_id in self._course_shards:
             return
-        
-        _log.debug('Sending payload %s', str(data))
-        await self._ws.send_json(data)
-
-    async def _listen(self):
-        """ Listens for websocket messages. """
-        close_code = None
-        
-        async for msg in self._ws:
-            if msg.type == aiohttp.WSMsgType.TEXT:
-                await self._handle_message(msg.json())
-            elif msg.type == aiohttp.WSMsgType.ERROR:
-                _log.error('Websocket connection closed with exception %s', self._ws.exception())
-                close_code = aiohttp.WSCloseCode.INTERNAL_ERROR
-            elif msg.type in CLOSE_TYPES:
-                _log.info('Websocket connection closed with [%d] %s', msg.data, msg.extra)
-                close_code = msg.data
+        shard = min(self._shards, key=lambda shard: len(shard.course_ids))
+        self._course_shards[course_id] = shard
+        await shard.subscribe(course_id)
+
+    async def remove_course(self, course_id: int):
+        """Unsubscribes from a course; only the shard that carried it reconnects."""
+
+        if (shard := self._course_shards.pop(course_id, None)) is not None:
+            await shard.unsubscribe(course_id)
+
+    async def rebalance(self):
+        """
+        Moves courses from the most to the least loaded shards until they differ by at
+        most one course. Only shards that give up a course are reconnected.
+        """
+
+        drained = set()
+        while True:
+            heaviest = max(self._shards, key=lambda shard: len(shard.course_ids))
+            lightest = min(self._shards, key=lambda shard: len(shard.course_ids))
+            if len(heaviest.course_ids) - len(lightest.course_ids) <= 1:
                 break
 
-        close_code = close_code or self._ws.close_code
-        _log.warning('WebSocket disconnected with the following: code=%s', close_code)
-        if self._ws:
-            await self._ws.close(code=close_code or aiohttp.WSCloseCode.OK)
-            self._ws = None
-        self._ws_closed = True
+            course_id = max(heaviest.course_ids)
+            heaviest.course_ids.discard(course_id)
+            drained.add(heaviest)
+            self._course_shards[course_id] = lightest
+            await lightest.subscribe(course_id)
+
+        for shard in drained:
+            await shard.restart()
+
+    async def close(self):
+        await asyncio.gather(*(shard.close() for shard in self._shards))
+        if self.recovery is not None:
+            await self.recovery.close()
+        if self.journal is not None:
+            await self.journal.close()
+        if self.presence is not None:
+            self.presence.close()
+        await self._session.close()
+
+    def _on_disconnect(self, shard: Shard):
+
+        partner = shard.partner
+        if partner is not None and self.arrivals is not None:
+            # frames the partner received first will get no copy from the new connection
+            self.arrivals.forget(partner)
+        if (partner is not None and not shard._closed and partner.ws_connected
+                and shard.course_ids <= partner.subscribed):
+            # the other connection of the pair already delivers every course
+            self._covered.add(shard)
+            if shard._restarting:
+                return
+            _log.warning('Shard %d: connection lost; its %s carries on.', shard.shard_id,
+                'standby' if shard.primary is None else 'primary')
+            self.failovers += 1
+            if self.metrics is not None:
+                self.metrics.inc('edpy_failovers_total', shard=shard.shard_id)
+            return
+
+        if self.metrics is not None:
+            self._disconnected_at.setdefault(shard, time.perf_counter())
+        # a restart on purpose (a course removed, a rebalance) is not a gap to backfill
+        if self.recovery is not None and not shard._restarting:
+            self.recovery.disconnected(shard.course_ids)
+
+    def _on_reconnect(self, shard: Shard):
+        if shard.partner is not None and self.arrivals is not None:
+            self.arrivals.forget(shard.partner)
+        if shard in self._covered:
+            self._covered.discard(shard)
+            if self.metrics is not None:
+                self.metrics.inc('edpy_reconnects_total', shard=shard.shard_id)
+            return
+
+        if self.metrics is not None:
+            self.metrics.inc('edpy_reconnects_total', shard=shard.shard_id)
+            if (disconnected_at := self._disconnected_at.pop(shard, None)) is not None:
+                self.metrics.observe('edpy_reconnect_duration_seconds', time.perf_counter() - disconnected_at,
+                    shard=shard.shard_id)
+        if self.cache is not None:
+            # cached threads of these courses may have changed while no events arrived
+            for course_id in shard.course_ids:
+                self.cache.invalidate_course(course_id)
+
+    def _needs_frame(self, event_type: str) -> bool:
+        """Whether anything uses frames of this type, so they must be decoded."""
+
+        if (event_cls := EVENT_TYPES.get(event_type)) is None:
+            return True     # replies and unknown frames take the full path
+        client = self.client
+        if self.journal is not None or client.relay is not None:
+            return True
+        if event_type == 'course.count':
+            if self.presence is not None:
+                return True
+        elif self.cache is not None or self.snapshots is not None or self.recovery is not None:
+            return True
+        return client._wants_type(event_cls)
+
+    def _decode_frame(self, text: str) -> t.Optional[dict]:
+        """
+        Decodes a raw frame, or returns None when nothing uses it. The type is read
+        off the front of the text first, so frames nobody uses, typically the
+        frequent course.count ones, are never decoded.
+        """
+
+        if (event_type := peek_type(text)) is not None and not self._needs_frame(event_type):
+            self.skipped_frames += 1
+            if self.metrics is not None:
+                self.metrics.inc('edpy_frames_total', type=event_type)
+            return None
+        return self.codec.loads(text)
+
+    async def _handle_message(self, message: dict, replayed: bool = False,
+            received_at: t.Optional[float] = None, history: bool = False):
+        """
+        Handles one decoded frame. ``replayed`` marks frames that did not arrive
+        live, i.e. backfilled or from a journal; ``history`` marks journal frames,
+        which reach the listeners only and leave the cache, presence, recovery,
+        relay, snapshots, coalescer and mirror as they are.
+        """
 
-    async def _handle_message(self, message: dict):
-        
         event_type, data = message['type'], message.get('data')
-        event = None
+
+        if self.metrics is not None:
+            self.metrics.inc('edpy_frames_total', type=event_type)
 
         if event_type in ('chat.init', 'course.subscribe'):
-            if event_type == 'course.subscribe':
-                sent_msg = self._message_sent[message['id']]
-                _log.info(f'Course {sent_msg["oid"]} subscribed.')
             return
-        
-        if event_type == 'thread.new':
-            data = data.get('thread')
-            thread = Thread(data, **data)
-            event = ThreadNewEvent(thread)
-            _log.debug('Event: %s - Payload: %s', event_type, data)
 
-        elif event_type == 'thread.update':
-            data = data.get('thread')
-            thread = Thread(data, **data)
-            event = ThreadUpdateEvent(thread)
-            # _log.debug('Event: %s - Payload: %s', event_type, data)
+        if self.cache is not None and not history:
+            self.cache.on_frame(event_type, data)
 
-        elif event_type == 'thread.delete': # only id is nontrivial
-            thread = Thread(data, id=data.get('thread_id'))     
-            event = ThreadDeleteEvent(thread)
-            _log.debug('Event: %s - Payload: %s', event_type, data)
+        # replayed counts are history; recording them now would stamp them with the current time
+        if event_type == 'course.count' and self.presence is not None and not replayed:
+            self.presence.record(data.get('id'), data.get('count'))
 
-        elif event_type == 'comment.new':
-            data = data.get('comment')
-            comment = Comment(data, **data)
-            event = CommentNewEvent(comment)
-            _log.debug('Event: %s - Payload: %s', event_type, data)
+        if (event_cls := EVENT_TYPES.get(event_type)) is None:
+            _log.warning('Uknown event. Event: %s - Payload: %s', event_type, data)
+            return
 
-        elif event_type == 'comment.update':
-            data = data.get('comment')
-            comment = Comment(data, **data)
-            event = CommentUpdateEvent(comment)
-            _log.debug('Event: %s - Payload: %s', event_type, data)
+        # drops frames already dispatched by a backfill after reconnecting, and vice versa
+        if self.recovery is not None and not history and not self.recovery.observe(event_type, data):
+            return
 
-        elif event_type == 'comment.delete': # only id and thread_id are nontrivial
-            comment = Comment(data, id=data.get('comment_id'), thread_id=data.get('thread_id'))
-            event = CommentDeleteEvent(comment)
-            _log.debug('Event: %s - Payload: %s', event_type, data)
+        # relayed whether or not this client listens to them
+        if (relay := self.client.relay) is not None and not history:
+            relay.publish(message, replayed)
 
-        elif event_type == 'course.count':
-            event = CourseCountEvent(data.get('id'), data.get('count'))
-            # _log.debug('Event: %s - Payload: %s', event_type, data)
+        # diffed whether or not the update is dispatched, to keep the snapshots current
+        changes = self.snapshots.observe(event_type, data) if self.snapshots is not None and not history else None
 
-        else:
-            _log.warning('Uknown event. Event: %s - Payload: %s', event_type, data)
-        
+        # skip decoding entirely when no listener matches the frame
+        if not self.client._wants_event(event_type, event_cls, data, changes):
+            return
+
+        if event_type not in ('thread.update', 'course.count'):
+            _log.debug('Event: %s - Payload: %s', event_type, data)
+
+        event = build_event(event_type, data, lazy=self.lazy_models)
+        if replayed:
+            event.replayed = True
+        if received_at is not None:
+            event.received_at = received_at
+        if changes is not None and event_type.endswith('.update'):
+            event.changes = changes
+        if history:
+            await self.client._dispatch_event(event, history=True)
+            return
+        if self.coalescer is not None and self.coalescer.offer(event):
+            return
         await self.client._dispatch_event(event)
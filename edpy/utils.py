@@ -0,0 +1,13 @@
+import typing as t
+from datetime import datetime
+
+
+def parse_time(value: t.Union[str, datetime, None]) -> t.Optional[datetime]:
+    """Parses an Ed timestamp (ISO 8601 with offset); returns None if missing or malformed."""
+
+    if value is None or isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(value) if value else None
+    except ValueError:
+        return None
@@ -0,0 +1,43 @@
+import asyncio
+
+from aiohttp import web
+
+from benchmarks.fake_server import FakeEdServer
+from edpy import EdClient, RateLimiter
+from edpy.actions import lock_thread, post_comment
+
+
+async def _run_against_failing_writes(actions: list, status: int, max_retries: int) -> tuple:
+
+    server = FakeEdServer()
+    attempts = []
+
+    async def unavailable(request: web.Request):
+        attempts.append(request.path)
+        return web.Response(status=status)
+
+    server.app.router.add_post('/api/threads/{thread_id}/{verb}', unavailable)
+    async with server:
+        client = EdClient(ed_token='test', api_host=server.url,
+            rate_limiter=RateLimiter(max_retries=max_retries, backoff_base=0.001))
+        try:
+            results = await client.batch(actions).run()
+        finally:
+            await client.close()
+    return results, attempts
+
+
+def test_batch_retries_only_through_the_transport():
+    results, attempts = asyncio.run(_run_against_failing_writes([lock_thread(1)], 429, max_retries=2))
+
+    assert [result.status for result in results] == ['failed']
+    assert len(attempts) == 3
+    assert results[0].attempts == 3 and results[0].retries == 2
+
+
+def test_batch_does_not_retry_posts():
+    results, attempts = asyncio.run(_run_against_failing_writes([post_comment(1, 'hi')], 503, max_retries=2))
+
+    assert [result.status for result in results] == ['failed']
+    assert len(attempts) == 1
+    assert results[0].attempts == 1 and results[0].retries == 0
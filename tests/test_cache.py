@@ -0,0 +1,100 @@
+import asyncio
+import json
+
+from benchmarks.fake_server import FakeEdServer, make_thread
+from edpy import EdClient, ResponseCache
+
+
+def store_thread(cache: ResponseCache, thread_id: int, course_id: int = 1):
+    data = {'thread': {'id': thread_id, 'course_id': course_id}}
+    cache.store((f'/api/threads/{thread_id}', None), json.dumps(data).encode(), None, None, data)
+
+
+def test_comment_write_drops_the_thread_in_the_response():
+    cache = ResponseCache(prefixes=('/api/',))
+    store_thread(cache, 1)
+    store_thread(cache, 2)
+
+    cache.invalidate_endpoint('/api/comments/10/comments', {'comment': {'id': 11, 'thread_id': 2}})
+    assert cache.get(('/api/threads/1', None)) is not None
+    assert cache.get(('/api/threads/2', None)) is None
+
+
+def test_comment_write_without_thread_drops_every_thread():
+    cache = ResponseCache(prefixes=('/api/',))
+    store_thread(cache, 1)
+    store_thread(cache, 2)
+
+    cache.invalidate_endpoint('/api/comments/10/endorse', {})
+    assert len(cache) == 0
+
+
+def test_new_thread_drops_the_course_thread_list():
+    cache = ResponseCache(prefixes=('/api/',))
+    data = {'threads': []}
+    cache.store(('/api/courses/1/threads', None), json.dumps(data).encode(), None, None, data)
+    store_thread(cache, 5, course_id=2)
+
+    cache.invalidate_endpoint('/api/courses/1/threads', {'thread': {'id': 6, 'course_id': 1}})
+    assert cache.get(('/api/courses/1/threads', None)) is None
+    assert cache.get(('/api/threads/5', None)) is not None
+
+
+def test_least_recently_used_entries_are_evicted_past_max_bytes():
+    cache = ResponseCache(max_bytes=100, prefixes=('/api/',))
+    for name in ('a', 'b', 'c'):
+        cache.store((f'/api/{name}', None), b'x' * 40, None, None)
+    assert cache.get(('/api/a', None)) is None
+    assert cache.size == 80 and cache.evictions == 1
+
+    cache.get(('/api/b', None))
+    cache.store(('/api/d', None), b'x' * 40, None, None)
+    assert cache.get(('/api/b', None)) is not None
+    assert cache.get(('/api/c', None)) is None
+
+    cache.store(('/api/huge', None), b'x' * 101, None, None)
+    assert cache.get(('/api/huge', None)) is None
+
+
+def test_response_fetched_across_an_invalidation_is_not_stored():
+    cache = ResponseCache(prefixes=('/api/',))
+    generation = cache.generation
+    cache.on_frame('thread.update', {'thread': {'id': 1}})
+
+    data = {'thread': {'id': 1, 'course_id': 1}}
+    cache.store(('/api/threads/1', None), json.dumps(data).encode(), None, None, data, generation)
+    assert cache.get(('/api/threads/1', None)) is None
+
+
+def test_events_drop_the_threads_they_change():
+    cache = ResponseCache(prefixes=('/api/',))
+    for thread_id in (1, 2, 3):
+        store_thread(cache, thread_id)
+
+    cache.on_frame('comment.new', {'comment': {'id': 10, 'thread_id': 1}})
+    cache.on_frame('thread.delete', {'thread_id': 2, 'course_id': 1})
+    assert [thread_id for thread_id in (1, 2, 3) if cache.get((f'/api/threads/{thread_id}', None))] == [3]
+
+
+async def _revalidate() -> tuple:
+
+    async with FakeEdServer() as server:
+        server.threads[1] = make_thread(1)
+        cache = ResponseCache(prefixes=('/api/threads/',))
+        client = EdClient(ed_token='test', api_host=server.url, response_cache=cache)
+        try:
+            titles = [(await client.get_thread(1)).thread.title for _ in range(2)]
+            server.threads[1] = dict(server.threads[1], title='Renamed')
+            titles.append((await client.get_thread(1)).thread.title)
+        finally:
+            await client.close()
+        return titles, cache.stats(), server.requests.count('/api/threads/1')
+
+
+def test_unchanged_thread_is_revalidated_with_its_etag():
+    titles, stats, requests = asyncio.run(_revalidate())
+    assert titles[0] == titles[1] != 'Renamed'
+    assert titles[2] == 'Renamed'
+    # not subscribed, so each lookup asks the server; the unchanged one gets a 304
+    assert requests == 3
+    assert stats['misses'] == 2 and stats['revalidated'] == 1
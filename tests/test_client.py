@@ -0,0 +1,111 @@
+import asyncio
+
+from benchmarks.fake_server import FakeEdServer, make_thread
+from edpy import EdClient
+
+
+def user_data(name: str) -> dict:
+    return {'user': {'id': 1, 'name': name, 'email': 'bot@example.com'}, 'courses': []}
+
+
+class FakeUserEndpoint:
+    """Answers /api/user with ``name``, holding each reply until ``release`` is set."""
+
+    def __init__(self) -> None:
+        self.name = 'first'
+        self.calls = 0
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def __call__(self, method, endpoint, **kwargs):
+        self.calls += 1
+        name = self.name
+        await self.release.wait()
+        return user_data(name)
+
+
+async def _with_client(test, **kwargs):
+    client = EdClient(ed_token='test', **kwargs)
+    endpoint = FakeUserEndpoint()
+    client._transport._request = endpoint
+    try:
+        return await test(client, endpoint)
+    finally:
+        await client.close()
+
+
+def test_concurrent_lookups_share_one_fetch():
+
+    async def test(client, endpoint):
+        endpoint.release.clear()
+        lookups = [asyncio.ensure_future(client._get_user_data()) for _ in range(5)]
+        await asyncio.sleep(0)
+        endpoint.release.set()
+        results = await asyncio.gather(*lookups)
+        assert endpoint.calls == 1
+        assert all(result['user']['name'] == 'first' for result in results)
+
+    asyncio.run(_with_client(test))
+
+
+def test_user_data_is_refetched_after_the_ttl():
+
+    async def test(client, endpoint):
+        await client._get_user_data()
+        await client._get_user_data()
+        assert endpoint.calls == 1
+
+        client._user_fetched_at -= 61
+        await client._get_user_data()
+        assert endpoint.calls == 2
+
+    asyncio.run(_with_client(test, cache_ttl=60))
+
+
+def test_invalidation_discards_a_fetch_under_way():
+
+    async def test(client, endpoint):
+        endpoint.release.clear()
+        stale = asyncio.ensure_future(client._get_user_data())
+        await asyncio.sleep(0)
+
+        client.invalidate_cache()
+        endpoint.name = 'second'
+        fresh = asyncio.ensure_future(client._get_user_data())
+        await asyncio.sleep(0)
+        endpoint.release.set()
+
+        await stale
+        assert (await fresh)['user']['name'] == 'second'
+        assert (await client._get_user_data())['user']['name'] == 'second'
+        assert endpoint.calls == 2
+
+    asyncio.run(_with_client(test))
+
+
+async def _iter_threads(**kwargs) -> tuple:
+
+    async with FakeEdServer() as server:
+        for thread_id in range(1, 96):
+            server.threads[thread_id] = make_thread(thread_id, course_id=1)
+        server.threads[96] = make_thread(96, course_id=2)
+
+        client = EdClient(ed_token='test', api_host=server.url)
+        try:
+            ids = [thread.id async for thread in client.iter_threads(1, page_size=10, **kwargs)]
+        finally:
+            await client.close()
+        return ids, server.requests.count('/api/courses/1/threads')
+
+
+def test_iter_threads_pages_through_the_course_in_order():
+    ids, pages = asyncio.run(_iter_threads(prefetch=2))
+    assert ids == list(range(95, 0, -1))
+    # ten pages, and at most the prefetched ones past the last
+    assert 10 <= pages <= 12
+
+
+def test_iter_threads_stops_at_the_limit():
+    ids, pages = asyncio.run(_iter_threads(limit=25, prefetch=1))
+    assert ids == list(range(95, 70, -1))
+    assert pages <= 4
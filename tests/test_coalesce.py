@@ -0,0 +1,55 @@
+import asyncio
+
+from benchmarks.fake_server import make_comment, make_thread
+from edpy import EventCoalescer
+from edpy.events import build_event
+
+
+async def _coalesce(frames: list, lazy: bool) -> list:
+
+    coalescer = EventCoalescer(window=0.05, max_delay=0.5)
+    emitted = []
+
+    async def emit(event):
+        emitted.append(event)
+
+    coalescer.bind(emit)
+    for event_type, data in frames:
+        event = build_event(event_type, data, lazy=lazy)
+        if not coalescer.offer(event):
+            emitted.append(event)
+    await coalescer.flush()
+    await coalescer.close()
+    return emitted
+
+
+def test_partial_thread_updates_are_merged():
+    frames = [('thread.update', {'thread': {'id': 1, 'title': 'Renamed'}}),
+              ('thread.update', {'thread': {'id': 1, 'is_locked': True}})]
+
+    for lazy in (True, False):
+        emitted = asyncio.run(_coalesce(frames, lazy))
+        assert len(emitted) == 1
+        assert emitted[0].thread.title == 'Renamed'
+        assert emitted[0].thread.is_locked is True
+
+
+def test_partial_comment_updates_are_merged():
+    frames = [('comment.update', {'comment': {'id': 10, 'thread_id': 1, 'content': 'edited'}}),
+              ('comment.update', {'comment': {'id': 10, 'thread_id': 1, 'is_endorsed': True}})]
+
+    emitted = asyncio.run(_coalesce(frames, lazy=True))
+    assert len(emitted) == 1
+    assert emitted[0].comment.content == 'edited'
+    assert emitted[0].comment.is_endorsed is True
+
+
+def test_thread_delete_cancels_its_comment_updates():
+    frames = [('thread.update', {'thread': make_thread(1)}),
+              ('comment.update', {'comment': make_comment(10, thread_id=1)}),
+              ('comment.update', {'comment': make_comment(20, thread_id=2)}),
+              ('thread.delete', {'thread_id': 1, 'course_id': 1})]
+
+    emitted = asyncio.run(_coalesce(frames, lazy=True))
+    assert [type(event).__name__ for event in emitted] == ['ThreadDeleteEvent', 'CommentUpdateEvent']
+    assert emitted[1].comment.id == 20
@@ -0,0 +1,64 @@
+import asyncio
+import json
+
+import pytest
+
+from edpy import EdClient, EventRelay, JsonCodec, OrjsonCodec, listener
+from edpy.codec import default_codec, peek_type
+from edpy.events import CourseCountEvent
+
+
+def test_peek_type():
+    assert peek_type('{"type":"course.count","data":{}}') == 'course.count'
+    assert peek_type('{"type": "thread.new", "data": {}}') == 'thread.new'
+    assert peek_type('{ "type" :"comment.update"}') == 'comment.update'
+    # frames that do not lead with their type are decoded in full
+    assert peek_type('{"data":{},"type":"course.count"}') is None
+    assert peek_type('not json') is None
+
+
+async def _codecs(**kwargs) -> tuple:
+    client = EdClient(ed_token='test', **kwargs)
+    await client.close()
+    return client._transport.codec, client.relay.codec if client.relay is not None else None
+
+
+def test_stdlib_is_the_default():
+    assert type(default_codec()) is JsonCodec
+    transport_codec, relay_codec = asyncio.run(_codecs(relay=EventRelay(port=0)))
+    assert type(transport_codec) is JsonCodec
+    assert relay_codec is transport_codec
+
+
+def test_orjson_is_opt_in():
+    pytest.importorskip('orjson')
+    codec = OrjsonCodec()
+
+    assert asyncio.run(_codecs(codec=codec, relay=EventRelay(port=0))) == (codec, codec)
+    assert codec.loads(codec.dumps({'a': [1, 2]})) == {'a': [1, 2]}
+
+
+async def _decode_with_and_without_listener(text: str) -> tuple:
+
+    client = EdClient(ed_token='test')
+    unused = client._transport._decode_frame(text)
+    skipped = client._transport.skipped_frames
+
+    class Counter:
+        @listener(CourseCountEvent)
+        async def on_count(self, event):
+            pass
+
+    client.add_event_hooks(Counter())
+    used = client._transport._decode_frame(text)
+    await client.close()
+    return unused, skipped, used, client._transport.skipped_frames
+
+
+def test_unused_frames_are_not_decoded():
+    text = json.dumps({'type': 'course.count', 'data': {'id': 1, 'count': 3}})
+    unused, skipped, used, skipped_after = asyncio.run(_decode_with_and_without_listener(text))
+
+    assert unused is None and skipped == 1
+    assert used == {'type': 'course.count', 'data': {'id': 1, 'count': 3}}
+    assert skipped_after == 1
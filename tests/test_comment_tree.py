@@ -0,0 +1,167 @@
+import asyncio
+
+from benchmarks.fake_server import FakeEdServer, make_comment, make_thread
+from edpy import EdClient
+from edpy.events import build_event
+from edpy.models.thread import Thread
+from edpy.models.tree import CommentTree
+
+
+def thread_payload() -> dict:
+    thread = make_thread(1)
+    root = make_comment(10, 1)
+    root['comments'] = [make_comment(11, 1, parent_id=10)]
+    root['comments'][0]['comments'] = [make_comment(12, 1, parent_id=11)]
+    thread['comments'] = [root]
+    return thread
+
+
+def comment_new(comment_id: int, parent_id: int = None, type: str = 'comment') -> dict:
+    comment = make_comment(comment_id, 1, parent_id=parent_id)
+    comment['type'] = type
+    return {'comment': comment}
+
+
+def test_index():
+    tree = CommentTree(thread_payload())
+
+    assert len(tree) == 3
+    assert tree.depth(12) == 2
+    assert tree.parent(12).id == 11
+    assert [comment.id for comment in tree.ancestors(12)] == [11, 10]
+    assert [comment.id for comment in tree.replies(10)] == [11]
+    assert tree.reply_count(10) == 2
+
+
+def test_add_update_remove():
+    thread = thread_payload()
+    tree = CommentTree(thread)
+
+    assert tree.apply(build_event('comment.new', comment_new(13, parent_id=11)))
+    assert tree.reply_count(10) == 3
+    assert [reply['id'] for reply in thread['comments'][0]['comments'][0]['comments']] == [12, 13]
+
+    update = comment_new(13, parent_id=11)
+    update['comment']['document'] = 'Edited'
+    del update['comment']['comments']
+    assert tree.apply(build_event('comment.update', update))
+    assert tree.get(13).document == 'Edited'
+
+    assert tree.apply(build_event('comment.delete', {'comment_id': 11, 'thread_id': 1}))
+    assert len(tree) == 1
+    assert 12 not in tree and 13 not in tree
+    assert tree.reply_count(10) == 0
+
+
+def test_event_of_another_thread_is_ignored():
+    tree = CommentTree(thread_payload())
+    other = comment_new(20)
+    other['comment']['thread_id'] = 2
+
+    assert not tree.apply(build_event('comment.new', other))
+    assert not tree.apply(build_event('comment.delete', {'comment_id': 99, 'thread_id': 1}))
+    assert len(tree) == 3
+
+
+def assigned(obj, name: str) -> bool:
+    try:
+        object.__getattribute__(obj, name)
+    except AttributeError:
+        return False
+    return True
+
+
+def test_first_answer_keeps_the_thread_mode():
+    for lazy in (False, True):
+        data = thread_payload()
+        thread = Thread.lazy(data) if lazy else Thread(data, **data)
+        assert thread.answers is None
+
+        assert thread.apply(build_event('comment.new', comment_new(30, type='answer')))
+        assert [answer.id for answer in thread.answers] == [30]
+        # eager threads hold eager comments, built before anything reads them
+        assert assigned(thread.answers[0], 'document') != lazy
+
+
+async def _fetch_twice() -> tuple:
+
+    async with FakeEdServer() as server:
+        server.threads[1] = thread_payload()
+        client = EdClient(ed_token='test', api_host=server.url)
+        try:
+            await client._login()
+            first, second = await asyncio.gather(client.get_thread(1), client.get_thread(1))
+            coalesced = client._transport.coalesced_requests
+        finally:
+            await client.close()
+    return first.thread, second.thread, coalesced
+
+
+def test_coalesced_fetches_do_not_share_the_payload():
+    first, second, coalesced = asyncio.run(_fetch_twice())
+
+    assert coalesced == 1
+    assert first.apply(build_event('comment.delete', {'comment_id': 11, 'thread_id': 1}))
+    assert 11 not in first.tree
+    assert 11 in second.tree
+
+
+async def _first_caller_edits_before_the_second_resumes() -> tuple:
+
+    async with FakeEdServer() as server:
+        server.threads[1] = thread_payload()
+        client = EdClient(ed_token='test', api_host=server.url)
+
+        async def fetch_and_edit():
+            thread = (await client.get_thread(1)).thread
+            # runs before the other caller is resumed with the response
+            thread.apply(build_event('comment.delete', {'comment_id': 11, 'thread_id': 1}))
+            return thread
+
+        try:
+            await client._login()
+            first, second = await asyncio.gather(fetch_and_edit(), client.get_thread(1))
+        finally:
+            await client.close()
+    return first, second.thread
+
+
+def test_first_caller_edits_do_not_reach_the_others():
+    first, second = asyncio.run(_first_caller_edits_before_the_second_resumes())
+
+    assert 11 not in first.tree
+    assert 11 in second.tree
+    assert second.comments[0].comments[0].id == 11
+
+
+def test_apply_patches_only_the_affected_comment():
+    for lazy in (False, True):
+        data = thread_payload()
+        thread = Thread.lazy(data) if lazy else Thread(data, **data)
+        root = thread.comments[0]
+        middle = root.comments[0]
+        leaf = middle.comments[0]
+        assert leaf.document == 'Reply'
+
+        update = comment_new(12, parent_id=11)
+        update['comment']['document'] = 'Edited'
+        assert thread.apply(build_event('comment.update', update))
+        assert thread.comments[0] is root and root.comments[0] is middle and middle.comments[0] is leaf
+        assert leaf.document == 'Edited'
+
+        assert thread.apply(build_event('comment.new', comment_new(13, parent_id=11)))
+        assert [reply.id for reply in middle.comments] == [12, 13]
+        assert assigned(middle.comments[1], 'document') != lazy
+
+        assert thread.apply(build_event('comment.delete', {'comment_id': 12, 'thread_id': 1}))
+        assert [reply.id for reply in middle.comments] == [13]
+        assert thread.comments[0] is root
+
+
+def test_unknown_comment_fields_are_ignored():
+    data = thread_payload()
+    data['comments'][0]['comments'][0]['reactions'] = {'+1': 2}
+    thread = Thread(data, **data)
+
+    assert thread.comments[0].comments[0].id == 11
+    assert thread.comments[0].comments[0]._raw['reactions'] == {'+1': 2}
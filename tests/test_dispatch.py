@@ -0,0 +1,133 @@
+import asyncio
+import random
+
+from edpy import EventDispatcher
+from edpy.events import CourseCountEvent, build_event
+
+
+def thread_update(thread_id: int, vote_count: int):
+    return build_event('thread.update', {'thread': {
+        'id': thread_id, 'course_id': 1, 'type': 'post', 'vote_count': vote_count}})
+
+
+def bound(dispatcher: EventDispatcher, handled: list, gate: asyncio.Event = None) -> EventDispatcher:
+
+    async def handle(event):
+        if gate is not None:
+            await gate.wait()
+        handled.append(event)
+
+    dispatcher.bind(handle)
+    return dispatcher
+
+
+async def _ordering() -> list:
+
+    handled = []
+
+    async def handle(event):
+        await asyncio.sleep(random.random() / 1000)
+        handled.append(event)
+
+    dispatcher = EventDispatcher(workers=4)
+    dispatcher.bind(handle)
+    for vote_count in range(20):
+        for thread_id in (1, 2, 3):
+            await dispatcher.put(thread_update(thread_id, vote_count))
+    await dispatcher.join()
+    await dispatcher.close()
+    return handled
+
+
+def test_events_of_a_thread_stay_in_order():
+    handled = asyncio.run(_ordering())
+
+    assert len(handled) == 60
+    for thread_id in (1, 2, 3):
+        assert [event.thread.vote_count for event in handled if event.thread.id == thread_id] == list(range(20))
+
+
+async def _drop_oldest() -> tuple:
+
+    handled, gate = [], asyncio.Event()
+    dispatcher = bound(EventDispatcher(workers=2, max_size=4, overflow='drop_oldest'), handled, gate)
+    for vote_count in range(10):
+        await dispatcher.put(thread_update(1, vote_count))
+    depth = dispatcher.depth
+    gate.set()
+    await dispatcher.join()
+    stats = dispatcher.stats()
+    await dispatcher.close()
+    return depth, [event.thread.vote_count for event in handled], stats
+
+
+def test_max_size_bounds_all_workers_together():
+    depth, handled, stats = asyncio.run(_drop_oldest())
+
+    # one busy thread gets the whole capacity
+    assert depth == 4
+    assert handled == [6, 7, 8, 9]
+    assert stats['dropped'] == 6
+    assert stats['dropped_by_type'] == {'ThreadUpdateEvent': 6}
+    assert stats['processed'] == 4
+
+
+async def _drop_listed_types() -> tuple:
+
+    handled, gate = [], asyncio.Event()
+    dispatcher = bound(EventDispatcher(workers=1, max_size=1, overflow='drop', drop_types=(CourseCountEvent,)),
+        handled, gate)
+    await dispatcher.put(thread_update(1, 0))
+    await dispatcher.put(CourseCountEvent(1, 5))        # dropped, the queue is full
+    # other types wait for the worker to take the queued event
+    await asyncio.wait_for(dispatcher.put(thread_update(1, 1)), 1)
+    gate.set()
+    await dispatcher.join()
+    await dispatcher.close()
+    return handled, dict(dispatcher.dropped)
+
+
+def test_drop_policy_only_drops_listed_types():
+    handled, dropped = asyncio.run(_drop_listed_types())
+
+    assert [event.thread.vote_count for event in handled] == [0, 1]
+    assert dropped == {'CourseCountEvent': 1}
+
+
+async def _close(hang: bool) -> tuple:
+
+    handled, gate = [], asyncio.Event()
+    dispatcher = bound(EventDispatcher(workers=2, drain_timeout=0.05), handled, None if not hang else gate)
+    for thread_id in range(6):
+        await dispatcher.put(thread_update(thread_id, 0))
+    await dispatcher.close()
+    return len(handled), dispatcher.discarded
+
+
+def test_close_drains_queued_events():
+    assert asyncio.run(_close(hang=False)) == (6, 0)
+
+
+def test_close_reports_discarded_events():
+    # both workers are stuck on their first event
+    assert asyncio.run(_close(hang=True)) == (0, 4)
+
+
+async def _block() -> tuple:
+
+    handled, gate = [], asyncio.Event()
+    dispatcher = bound(EventDispatcher(workers=1, max_size=1), handled, gate)
+    await dispatcher.put(thread_update(1, 0))
+    await dispatcher.put(thread_update(1, 1))      # waits until the worker takes the first one
+    third = asyncio.ensure_future(dispatcher.put(thread_update(1, 2)))
+    await asyncio.sleep(0.02)
+    blocked = not third.done()
+    gate.set()
+    await third
+    await dispatcher.join()
+    await dispatcher.close()
+    return blocked, [event.thread.vote_count for event in handled], sum(dispatcher.dropped.values())
+
+
+def test_block_policy_waits_for_space():
+    assert asyncio.run(_block()) == (True, [0, 1, 2], 0)
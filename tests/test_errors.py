@@ -0,0 +1,12 @@
+from edpy.errors import RequestError
+
+
+def test_transient_errors():
+    assert RequestError('throttled', status=429).transient
+    assert RequestError('server error', status=503).transient
+    assert RequestError('connection reset', transient=True).transient
+
+
+def test_permanent_errors():
+    assert not RequestError('missing permission', status=403).transient
+    assert not RequestError('Ed API token is not provided').transient
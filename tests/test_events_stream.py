@@ -0,0 +1,34 @@
+import asyncio
+
+from edpy import EdClient
+from edpy.events import ThreadUpdateEvent
+
+
+def thread_update(title: str, vote_count: int) -> dict:
+    return {'type': 'thread.update', 'data': {'thread': {
+        'id': 7, 'course_id': 1, 'type': 'post', 'category': 'General', 'title': title, 'vote_count': vote_count}}}
+
+
+async def _stream_with_field_filter() -> list:
+
+    client = EdClient(ed_token='test')
+    stream = client.events(ThreadUpdateEvent, fields='title', max_wait=0.05)
+    batch = asyncio.ensure_future(stream.__anext__())
+    await asyncio.sleep(0)      # the stream registers on its first iteration
+
+    await client._transport._handle_message(thread_update('First', 0))
+    await client._transport._handle_message(thread_update('First', 1))     # votes only
+    await client._transport._handle_message(thread_update('Second', 1))
+
+    events = await asyncio.wait_for(batch, 1)
+    await stream.aclose()
+    await client.close()
+    return events
+
+
+def test_events_field_filter_skips_other_changes():
+    events = asyncio.run(_stream_with_field_filter())
+
+    # the first update has no previous state to diff against, so it passes
+    assert [event.thread.title for event in events] == ['First', 'Second']
+    assert events[1].changes == {'title': ('First', 'Second')}
@@ -0,0 +1,87 @@
+import asyncio
+import os
+import threading
+
+import pytest
+
+from edpy import EdClient, listener
+from edpy.events import CourseCountEvent, build_event
+from edpy.executor import HookExecutor, PooledHook
+
+
+def count_frame(count: int) -> dict:
+    return {'type': 'course.count', 'data': {'id': 1, 'count': count}}
+
+
+class Listeners:
+    """Process listeners are looked up by name in the worker, so they live at module level."""
+
+    thread_calls = []
+
+    @listener(CourseCountEvent, executor='thread')
+    def on_count_in_thread(self, event):
+        Listeners.thread_calls.append((threading.current_thread().name, event.count))
+
+    @staticmethod
+    @listener(CourseCountEvent, executor='process')
+    def on_count_in_process(event):
+        return os.getpid(), event.count * 2
+
+
+async def _run_in_pools() -> tuple:
+
+    executor = HookExecutor(processes=1, threads=1)
+    event = build_event('course.count', {'id': 1, 'count': 21})
+    try:
+        in_process = await executor.run('process', Listeners.on_count_in_process, event)
+        hook = PooledHook(lambda event: event.count + 1, 'thread', executor)
+        in_thread = await (await hook(event))
+    finally:
+        await executor.close()
+    return in_process, in_thread, executor.stats()
+
+
+def test_hooks_return_their_results():
+    (pid, doubled), in_thread, stats = asyncio.run(_run_in_pools())
+
+    assert pid != os.getpid()
+    assert doubled == 42
+    assert in_thread == 22
+    assert stats == {'submitted': 2, 'completed': 2, 'failed': 0, 'pending': 0}
+
+
+async def _dispatch_to_pools() -> dict:
+
+    client = EdClient(ed_token='test', executor=HookExecutor(processes=1, threads=1))
+    client.add_event_hooks(Listeners())
+    try:
+        for count in range(3):
+            await client._transport._handle_message(count_frame(count))
+        await client.executor.join()
+        stats = client.executor.stats()
+    finally:
+        await client.close()
+        await client.executor.close()
+    return stats
+
+
+def test_client_runs_listeners_in_pools():
+    Listeners.thread_calls.clear()
+    stats = asyncio.run(_dispatch_to_pools())
+
+    assert stats['completed'] == 6 and stats['failed'] == 0
+    assert [count for _, count in Listeners.thread_calls] == [0, 1, 2]
+    assert all(name.startswith('edpy-hook') for name, _ in Listeners.thread_calls)
+
+
+def test_listener_class_is_rejected():
+
+    async def register():
+        client = EdClient(ed_token='test')
+        try:
+            client.add_event_hooks(Listeners)
+        finally:
+            await client.close()
+
+    with pytest.raises(TypeError):
+        asyncio.run(register())
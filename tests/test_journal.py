@@ -0,0 +1,67 @@
+import asyncio
+import json
+import time
+
+from benchmarks.fake_server import make_thread
+from edpy import CourseMirror, EdClient, EventJournal, EventRelay, ResponseCache, SnapshotStore, listener
+from edpy import journal as journal_module
+from edpy.events import ThreadUpdateEvent
+
+
+def test_append_drops_messages_once_the_writer_failed(tmp_path, monkeypatch):
+
+    def full_disk(self, *record):
+        raise OSError(28, 'No space left on device')
+
+    monkeypatch.setattr(journal_module._SegmentWriter, 'write', full_disk)
+    journal = EventJournal(str(tmp_path))
+
+    journal.append('{"type":"course.count","data":{"id":1,"count":1}}')
+    deadline = time.monotonic() + 5
+    while journal.failed is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert isinstance(journal.failed, OSError)
+
+    for _ in range(100):
+        journal.append('{"type":"course.count","data":{"id":1,"count":2}}')
+    assert journal._queue.empty()
+    assert journal.dropped >= 100
+    asyncio.run(journal.close())
+
+
+async def _replay_into_live_state(path: str) -> tuple:
+
+    cache = ResponseCache(prefixes=('/api/',))
+    data = {'thread': make_thread(1)}
+    cache.store(('/api/threads/1', None), json.dumps(data).encode(), None, None, data)
+    relay, snapshots, mirror = EventRelay(port=0), SnapshotStore(), CourseMirror()
+    client = EdClient(ed_token='test', response_cache=cache, relay=relay, snapshots=snapshots, mirror=mirror)
+    replayed = []
+
+    class Recorder:
+        @listener(ThreadUpdateEvent)
+        async def on_update(self, event):
+            replayed.append(event.replayed)
+
+    client.add_event_hooks(Recorder())
+    try:
+        count = await client.replay(path)
+    finally:
+        await client.close()
+    return count, replayed, cache, relay, snapshots, mirror
+
+
+def test_replay_leaves_live_state_alone(tmp_path):
+    journal = EventJournal(str(tmp_path))
+    for message in ({'type': 'thread.new', 'data': {'thread': make_thread(1)}},
+                    {'type': 'thread.update', 'data': {'thread': {'id': 1, 'title': 'Renamed'}}}):
+        journal.append(json.dumps(message), message)
+    asyncio.run(journal.close())
+
+    count, replayed, cache, relay, snapshots, mirror = asyncio.run(_replay_into_live_state(str(tmp_path)))
+    assert count == 2
+    assert replayed == [True]
+    assert cache.get(('/api/threads/1', None)) is not None
+    assert relay.seq == 0
+    assert len(snapshots) == 0
+    assert len(mirror) == 0
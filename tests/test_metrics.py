@@ -0,0 +1,23 @@
+import pytest
+
+from edpy import InMemoryMetrics, MetricsSink
+
+
+def test_sink_must_implement_both_methods():
+
+    class CountsOnly(MetricsSink):
+        def inc(self, name, value=1, **labels):
+            pass
+
+    with pytest.raises(TypeError):
+        CountsOnly()
+
+
+def test_in_memory_metrics():
+    metrics = InMemoryMetrics()
+    metrics.inc('frames', course=1)
+    metrics.inc('frames', 2, course=1)
+    metrics.observe('latency', 0.003)
+
+    assert metrics.counter('frames', course=1) == 3
+    assert metrics.histograms['latency'][()].count == 1
@@ -0,0 +1,61 @@
+import asyncio
+
+from benchmarks.fake_server import make_thread
+from edpy import CourseMirror
+from edpy.events import build_event
+from edpy.models.thread import Thread
+
+
+def test_drop_course_forgets_its_threads():
+    mirror = CourseMirror()
+    for thread_id, course_id in ((1, 1), (2, 1), (3, 2)):
+        mirror.apply(build_event('thread.new', {'thread': make_thread(thread_id, course_id)}, lazy=True))
+
+    mirror.drop_course(1)
+    assert len(mirror) == 1
+    assert 3 in mirror
+    assert mirror.get_by_number(1, 1) is None
+    assert mirror.get_by_category(1, 'General') == []
+
+
+def test_partial_update_is_merged():
+    mirror = CourseMirror()
+    mirror.apply(build_event('thread.new', {'thread': make_thread(1)}, lazy=True))
+    mirror.apply(build_event('thread.update', {'thread': {'id': 1, 'title': 'Renamed'}}, lazy=True))
+
+    thread = mirror.get(1)
+    assert thread.title == 'Renamed'
+    assert thread.category == 'General'
+
+
+class ListingDuringDelete:
+    """Pages a listing taken before thread 2 was deleted, delivering the delete mid-way."""
+
+    def __init__(self, mirror: CourseMirror) -> None:
+        self.mirror = mirror
+
+    async def iter_threads(self, course_id, **kwargs):
+        for thread_id in (3, 2, 1):
+            yield Thread.lazy(make_thread(thread_id, course_id))
+            if thread_id == 3:
+                self.mirror.apply(build_event('thread.delete', {'thread_id': 2, 'course_id': course_id}))
+
+
+def test_seed_skips_threads_deleted_while_paging():
+    mirror = CourseMirror()
+    mirror.bind(ListingDuringDelete(mirror))
+    asyncio.run(mirror.seed(1))
+
+    assert 2 not in mirror
+    assert 1 in mirror and 3 in mirror
+
+
+def test_index_lookups_refresh_recency():
+    mirror = CourseMirror(max_threads=2)
+    mirror.apply(build_event('thread.new', {'thread': make_thread(1)}, lazy=True))
+    mirror.apply(build_event('thread.new', {'thread': make_thread(2)}, lazy=True))
+    assert [thread.id for thread in mirror.get_by_user(make_thread(1)['user_id'])] == [1]
+
+    mirror.apply(build_event('thread.new', {'thread': make_thread(3)}, lazy=True))
+    assert 1 in mirror
+    assert 2 not in mirror
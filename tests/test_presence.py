@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+
+from edpy import EdClient, PresenceRecorder
+
+np = pytest.importorskip('numpy')
+
+
+def count_frame(count: int) -> dict:
+    return {'type': 'course.count', 'data': {'id': 1, 'count': count}}
+
+
+async def _feed(replayed: bool) -> tuple:
+
+    presence = PresenceRecorder()
+    client = EdClient(ed_token='test', presence=presence)
+    for count in range(1, 4):
+        await client._transport._handle_message(count_frame(count), replayed=replayed)
+    await client.close()
+    return presence.samples(1)
+
+
+def test_live_counts_are_recorded():
+    _, counts = asyncio.run(_feed(replayed=False))
+    assert counts.tolist() == [1, 2, 3]
+
+
+def test_replayed_counts_are_not_recorded():
+    timestamps, counts = asyncio.run(_feed(replayed=True))
+    assert len(timestamps) == len(counts) == 0
+
+
+def test_rolling_aggregations():
+    presence = PresenceRecorder()
+    for timestamp, count in ((0, 4), (60, 1), (120, 6), (180, 2)):
+        presence.record(1, count, timestamp=timestamp)
+
+    starts, highs = presence.rolling(1, window=120, interval=60, how='max', end=240)
+    _, lows = presence.rolling(1, window=120, interval=60, how='min', end=240)
+    _, means = presence.rolling(1, window=120, interval=60, how='mean', end=240)
+
+    assert starts.tolist() == [60, 120, 180]
+    assert highs.tolist() == [4, 6, 6]
+    assert lows.tolist() == [1, 1, 2]
+    assert means.tolist() == [2.5, 3.5, 4.0]
+    with pytest.raises(ValueError):
+        presence.rolling(1, window=120, interval=60, how='median')
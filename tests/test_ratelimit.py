@@ -0,0 +1,109 @@
+import asyncio
+import time
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+
+from aiohttp import web
+
+from benchmarks.fake_server import FakeEdServer
+from edpy import EdClient, RateLimiter
+from edpy.ratelimit import AdaptiveConcurrency, TokenBucket, parse_retry_after
+
+
+def test_parse_retry_after():
+    assert parse_retry_after('2.5') == 2.5
+    assert parse_retry_after('-1') == 0.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after('soon') is None
+    later = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+    assert 25 < parse_retry_after(later) <= 30
+
+
+def test_should_retry():
+    limiter = RateLimiter(max_retries=2)
+
+    assert limiter.should_retry('GET', 1, throttled=False)
+    assert not limiter.should_retry('GET', 3, throttled=False)
+    assert limiter.should_retry('POST', 1, throttled=True)
+    assert not limiter.should_retry('POST', 1, throttled=False)
+    assert limiter.should_retry('POST', 1, throttled=False, idempotent=True)
+    assert not limiter.should_retry('PUT', 1, throttled=False, idempotent=False)
+
+
+def test_adaptive_concurrency():
+    concurrency = AdaptiveConcurrency(maximum=8, minimum=2)
+
+    concurrency.on_throttle()
+    assert concurrency.limit == 4
+    concurrency.on_throttle()
+    concurrency.on_throttle()
+    assert concurrency.limit == 2
+    # grows by one after a full window of successes
+    for _ in range(2):
+        concurrency.on_success()
+    assert concurrency.limit == 3
+
+
+async def _concurrency_waits() -> list:
+
+    concurrency = AdaptiveConcurrency(maximum=1)
+    order = []
+
+    async def request(name: str):
+        await concurrency.acquire()
+        order.append(name)
+        await asyncio.sleep(0.01)
+        order.append(name)
+        concurrency.release()
+
+    await asyncio.gather(request('a'), request('b'))
+    return order
+
+
+def test_concurrency_limit_is_enforced():
+    assert asyncio.run(_concurrency_waits()) == ['a', 'a', 'b', 'b']
+
+
+async def _bucket_waits() -> tuple:
+
+    bucket = TokenBucket(rate=50, capacity=2)
+    started = time.monotonic()
+    waits = [await bucket.acquire() for _ in range(4)]
+    return waits, time.monotonic() - started
+
+
+def test_token_bucket():
+    waits, elapsed = asyncio.run(_bucket_waits())
+
+    assert waits[:2] == [0.0, 0.0]
+    assert all(wait > 0 for wait in waits[2:])
+    assert elapsed >= 0.03
+
+
+async def _throttled_twice() -> tuple:
+
+    server = FakeEdServer()
+    responses = [web.Response(status=429, headers={'Retry-After': '0.1'}) for _ in range(2)]
+
+    async def limited(request: web.Request):
+        return responses.pop(0) if responses else web.json_response({'ok': True})
+
+    server.app.router.add_get('/api/limited', limited)
+    async with server:
+        limiter = RateLimiter(max_concurrency=8, backoff_base=0.001)
+        client = EdClient(ed_token='test', api_host=server.url, rate_limiter=limiter)
+        try:
+            result = await client._transport._request('GET', '/api/limited')
+        finally:
+            await client.close()
+    return result, limiter.stats()
+
+
+def test_retry_after_counts_as_throttled_time():
+    result, stats = asyncio.run(_throttled_twice())
+
+    assert result == {'ok': True}
+    assert stats['throttled_responses'] == 2
+    assert stats['retries'] == 2
+    assert stats['throttled_time'] >= 0.2
+    assert stats['concurrency_limit'] == 2
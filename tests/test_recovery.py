@@ -0,0 +1,52 @@
+import asyncio
+
+from benchmarks.fake_server import FakeEdServer
+from edpy import EdClient, GapRecovery
+
+
+class SpyRecovery(GapRecovery):
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.recovered = []
+
+    def recover(self, course_ids):
+        shard = self._transport.shards[0]
+        # the course must already be acknowledged when its backfill starts
+        self.recovered.extend((course_id, course_id in shard.subscribed) for course_id in course_ids)
+        super().recover(course_ids)
+
+
+async def _reconnect(deliberate: bool) -> list:
+
+    async with FakeEdServer() as server:
+        recovery = SpyRecovery()
+        client = EdClient(ed_token='test', api_host=server.url, recovery=recovery)
+        task = asyncio.ensure_future(client.subscribe(1))
+        try:
+            await client._transport.wait_subscribed(5)
+            assert recovery.recovered == []     # nothing to backfill on the first subscription
+            shard = client._transport.shards[0]
+            if deliberate:
+                await shard.restart()
+                # a backfill would have started on the ack
+                await asyncio.wait_for(shard._wait_resubscribed(), 5)
+            else:
+                await shard._ws.close()     # dropped, as far as the shard can tell
+                for _ in range(100):
+                    if recovery.recovered:
+                        break
+                    await asyncio.sleep(0.05)
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            await client.close()
+        return recovery.recovered
+
+
+def test_backfill_starts_after_subscribe_ack():
+    assert asyncio.run(_reconnect(deliberate=False)) == [(1, True)]
+
+
+def test_deliberate_restart_is_not_backfilled():
+    assert asyncio.run(_reconnect(deliberate=True)) == []
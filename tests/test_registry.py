@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+from benchmarks.fake_server import make_thread
+from edpy import EdClient, listener
+from edpy.events import CommentNewEvent, ThreadNewEvent, ThreadUpdateEvent
+from edpy.models.thread import ThreadType
+from edpy.registry import HookRegistry
+
+
+def first(event): pass
+def for_course(event): pass
+def later(event): pass
+
+
+def test_order_survives_removal():
+    registry = HookRegistry()
+    registry.add(ThreadNewEvent, first)
+    registry.add(ThreadNewEvent, for_course, course_id=1)
+    registry.remove(first)
+    registry.add(ThreadNewEvent, later)
+
+    assert registry.match('ThreadNewEvent', 1) == [for_course, later]
+
+
+def test_hooks_are_routed_by_course():
+    registry = HookRegistry()
+    registry.add(ThreadNewEvent, first)
+    registry.add(ThreadNewEvent, for_course, course_id=(1, 2))
+
+    assert registry.match('ThreadNewEvent', 1) == [first, for_course]
+    assert registry.match('ThreadNewEvent', 3) == [first]
+    assert registry.match('CommentNewEvent', 1) == []
+
+
+def test_category_type_and_field_filters():
+    registry = HookRegistry()
+    registry.add(ThreadNewEvent, first, category='Lectures', type=ThreadType.QUESTION)
+    registry.add(ThreadUpdateEvent, later, fields='title')
+
+    assert registry.match('ThreadNewEvent', 1, 'Lectures', 'question') == [first]
+    assert registry.match('ThreadNewEvent', 1, 'Lectures', 'post') == []
+    assert registry.match('ThreadNewEvent', 1, 'General', 'question') == []
+    assert registry.match('ThreadUpdateEvent', 1, changes={'title': ('a', 'b')}) == [later]
+    assert registry.match('ThreadUpdateEvent', 1, changes={'is_pinned': (False, True)}) == []
+    # unknown changes may include the field
+    assert registry.match('ThreadUpdateEvent', 1, changes=None) == [later]
+
+
+def test_thread_filters_are_refused_on_other_events():
+    registry = HookRegistry()
+    with pytest.raises(ValueError):
+        registry.add(CommentNewEvent, first, category='General')
+    with pytest.raises(ValueError):
+        registry.add(ThreadNewEvent, first, fields='title')
+
+
+async def _dispatch_to_filtered_listener(frames) -> list:
+
+    client = EdClient(ed_token='test')
+    received = []
+
+    class Course2:
+        @listener(ThreadNewEvent, course_id=2)
+        async def on_thread(self, event):
+            received.append(event.thread.id)
+
+    client.add_event_hooks(Course2())
+    try:
+        for frame in frames:
+            await client._transport._handle_message(frame)
+    finally:
+        await client.close()
+    return received
+
+
+def test_client_dispatches_only_matching_frames():
+    frames = [{'type': 'thread.new', 'data': {'thread': make_thread(thread_id, course_id)}}
+              for thread_id, course_id in ((1, 1), (2, 2), (3, 1), (4, 2))]
+    assert asyncio.run(_dispatch_to_filtered_listener(frames)) == [2, 4]
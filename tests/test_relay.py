@@ -0,0 +1,75 @@
+import asyncio
+
+from edpy import EventRelay, RelayClient, listener
+from edpy.events import CourseCountEvent
+
+
+def count_frame(count: int) -> dict:
+    return {'type': 'course.count', 'data': {'id': 1, 'count': count}}
+
+
+async def _resume_after_long_gap(missed: int, buffer_size: int) -> tuple:
+
+    relay = EventRelay(port=0, buffer_size=buffer_size, history=100)
+    await relay.start()
+    client = RelayClient(port=relay.port, ed_token='test')
+    counts = []
+    done = asyncio.Event()
+
+    class Counter:
+        @listener(CourseCountEvent)
+        async def on_count(self, event):
+            counts.append(event.count)
+            if len(counts) == missed:
+                done.set()
+
+    client.add_event_hooks(Counter())
+    # the client saw frame 1 before disconnecting
+    relay.publish(count_frame(0))
+    client._epoch, client.last_seq = relay.epoch, 1
+    for count in range(1, missed + 1):
+        relay.publish(count_frame(count))
+
+    task = asyncio.ensure_future(client.subscribe())
+    try:
+        await asyncio.wait_for(done.wait(), 5)
+    finally:
+        await client.close()
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await relay.close()
+    return counts, client.last_seq, relay.slow_disconnects
+
+
+def test_resume_backlog_longer_than_buffer():
+    counts, last_seq, slow_disconnects = asyncio.run(_resume_after_long_gap(missed=50, buffer_size=10))
+
+    assert counts == list(range(1, 51))
+    assert last_seq == 51
+    assert slow_disconnects == 0
+
+
+async def _close_with_connected_subscriber() -> int:
+
+    relay = EventRelay(port=0)
+    await relay.start()
+    client = RelayClient(port=relay.port, ed_token='test')
+    task = asyncio.ensure_future(client.subscribe())
+    try:
+        while relay.subscribers == 0:
+            await asyncio.sleep(0.01)
+        # a second connection that never says hello
+        _, writer = await asyncio.open_connection('127.0.0.1', relay.port)
+        await asyncio.sleep(0.05)
+        await asyncio.wait_for(relay.close(), 2)
+        subscribers = relay.subscribers
+        writer.close()
+    finally:
+        await client.close()
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+    return subscribers
+
+
+def test_close_with_connected_subscriber():
+    assert asyncio.run(_close_with_connected_subscriber()) == 0
@@ -0,0 +1,165 @@
+import asyncio
+
+import pytest
+
+from benchmarks.fake_server import FakeEdServer
+from edpy import EdClient
+from edpy import shard as shard_module
+from edpy.shard import Shard
+
+
+async def _with_shards(test, course_ids=(1, 2, 3, 4), shards: int = 2):
+
+    async with FakeEdServer(course_ids=course_ids) as server:
+        client = EdClient(ed_token='test', api_host=server.url, shards=shards)
+        task = asyncio.ensure_future(client.subscribe(list(course_ids)))
+        try:
+            await client.wait_subscribed(5)
+            return await test(client, server)
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            await client.close()
+
+
+def loads(client: EdClient) -> list:
+    return sorted(len(shard.course_ids) for shard in client._transport.shards)
+
+
+def connections(server: FakeEdServer) -> int:
+    return server.requests.count('/api/stream')
+
+
+def test_courses_are_spread_over_the_shards():
+
+    async def test(client, server):
+        assert loads(client) == [2, 2]
+        assert connections(server) == 2
+        for shard in client._transport.shards:
+            assert shard.subscribed == shard.course_ids
+
+    asyncio.run(_with_shards(test))
+
+
+def test_added_course_goes_to_the_least_loaded_shard():
+
+    async def test(client, server):
+        await client.add_course(5)
+        await client.wait_subscribed(5)
+        assert loads(client) == [2, 3]
+        # the shard taking the course subscribes over its open connection
+        assert connections(server) == 2
+
+        await client.add_course(6)
+        await client.wait_subscribed(5)
+        assert loads(client) == [3, 3]
+
+    asyncio.run(_with_shards(test))
+
+
+def test_removed_course_restarts_only_its_shard():
+
+    async def test(client, server):
+        transport = client._transport
+        shard = transport._course_shards[1]
+        other = next(link for link in transport.shards if link is not shard)
+
+        await client.remove_course(1)
+        await asyncio.wait_for(shard._wait_resubscribed(), 5)
+        assert 1 not in shard.course_ids and 1 not in shard.subscribed
+        assert connections(server) == 3
+        assert other.subscribed == other.course_ids
+
+    asyncio.run(_with_shards(test))
+
+
+def test_rebalance_keeps_every_course_subscribed():
+
+    async def test(client, server):
+        transport = client._transport
+        shard = transport.shards[0]
+        for course_id in sorted(shard.course_ids):
+            await client.remove_course(course_id)
+        await asyncio.wait_for(shard._wait_resubscribed(), 5)
+        assert loads(client) == [0, 3]
+
+        await client.rebalance()
+        for link in transport.shards:
+            await asyncio.wait_for(link._wait_resubscribed(), 5)
+        await client.wait_subscribed(5)
+        assert loads(client) == [1, 2]
+        assert len(transport._course_shards) == 3
+        for course_id, carrier in transport._course_shards.items():
+            assert course_id in carrier.course_ids and course_id in carrier.subscribed
+
+    asyncio.run(_with_shards(test, course_ids=(1, 2, 3, 4, 5, 6)))
+
+
+class FakeWebSocket:
+    """Records what a shard sends; replies are handed to the shard by the test."""
+
+    closed = False
+
+    def __init__(self) -> None:
+        self.sent = []
+
+    async def send_json(self, data):
+        self.sent.append(dict(data))
+
+
+def connected_shard() -> Shard:
+    shard = Shard(None, 0)
+    shard._ws = FakeWebSocket()
+    return shard
+
+
+def test_replies_resolve_their_own_message():
+
+    async def test():
+        shard = connected_shard()
+        first = await shard._send({'type': 'course.subscribe', 'oid': 1})
+        second = await shard._send({'type': 'course.subscribe', 'oid': 2})
+        first_id, second_id = (data['id'] for data in shard._ws.sent)
+
+        await shard._handle_frame({'type': 'course.subscribe', 'id': second_id})
+        assert second.done() and not first.done()
+        assert (await second)['id'] == second_id
+        await shard._handle_frame({'type': 'course.subscribe', 'id': first_id})
+        assert (await first)['id'] == first_id
+        assert shard.in_flight == 0
+
+    asyncio.run(test())
+
+
+def test_unanswered_message_is_resent_then_fails():
+
+    async def test():
+        shard = connected_shard()
+        future = await shard._send({'type': 'course.subscribe', 'oid': 1}, timeout=0.01, retries=1)
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(future, 1)
+        # the retry goes out under a new id
+        assert [data['id'] for data in shard._ws.sent] == [1, 2]
+        assert shard.in_flight == 0
+
+    asyncio.run(test())
+
+
+def test_sending_waits_for_room_in_flight(monkeypatch):
+    monkeypatch.setattr(shard_module, 'MAX_IN_FLIGHT', 2)
+
+    async def test():
+        shard = connected_shard()
+        await shard._send({'type': 'course.subscribe', 'oid': 1})
+        await shard._send({'type': 'course.subscribe', 'oid': 2})
+        third = asyncio.ensure_future(shard._send({'type': 'course.subscribe', 'oid': 3}))
+        await asyncio.sleep(0.01)
+        assert not third.done() and len(shard._ws.sent) == 2
+
+        await shard._handle_frame({'type': 'course.subscribe', 'id': 1})
+        await asyncio.wait_for(third, 1)
+        assert len(shard._ws.sent) == 3
+        shard._prune(2, ConnectionError())
+        shard._prune(3, ConnectionError())
+
+    asyncio.run(test())
@@ -0,0 +1,83 @@
+import asyncio
+import json
+
+from benchmarks.fake_server import FakeEdServer
+from edpy import EdClient, GapRecovery
+from edpy.shard import ArrivalWindow
+
+
+def count_text(count: int) -> str:
+    return json.dumps({'type': 'course.count', 'data': {'id': 1, 'count': count}})
+
+
+def test_second_copy_is_dropped():
+    window = ArrivalWindow()
+    primary, standby = object(), object()
+
+    assert window.first(primary, count_text(5))
+    assert not window.first(standby, count_text(5))
+    # the same frame repeated on one connection is a new event
+    assert window.first(primary, count_text(6))
+    assert window.first(primary, count_text(6))
+    assert not window.first(standby, count_text(6))
+    assert not window.first(standby, count_text(6))
+    assert window.duplicates == 3
+
+
+def test_forgotten_frames_do_not_swallow_new_ones():
+    window = ArrivalWindow()
+    primary, standby = object(), object()
+
+    # the standby was down and never delivered its copy
+    assert window.first(primary, count_text(5))
+    window.forget(primary)
+    assert window.first(standby, count_text(5))
+
+
+def test_old_frames_age_out():
+    window = ArrivalWindow(max_age=0.0)
+    primary, standby = object(), object()
+
+    assert window.first(primary, count_text(5))
+    assert window.first(primary, count_text(6))
+    assert window.first(standby, count_text(5))
+
+
+class SpyRecovery(GapRecovery):
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.gaps = []
+
+    def disconnected(self, course_ids):
+        self.gaps.append(set(course_ids))
+        super().disconnected(course_ids)
+
+
+async def _remove_course_with_standby() -> tuple:
+
+    async with FakeEdServer(course_ids=(1, 2)) as server:
+        recovery = SpyRecovery()
+        client = EdClient(ed_token='test', api_host=server.url, standby=True, recovery=recovery)
+        task = asyncio.ensure_future(client.subscribe([1, 2]))
+        try:
+            await client._transport.wait_subscribed(5)
+            shard = client._transport.shards[0]
+            await shard.standby._wait_resubscribed()
+            await client.remove_course(2)
+            await asyncio.wait_for(shard.standby._wait_resubscribed(), 5)
+            live = client._transport._course_live(1)
+            failovers, gaps = client._transport.failovers, list(recovery.gaps)
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            await client.close()
+        return live, failovers, gaps
+
+
+def test_restart_keeps_standby_up():
+    live, failovers, gaps = asyncio.run(_remove_course_with_standby())
+
+    assert live
+    assert failovers == 0
+    assert gaps == []